@@ -0,0 +1,423 @@
+# Benchmark suite for the carrier handlers in core.algorithm_stubs
+#
+#   python benchmark.py run [--handlers NAME ...] [--sizes MP ...] [--media-mb MB ...] [--fills RATIO ...]
+#                           [--timeout SECONDS] [--workdir DIR] [--output results.json]
+#   python benchmark.py compare BASELINE.json CURRENT.json [--threshold 0.10] [--min-seconds 0.05] [--json]
+#   python benchmark.py costs [--models NAME ...] [--sizes MP ...] [--repeat N] [--workdir DIR] [--output costs.json]
+#
+# Carriers are generated locally and cached in --workdir: "natural-ish" images (smooth gradients,
+# texture and sensor-like noise) at the requested megapixel sizes, plus silent MP3/MP4 containers and
+# low-level noise WAV recordings.
+# Every case runs in its own subprocess, so peak RSS is per case and a runaway case can be timed out.
+# `costs` times the cost models alone against one streaming float32 pass over the same image, which
+# is roughly what memory bandwidth allows for a whole-image operation.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES_MP = (0.3, 2, 12, 50)
+DEFAULT_MEDIA_MB = (1, 16, 128)
+DEFAULT_FILLS = (0.1, 0.5, 0.9)
+DEFAULT_COST_SIZES_MP = (20,)
+DEFAULT_TIMEOUT = 600
+RESULTS_VERSION = 1
+
+
+# --- Handler Registry ---
+# name -> (carrier kind, nominal capacity in bytes). Capacities follow each handler's own bound:
+# LSB-style handlers hold a fixed number of bits per pixel (or per file byte for run_stc); append-style
+# handlers are only bounded by disk space, so their fill ratio is taken relative to the carrier file size.
+HANDLERS = {
+    "run_stc": ("png", lambda c: (c["file_size"] - 2048) // 8),  # Less the STC length header
+    "run_s_uniward": ("png", lambda c: c["pixels"] // 16 // 8),  # Level-2 wavelet subband positions
+    "run_hugo": ("png", lambda c: c["pixels"] // 8),
+    "run_mvg": ("png", lambda c: c["pixels"] // 8),
+    "run_mipod": ("png", lambda c: c["pixels"] // 2 // 8),
+    "run_wow": ("png", lambda c: c["pixels"] // 8),
+    "advanced_image_steg": ("png", lambda c: c["pixels"] * 3 // 8 - 32),
+    "new_jpeg_steg": ("jpg", lambda c: c["pixels"] // 16 // 8),  # Quantized luma coefficients outside {0, 1}, conservatively
+    "image_steg": ("png", lambda c: c["file_size"]),
+    "mp3_steg": ("mp3", lambda c: c["file_size"]),
+    "mp4_steg": ("mp4", lambda c: c["file_size"]),
+    "wav_steg": ("wav", lambda c: (c["file_size"] - 44) // 2 // 8 - 8),  # One bit per 16-bit sample, less the trailer
+}
+
+# name -> cost function in core.algorithm_stubs taking the grayscale pixel array
+COST_MODELS = {
+    "wow": "_wow_costs",
+    "hugo": "_hugo_costs",
+    "s_uniward": "_s_uniward_costs",
+    "mvg": "_mvg_variances",
+}
+
+
+# --- Synthetic Carriers ---
+def _image_shape(megapixels: float):
+    # 3:2 aspect ratio, dimensions rounded to multiples of 8 so JPEG blocks line up
+    width = int((megapixels * 1e6 * 1.5) ** 0.5) // 8 * 8
+    return max(8, int(megapixels * 1e6 / width) // 8 * 8), max(8, width)
+
+
+def make_image(path: str, megapixels: float, seed: int = 0):
+    """Writes a natural-ish RGB image: gradients + low-frequency texture + noise, generated in row bands."""
+    import numpy as np
+    from PIL import Image
+
+    height, width = _image_shape(megapixels)
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    phases = rng.uniform(0, 2 * np.pi, size=(3, 4)).astype(np.float32)
+    for top in range(0, height, 256):
+        y = np.linspace(top / height, min(top + 256, height) / height, min(256, height - top),
+                        endpoint=False, dtype=np.float32)[:, None]
+        for channel in range(3):
+            p = phases[channel]
+            band = (90 + 80 * x * (1 - y) + 30 * np.sin(6 * x + p[0]) * np.cos(4 * y + p[1])
+                    + 15 * np.sin(40 * x * y + p[2]) + 8 * np.sin(120 * x + 90 * y + p[3]))
+            band += rng.normal(0, 3, size=band.shape).astype(np.float32)
+            image[top:top + 256, :, channel] = np.clip(band, 0, 255)
+    fmt = "JPEG" if path.lower().endswith((".jpg", ".jpeg")) else "PNG"
+    Image.fromarray(image).save(path, fmt, **({"quality": 90} if fmt == "JPEG" else {"compress_level": 1}))
+
+
+# A silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, stereo. An all-zero body decodes as silence.
+_MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x64])
+_MP3_FRAME_SIZE = 144 * 128000 // 44100
+
+
+def make_mp3(path: str, size_mb: float):
+    """Writes silent MPEG audio frames of about `size_mb` behind an ID3v2 tag (mp3_steg edits the tag)."""
+    from mutagen.id3 import ID3, TIT2
+
+    frame = _MP3_FRAME_HEADER + bytes(_MP3_FRAME_SIZE - len(_MP3_FRAME_HEADER))
+    frames_per_write = 1024
+    remaining = max(1, int(size_mb * 1024 * 1024) // _MP3_FRAME_SIZE)
+    with open(path, "wb") as f:
+        while remaining:
+            count = min(remaining, frames_per_write)
+            f.write(frame * count)
+            remaining -= count
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Rygelock benchmark"))
+    tags.save(path)
+
+
+def make_mp4(path: str, size_mb: float):
+    """Writes a minimal ISO-BMFF file: ftyp, a moov/mvhd stub and an all-zero mdat of about `size_mb`."""
+    def box(box_type: bytes, body: bytes) -> bytes:
+        return (8 + len(body)).to_bytes(4, 'big') + box_type + body
+
+    mvhd = box(b"mvhd", bytes(4) + bytes(8) + (1000).to_bytes(4, 'big') + bytes(4)
+               + (0x00010000).to_bytes(4, 'big') + (0x0100).to_bytes(2, 'big') + bytes(70) + (2).to_bytes(4, 'big'))
+    mdat_size = max(0, int(size_mb * 1024 * 1024))
+    with open(path, "wb") as f:
+        f.write(box(b"ftyp", b"isom" + (512).to_bytes(4, 'big') + b"isomiso2mp41"))
+        f.write(box(b"moov", mvhd))
+        f.write((8 + mdat_size).to_bytes(4, 'big') + b"mdat")
+        chunk = bytes(1024 * 1024)
+        while mdat_size:
+            written = f.write(chunk[:min(len(chunk), mdat_size)])
+            mdat_size -= written
+
+
+def make_wav(path: str, size_mb: float, seed: int = 0):
+    """Writes about `size_mb` of 16-bit stereo 44.1 kHz PCM holding low-level noise, one second at a time."""
+    import wave
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    remaining = max(1, int(size_mb * 1024 * 1024) // 4)  # 4-byte stereo frames
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        while remaining:
+            count = min(remaining, 44100)
+            f.writeframes(rng.normal(0, 200, size=count * 2).astype("<i2").tobytes())
+            remaining -= count
+
+
+def ensure_carrier(workdir: str, kind: str, size: float) -> dict:
+    """Creates (or reuses) a cached carrier and returns its description."""
+    label = f"{size:g}mp" if kind in ("png", "jpg") else f"{size:g}mb"
+    path = os.path.join(workdir, f"carrier_{label}.{kind}")
+    if not os.path.exists(path):
+        partial = path + ".partial." + kind
+        if kind in ("png", "jpg"):
+            make_image(partial, size)
+        elif kind == "mp3":
+            make_mp3(partial, size)
+        elif kind == "wav":
+            make_wav(partial, size)
+        else:
+            make_mp4(partial, size)
+        os.replace(partial, path)
+    carrier = {"path": path, "kind": kind, "label": label, "file_size": os.path.getsize(path), "pixels": 0}
+    if kind in ("png", "jpg"):
+        height, width = _image_shape(size)
+        carrier["pixels"] = height * width
+    return carrier
+
+
+def ensure_payload(workdir: str, size: int) -> str:
+    path = os.path.join(workdir, f"payload_{size}.bin")
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining:
+                written = f.write(os.urandom(min(remaining, 1024 * 1024)))
+                remaining -= written
+    return path
+
+
+# --- Case Execution ---
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def run_case(case: dict) -> dict:
+    """Runs one handler on one carrier inside this process. Handler output is captured, not printed."""
+    import core.algorithm_stubs as stubs
+
+    fn = getattr(stubs, case["handler"])
+    baseline_rss = _peak_rss_mb()
+    handler_output = io.StringIO()
+    with contextlib.redirect_stdout(handler_output):
+        started = time.perf_counter()
+        returned = fn(case["carrier"], payload_path=case["payload"], output_path=case["output"])
+        wall = time.perf_counter() - started
+    ok = returned is not None and os.path.exists(case["output"])
+    outcome = {"status": "ok" if ok else "error", "wall_s": round(wall, 4),
+               "baseline_rss_mb": round(baseline_rss, 1), "peak_rss_mb": round(_peak_rss_mb(), 1),
+               "output_bytes": os.path.getsize(case["output"]) if ok else None}
+    if not ok:
+        # Handlers report failures by printing "[name ERROR] ..." and returning None
+        lines = [line for line in handler_output.getvalue().splitlines() if line.strip()]
+        outcome["message"] = lines[-1] if lines else "Handler returned no output."
+    return outcome
+
+
+def _run_case_subprocess(case: dict, timeout: float) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "_case", json.dumps(case)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout", "wall_s": None}
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"status": "crashed", "wall_s": None, "message": completed.stderr.strip()[-500:]}
+    return json.loads(lines[-1])
+
+
+def run_benchmarks(handlers, sizes_mp, media_mb, fills, timeout, workdir) -> dict:
+    results = []
+    for handler in handlers:
+        kind, capacity_fn = HANDLERS[handler]
+        for size in (sizes_mp if kind in ("png", "jpg") else media_mb):
+            carrier = ensure_carrier(workdir, kind, size)
+            capacity = max(1, capacity_fn(carrier))
+            for fill in fills:
+                payload_bytes = max(1, int(capacity * fill))
+                case = {"handler": handler, "carrier": carrier["path"],
+                        "payload": ensure_payload(workdir, payload_bytes),
+                        "output": os.path.join(workdir, f"out_{handler}_{carrier['label']}.{kind}")}
+                outcome = _run_case_subprocess(case, timeout)
+                if os.path.exists(case["output"]):
+                    os.remove(case["output"])
+                wall = outcome.get("wall_s")
+                result = {"handler": handler, "carrier": carrier["label"], "carrier_kind": kind,
+                          "carrier_bytes": carrier["file_size"], "megapixels": round(carrier["pixels"] / 1e6, 3),
+                          "fill": fill, "payload_bytes": payload_bytes, **outcome,
+                          "mb_per_s": round(payload_bytes / (1024 * 1024) / wall, 4) if wall else None}
+                results.append(result)
+                print(f"{handler:20} {carrier['label']:>8} fill {fill:<5g} {result['status']:8} "
+                      f"{wall if wall is not None else '-':>10} s  {result['mb_per_s'] if wall else '-':>10} MB/s  "
+                      f"{result.get('peak_rss_mb', '-'):>8} MB RSS  {result.get('message', '')}", file=sys.stderr)
+    return {"version": RESULTS_VERSION, "meta": {**_environment(), "timeout_s": timeout}, "results": results}
+
+
+def _environment() -> dict:
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "machine": platform.machine(), "cpu_count": os.cpu_count()}
+
+
+# --- Cost Models ---
+def _best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _stream_time(img_np, repeat: int) -> float:
+    """Best time of one float32 read-and-write pass over an image-sized array."""
+    import numpy as np
+    pixels = img_np.astype(np.float32)
+    scratch = np.empty_like(pixels)
+    return _best_time(lambda: np.multiply(pixels, 2, out=scratch), repeat)
+
+
+def run_cost_benchmarks(models, sizes_mp, repeat, workdir) -> dict:
+    """
+    Times each cost model in this process, best of `repeat`. `stream_passes` is the model's time in
+    units of one read-and-write float32 pass over the image: 1 would be running at memory bandwidth.
+    """
+    import numpy as np
+    from PIL import Image
+    import core.algorithm_stubs as stubs
+
+    results = []
+    for size in sizes_mp:
+        carrier = ensure_carrier(workdir, "png", size)
+        with Image.open(carrier["path"]) as img:
+            img_np = np.array(img.convert("L"))
+        stream_s = _stream_time(img_np, repeat)
+
+        for model in models:
+            fn = getattr(stubs, COST_MODELS[model])
+            wall = _best_time(lambda: fn(img_np), repeat)
+            result = {"model": model, "carrier": carrier["label"], "megapixels": round(img_np.size / 1e6, 3),
+                      "wall_s": round(wall, 4), "mpix_per_s": round(img_np.size / 1e6 / wall, 2),
+                      "stream_s": round(stream_s, 4), "stream_passes": round(wall / stream_s, 1)}
+            results.append(result)
+            print(f"{model:12} {carrier['label']:>8} {wall:>10.4f} s  {result['mpix_per_s']:>8} MP/s  "
+                  f"{result['stream_passes']:>8} stream passes", file=sys.stderr)
+    return {"version": RESULTS_VERSION, "meta": {**_environment(), "repeat": repeat}, "results": results}
+
+
+# --- Baseline Comparison ---
+def _case_key(result: dict):
+    return result["handler"], result["carrier"], result["fill"]
+
+
+def compare_results(baseline: dict, current: dict, threshold: float, min_seconds: float = 0.05):
+    """
+    Returns (rows, regressions). A case regresses when its wall time or peak RSS grows by more than
+    `threshold` (a fraction), or when it succeeded in the baseline and no longer does. Wall times
+    below `min_seconds` are timer noise and never count as a regression.
+    """
+    baseline_cases = {_case_key(r): r for r in baseline["results"]}
+    rows, regressions = [], []
+    for result in current["results"]:
+        key = _case_key(result)
+        before = baseline_cases.get(key)
+        if before is None:
+            continue
+        row = {"handler": key[0], "carrier": key[1], "fill": key[2],
+               "status": f"{before['status']} -> {result['status']}"}
+        regressed = before["status"] == "ok" and result["status"] != "ok"
+        for metric in ("wall_s", "peak_rss_mb"):
+            old, new = before.get(metric), result.get(metric)
+            change = (new - old) / old if old and new is not None else None
+            row[metric] = {"baseline": old, "current": new, "change": round(change, 4) if change is not None else None}
+            noise = metric == "wall_s" and max(old or 0, new or 0) < min_seconds
+            regressed |= change is not None and change > threshold and not noise
+        row["regressed"] = regressed
+        rows.append(row)
+        if regressed:
+            regressions.append(row)
+    return rows, regressions
+
+
+def _print_comparison(rows):
+    def fmt(metric):
+        change = metric["change"]
+        return f"{metric['baseline']} -> {metric['current']} ({change:+.1%})" if change is not None else "-"
+
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else "ok"
+        print(f"{flag:9} {row['handler']:20} {row['carrier']:>8} fill {row['fill']:<5g} "
+              f"time {fmt(row['wall_s']):32} rss {fmt(row['peak_rss_mb'])}")
+
+
+# --- Argument Parsing ---
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Rygelock carrier handler benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmark matrix and write JSON results")
+    run.add_argument("--handlers", nargs="+", choices=sorted(HANDLERS), default=list(HANDLERS))
+    run.add_argument("--sizes", nargs="+", type=float, default=list(DEFAULT_SIZES_MP), metavar="MP",
+                     help="Image carrier sizes in megapixels")
+    run.add_argument("--media-mb", nargs="+", type=float, default=list(DEFAULT_MEDIA_MB), metavar="MB",
+                     help="MP3/MP4/WAV carrier sizes in MB")
+    run.add_argument("--fills", nargs="+", type=float, default=list(DEFAULT_FILLS), metavar="RATIO",
+                     help="Payload size as a fraction of each handler's capacity")
+    run.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-case timeout in seconds")
+    run.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "rygelock_bench"),
+                     help="Where carriers and payloads are generated and cached")
+    run.add_argument("--output", help="Write results here instead of stdout")
+
+    costs = sub.add_parser("costs", help="Time the cost models against a streaming pass over the image")
+    costs.add_argument("--models", nargs="+", choices=sorted(COST_MODELS), default=list(COST_MODELS))
+    costs.add_argument("--sizes", nargs="+", type=float, default=list(DEFAULT_COST_SIZES_MP), metavar="MP",
+                       help="Image sizes in megapixels")
+    costs.add_argument("--repeat", type=int, default=3, help="Runs per model; the best time is kept")
+    costs.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "rygelock_bench"),
+                       help="Where carriers are generated and cached")
+    costs.add_argument("--output", help="Write results here instead of stdout")
+
+    compare = sub.add_parser("compare", help="Compare results against a saved baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown/growth")
+    compare.add_argument("--min-seconds", type=float, default=0.05,
+                         help="Ignore wall-time changes when both runs are faster than this")
+    compare.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    return parser
+
+
+def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["_case"]:  # Internal: one case in a fresh process
+        print(json.dumps(run_case(json.loads(argv[1]))))
+        return 0
+
+    args = build_parser().parse_args(argv)
+    if args.command in ("run", "costs"):
+        os.makedirs(args.workdir, exist_ok=True)
+        if args.command == "run":
+            report = run_benchmarks(args.handlers, args.sizes, args.media_mb, args.fills, args.timeout, args.workdir)
+        else:
+            report = run_cost_benchmarks(args.models, args.sizes, args.repeat, args.workdir)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    rows, regressions = compare_results(baseline, current, args.threshold, args.min_seconds)
+    if args.json:
+        print(json.dumps({"threshold": args.threshold, "cases": rows, "regressions": len(regressions)}, indent=2))
+    else:
+        _print_comparison(rows)
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%} in {len(rows)} compared case(s).")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# Headless command-line interface for Rygelock
+#
+#   python rygel.py embed CARRIER PAYLOAD --password PW [--carrier MORE_CARRIER ...] [options]
+#   python rygel.py extract STEGO_FILE [STEGO_FILE ...] --password PW [--key KEY_FILE]
+#   python rygel.py batch MANIFEST.jsonl [--workers N] [--results RESULTS.jsonl]
+#
+# embed/extract take --trace FILE to record per-stage timing spans (see core.tracing); batch jobs
+# take the same as "trace" / "trace_format" manifest fields.
+#
+# Nothing in here (or in core/) imports PyQt5 or pygame, so it runs on servers without a display.
+
+import argparse
+import contextlib
+import getpass
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core.tracing import TRACE_FORMATS
+
+ENCRYPTION_CHOICES = ("AES", "Blowfish", "Fernet")
+
+
+# --- Job Runners ---
+def _resolve_password(spec: dict, field: str):
+    """A password comes either inline (`field`) or from an environment variable (`field` + "_env")."""
+    if spec.get(field + "_env"):
+        return os.environ.get(spec[field + "_env"])
+    return spec.get(field)
+
+
+def _build_embed_config(spec: dict) -> dict:
+    """
+    Builds the config dict embed_files() expects, the same shape EmbedWidget.start_embedding produces.
+    A list of carriers shards the payload across all of them.
+    """
+    carrier_files = spec["carrier"] if isinstance(spec["carrier"], list) else [spec["carrier"]]
+    config = {
+        "carriers": [{"file": path, "algorithm": spec.get("algorithm", "auto")} for path in carrier_files],
+        "payloads": [spec["payload"]],
+        "encryption": spec.get("encryption", "AES"),
+        "password": _resolve_password(spec, "password"),
+        "fake_password": _resolve_password(spec, "fake_password"),
+        "generate_key": bool(spec.get("generate_key", False)),
+        "masking": bool(spec.get("masking", False)),
+        "matryoshka_layers": int(spec.get("matryoshka_layers", 0)),
+        "fake_payloads": [spec["fake_payload"]] if spec.get("fake_payload") else [],
+        "generate_fake_key": False,
+    }
+    if spec.get("output_dir"):
+        config["output_dir"] = spec["output_dir"]
+    if not config["password"]:
+        raise ValueError("A password is required for embedding.")
+    if config["encryption"] not in ENCRYPTION_CHOICES:
+        raise ValueError(f"Unknown encryption algorithm: {config['encryption']}")
+    return config
+
+
+def run_job(spec: dict) -> dict:
+    """
+    Runs one embed or extract job described by `spec` and returns a JSON-serialisable result.
+    Engine chatter goes to stderr so stdout only ever carries result lines. With spec["trace"],
+    the job's stage spans are written to that file (spec["trace_format"]: "jsonl" or "chrome").
+    """
+    from core.steg_engine import embed_files, extract_payload
+    from core.tracing import SpanRecorder
+    from utils.config import get_output_dir
+
+    started = time.perf_counter()
+    result = {"id": spec.get("id"), "op": spec.get("op")}
+    recorder = SpanRecorder() if spec.get("trace") else contextlib.nullcontext()
+    try:
+        with contextlib.redirect_stdout(sys.stderr), recorder:
+            if spec.get("op") == "embed":
+                config = _build_embed_config(spec)
+                outcome = embed_files(config, lambda _: None)
+                output_dir = config.get("output_dir") or get_output_dir()
+                result.update(outcome)
+                result["ok"] = outcome["status"] == "Success"
+                result["output_files"] = [os.path.join(output_dir, name) for name in outcome["embedded_files"]]
+            elif spec.get("op") == "extract":
+                key_data = None
+                if spec.get("key"):
+                    with open(spec["key"], "rb") as f:
+                        key_data = f.read()
+                outcome = extract_payload(spec["file"], password=_resolve_password(spec, "password"),
+                                          key_data=key_data, output_dir=spec.get("output_dir"))
+                result.update(outcome)
+                result["ok"] = outcome["status"] == "success"
+            else:
+                raise ValueError(f"Unknown job op: {spec.get('op')!r} (expected 'embed' or 'extract')")
+    except Exception as e:
+        result.update({"ok": False, "status": "error", "message": str(e)})
+    result["elapsed_s"] = round(time.perf_counter() - started, 4)
+    if spec.get("trace"):
+        try:
+            recorder.write(spec["trace"], spec.get("trace_format"))
+            result["trace"] = spec["trace"]
+        except Exception as e:
+            result["trace_error"] = str(e)
+    return result
+
+
+# --- Batch Mode ---
+def _read_manifest(path: str):
+    """Yields one job spec per non-blank, non-comment line of a JSON Lines manifest."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            spec = json.loads(line)
+            spec.setdefault("id", line_no)
+            yield spec
+
+
+def run_batch(manifest_path: str, workers: int, results_file) -> int:
+    """
+    Runs every job in the manifest on a pool of `workers` processes, writing one JSON result
+    per line to `results_file` as jobs finish. Returns the number of failed jobs.
+    """
+    failed = 0
+
+    def emit(result):
+        nonlocal failed
+        failed += not result.get("ok")
+        results_file.write(json.dumps(result, default=str) + "\n")
+        results_file.flush()
+
+    specs = list(_read_manifest(manifest_path))
+    if workers <= 1:
+        for spec in specs:
+            emit(run_job(spec))
+        return failed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, spec): spec for spec in specs}
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                emit(future.result())
+            except Exception as e:  # The worker process itself died
+                emit({"id": spec.get("id"), "op": spec.get("op"), "ok": False, "status": "error",
+                      "message": f"Worker failed: {e}"})
+    return failed
+
+
+# --- Argument Parsing ---
+def _password_from_args(args, prompt="Password: "):
+    if args.password_env:
+        return os.environ.get(args.password_env)
+    if args.password:
+        return args.password
+    return getpass.getpass(prompt) if sys.stdin.isatty() else None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="rygel.py", description="Rygelock headless steganography tool.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_password_args(p):
+        p.add_argument("--password", help="Password (prefer --password-env or the interactive prompt)")
+        p.add_argument("--password-env", metavar="VAR", help="Read the password from this environment variable")
+        p.add_argument("--output-dir", help="Output directory (default: ~/Desktop/Rygelock_Output)")
+        p.add_argument("--trace", metavar="FILE", help="Record per-stage timing spans to FILE")
+        p.add_argument("--trace-format", choices=TRACE_FORMATS,
+                       help="Trace file format (default: jsonl for *.jsonl, otherwise chrome)")
+
+    embed = sub.add_parser("embed", help="Hide a payload inside a carrier file")
+    embed.add_argument("carrier")
+    embed.add_argument("payload")
+    add_password_args(embed)
+    embed.add_argument("--encryption", choices=ENCRYPTION_CHOICES, default="AES")
+    embed.add_argument("--layers", type=int, default=0, help="Additional Matryoshka encryption layers")
+    embed.add_argument("--masking", action="store_true")
+    embed.add_argument("--generate-key", action="store_true", help="Write a real_key.key bound to the payload")
+    embed.add_argument("--fake-payload", help="Decoy payload revealed by --fake-password")
+    embed.add_argument("--fake-password")
+    embed.add_argument("--carrier", action="append", default=[], dest="extra_carriers", metavar="CARRIER",
+                       help="Additional carrier; the payload is sharded across all carriers (repeatable)")
+
+    extract = sub.add_parser("extract", help="Recover a payload from a stego file")
+    extract.add_argument("file", nargs="+", help="Stego file, or every carrier of a sharded embed")
+    add_password_args(extract)
+    extract.add_argument("--key", help="Key file generated at embed time")
+
+    batch = sub.add_parser("batch", help="Run embed/extract jobs from a JSON Lines manifest")
+    batch.add_argument("manifest")
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    batch.add_argument("--results", help="Write results here instead of stdout")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "batch":
+        if args.results:
+            with open(args.results, "w", encoding="utf-8") as results_file:
+                failed = run_batch(args.manifest, args.workers, results_file)
+        else:
+            failed = run_batch(args.manifest, args.workers, sys.stdout)
+        return 1 if failed else 0
+
+    if args.command == "embed":
+        spec = {"op": "embed", "carrier": [args.carrier] + args.extra_carriers, "payload": args.payload,
+                "password": _password_from_args(args), "encryption": args.encryption,
+                "matryoshka_layers": args.layers, "masking": args.masking, "generate_key": args.generate_key,
+                "fake_payload": args.fake_payload, "fake_password": args.fake_password,
+                "output_dir": args.output_dir}
+    else:
+        spec = {"op": "extract", "file": args.file, "password": _password_from_args(args),
+                "key": args.key, "output_dir": args.output_dir}
+    spec.update(trace=args.trace, trace_format=args.trace_format)
+
+    result = run_job(spec)
+    print(json.dumps(result, default=str))
+    return 0 if result.get("ok") else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,11 @@
+import io
 import os
 from core.algorithm_stubs import (
-    mp3_steg,mp4_steg,
-    image_steg, LSBImageHandler
+    mp3_steg,mp4_steg,wav_steg,run_mipod,
+    image_steg, LSBImageHandler,
+    PAYLOAD_STREAM, PAYLOAD_COPY_CHUNK
 )
+from core.job_queue import JobCancelled
 
 
 ## For assign Algorithm to extensions##
@@ -13,7 +16,9 @@ ALGORITHM_FN_MAP = {
     "bmp": image_steg,
     "tiff": image_steg,
     "mp3": mp3_steg,
-    "mp4": mp4_steg
+    "mp4": mp4_steg,
+    "wav": wav_steg,
+    "webp": run_mipod
 }
 
 
@@ -25,7 +30,9 @@ EXTRACT_FN_MAP = {
     "bmp": image_steg,
     "tiff": image_steg,
     "mp3": mp3_steg,
-    "mp4": mp4_steg
+    "mp4": mp4_steg,
+    "wav": wav_steg,
+    "webp": run_mipod
 }
 
 def route_extraction_algorithm(path):
@@ -67,7 +74,52 @@ def route_algorithm(path):
     algo_key = ext.lstrip('.')
     return ALGORITHM_FN_MAP.get(algo_key)
 
+def handler_streams_payload(carrier_path):
+    """True if the handler for this carrier can consume the payload as a stream (constant memory)."""
+    fn = route_algorithm(carrier_path)
+    return bool(getattr(fn, "payload_capabilities", 0) & PAYLOAD_STREAM)
+
+def carrier_capacity(carrier_path):
+    """Largest payload in bytes the carrier's handler can hold, or None when only bounded by disk space."""
+    fn = route_algorithm(carrier_path)
+    if fn is None:
+        raise ValueError(f"No stego function found for extension: {carrier_path}")
+    capacity = getattr(fn, "max_payload", None)
+    return capacity(carrier_path) if callable(capacity) else capacity
+
+def _drain(stream) -> bytearray:
+    """Reads a stream fully into memory for handlers that need the whole payload at once."""
+    buffer = bytearray()
+    for chunk in iter(lambda: stream.read(PAYLOAD_COPY_CHUNK), b""):
+        buffer += chunk
+    return buffer
+
+class _CancellationWatch(io.RawIOBase):
+    """
+    Passes a payload stream through to a handler and remembers a JobCancelled raised while reading it.
+    Handlers log and swallow their own errors, so stego_apply re-raises it once the handler returns.
+    """
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+        self.cancelled = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            return self._stream.readinto(buffer)
+        except JobCancelled as e:
+            self.cancelled = e
+            raise
+
 def stego_apply(carrier_path, payload, algorithm, output_path=None):
+    """
+    Embeds `payload` into the carrier. `payload` may be a file path, bytes / bytearray / memoryview,
+    or a readable stream; nothing is written to disk besides the output file.
+    A JobCancelled raised by the payload stream propagates, even when the handler swallowed it.
+    """
     fn = route_algorithm(carrier_path)
     if fn is None:
         raise ValueError(f"No stego function found for extension: {carrier_path}")
@@ -76,21 +128,27 @@ def stego_apply(carrier_path, payload, algorithm, output_path=None):
         output_path = os.path.splitext(carrier_path)[0] + "_stego" + os.path.splitext(carrier_path)[1]
 
     print(f"[stego_apply] Running {fn.__name__} on {carrier_path} → {output_path}")
-    if isinstance(payload, bytes):
-        temp_payload_path = output_path + ".payload"
-        with open(temp_payload_path, "wb") as f:
-            f.write(payload)
-        payload_path = temp_payload_path
+    if isinstance(payload, str):
+        payload_args = {"payload_path": payload}
+    elif hasattr(payload, "read") and not getattr(fn, "payload_capabilities", 0) & PAYLOAD_STREAM:
+        payload_args = {"payload": _drain(payload)}
+    elif hasattr(payload, "read"):
+        payload = _CancellationWatch(payload)
+        payload_args = {"payload": payload}
     else:
-        payload_path = payload
+        payload_args = {"payload": payload}
 
     try:
-        result = fn(carrier_path, payload_path, output_path)
+        result = fn(carrier_path, output_path=output_path, **payload_args)
+        if getattr(payload, "cancelled", None):
+            raise payload.cancelled
         if not os.path.exists(output_path):
             print(f"[ERROR] Output file not found after embedding: {output_path}")
         else:
             print(f"[OK] Stego file created: {output_path}")
         return result
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"[stego_apply ERROR] {e}")
         return None
@@ -1,3 +1,4 @@
+import io
 import os
 import numpy as np
 from PIL import Image
@@ -11,52 +12,185 @@ from pydub import AudioSegment
 import wave
 import contextlib
 import tempfile
-from scipy.signal import wiener
+from concurrent.futures import ThreadPoolExecutor
 from scipy.fftpack import dct , idct
 from scipy.ndimage import uniform_filter, convolve
+from scipy.signal import fftconvolve
 from scipy.fftpack import dct, idct
 from utils.key_encoder import generate_dict_checksum
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, PRIV
+from mutagen.id3 import ID3
+from core.stc import stc_embed, stc_extract, STC_CONSTRAINT_HEIGHT
+from core.jpeg_coefficients import read_jpeg, write_jpeg
+from core.carrier_output import carrier_output, carrier_rewrite, copy_file_region, output_target
+from core.id3_tags import (
+    read_id3_tag, read_frame, read_raw_frame, pack_frame_header, pack_id3_tag, ID3_HEADER_SIZE, ID3_FRAME_HEADER_SIZE,
+    ID3_MAX_SIZE
+)
+from core.mp4_boxes import read_box_index, find_last_box, pack_box_header, close_open_box
 
 
 HEADER_MARKER = b"RYGELHDR\0"
+PAYLOAD_COPY_CHUNK = 1024 * 1024
+STC_LENGTH_BITS = 32
+STC_HEADER_ELEMENTS = 2048  # Carrier bytes holding the payload length for run_stc (coded at rate 1/64)
 
-def run_stc(carrier_path, payload_path, output_path):
+# --- Payload capability flags ---
+# Every handler takes its payload either as payload_path (a file on disk) or as payload=,
+# which may be bytes, bytearray, memoryview or a readable stream.
+PAYLOAD_BUFFER = 1  # Accepts an in-memory buffer (streams are drained into memory first)
+PAYLOAD_STREAM = 2  # Consumes a readable stream chunk by chunk, never holding the whole payload
+
+
+def handler_capabilities(flags, max_payload=None):
     """
-    STC-like simulation Embedding payload bits into carrier using selective bit flipping with parity-style constraint
+    Decorator recording which payload forms a carrier handler can consume (see stego_apply), and the
+    largest payload its container format can hold (None when only bounded by disk space), or a function
+    of the carrier path returning it for handlers whose capacity depends on the carrier.
     """
-    try:
-        with open(carrier_path, 'rb') as f:
-            carrier_bytes = bytearray(f.read())
+    def mark(fn):
+        fn.payload_capabilities = flags
+        fn.max_payload = max_payload
+        return fn
+    return mark
+
 
+def _payload_buffer(payload_path=None, payload=None):
+    """Returns the whole payload as a buffer, whichever way it was supplied."""
+    if payload_path:
         with open(payload_path, 'rb') as f:
-            payload = f.read()
+            return f.read()
+    if payload is None:
+        raise ValueError("A payload_path or payload must be provided.")
+    if hasattr(payload, "read"):
+        return payload.read()
+    return memoryview(payload).cast('B')
+
+
+def _write_payload(f_out, payload_path=None, payload=None) -> int:
+    """Copies the payload into `f_out` chunk by chunk. Returns the number of bytes written."""
+    start = f_out.tell()
+    if payload_path:
+        with open(payload_path, 'rb') as f_in:
+            shutil.copyfileobj(f_in, f_out, PAYLOAD_COPY_CHUNK)
+    elif payload is None:
+        raise ValueError("A payload_path or payload must be provided.")
+    elif hasattr(payload, "read"):
+        shutil.copyfileobj(payload, f_out, PAYLOAD_COPY_CHUNK)
+    else:
+        f_out.write(payload)
+    return f_out.tell() - start
 
-        payload_bits = ''.join(f'{byte:08b}' for byte in payload)
-        payload_index = 0
 
-        block_size = 8
-        max_capacity = len(carrier_bytes) // block_size
+# --- Cost-based embedding ---
+def _select_cheapest(costs, count: int) -> np.ndarray:
+    """
+    Flat indices of the `count` lowest costs, cheapest first. Equal costs are taken in position order,
+    which is the order a stable argsort gives. Only the threshold cost is found by np.partition; the
+    full array is never sorted, just the selected positions.
+    """
+    costs = np.asarray(costs).ravel()
+    if count <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if count >= len(costs):
+        return np.argsort(costs, kind='stable')
+    threshold = np.partition(costs, count - 1)[count - 1]
+    below = np.flatnonzero(costs < threshold)
+    ties = np.flatnonzero(costs == threshold)[:count - len(below)]
+    chosen = np.concatenate((below, ties))
+    return chosen[np.argsort(costs[chosen], kind='stable')]
 
-        if len(payload_bits) > max_capacity * block_size:
-            raise ValueError("Payload too large to embed in carrier.")
 
-        for i in range(0, len(carrier_bytes), block_size):
-            if payload_index >= len(payload_bits):
-                break
+def _write_parity(flat_pixels, indices, bits):
+    """Sets the least significant bit of flat_pixels[indices] to `bits` in place, in one assignment."""
+    values = flat_pixels[indices]
+    flat_pixels[indices] = values ^ ((values ^ bits) & 1)
 
-            for j in range(block_size):
-                bit_pos = i + j
-                if bit_pos >= len(carrier_bytes) or payload_index >= len(payload_bits):
-                    break
-                target_bit = int(payload_bits[payload_index])
-                carrier_bytes[bit_pos] = (carrier_bytes[bit_pos] & 0xFE) | target_bit
-                payload_index += 1
 
-        with open(output_path, 'wb') as f:
-            f.write(carrier_bytes)
+class CarrierRegion(io.RawIOBase):
+    """
+    Read-only, seekable view of a byte range inside a carrier file.
+    Extractors return this with stream=True so the payload is never loaded into memory at once.
+    """
+    def __init__(self, path, offset, length):
+        super().__init__()
+        self._file = open(path, "rb")
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._length - self._pos)
+        if size <= 0:
+            return 0
+        self._file.seek(self._offset + self._pos)
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._pos += read
+        return read
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+@handler_capabilities(PAYLOAD_BUFFER)
+def run_stc(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, costs=None,
+            constraint_height=STC_CONSTRAINT_HEIGHT, **kwargs):
+    """
+    Syndrome-trellis coding over the least significant bits of the carrier's bytes (see core.stc).
+    `costs` is the cost of flipping each carrier byte (np.inf leaves a byte untouched), uniform when
+    omitted. The first STC_HEADER_ELEMENTS bytes carry the payload length and the rest the payload.
+    Extraction must use the constraint height the payload was embedded with.
+    """
+    if extract:
+        try:
+            carrier_bits = np.fromfile(carrier_path, dtype=np.uint8) & 1
+            length_bits = stc_extract(carrier_bits[:STC_HEADER_ELEMENTS], STC_LENGTH_BITS, constraint_height)
+            payload_size = int.from_bytes(np.packbits(length_bits).tobytes(), 'big')
+            payload_bits = stc_extract(carrier_bits[STC_HEADER_ELEMENTS:], payload_size * 8, constraint_height)
+            return np.packbits(payload_bits).tobytes()
+        except Exception as e:
+            print(f"[run_stc EXTRACT ERROR] {e}")
+            return b""
 
+    try:
+        carrier = np.fromfile(carrier_path, dtype=np.uint8)
+        if len(carrier) <= STC_HEADER_ELEMENTS:
+            raise ValueError("Carrier is too small for STC embedding.")
+        costs = np.ones(len(carrier), dtype=np.float32) if costs is None else np.asarray(costs, dtype=np.float32)
+        if len(costs) != len(carrier):
+            raise ValueError("There must be exactly one cost per carrier byte.")
+
+        payload = _payload_buffer(payload_path, payload)
+        payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+        if len(payload_bits) > len(carrier) - STC_HEADER_ELEMENTS:
+            raise ValueError("Payload too large to embed in carrier.")
+        length_bits = np.unpackbits(np.frombuffer(len(payload).to_bytes(STC_LENGTH_BITS // 8, 'big'), dtype=np.uint8))
+
+        cover_bits = carrier & 1
+        stego_bits = np.concatenate([
+            stc_embed(cover_bits[:STC_HEADER_ELEMENTS], costs[:STC_HEADER_ELEMENTS], length_bits, constraint_height),
+            stc_embed(cover_bits[STC_HEADER_ELEMENTS:], costs[STC_HEADER_ELEMENTS:], payload_bits, constraint_height),
+        ])
+        carrier ^= cover_bits ^ stego_bits  # Flip exactly the LSBs the trellis changed
+
+        carrier.tofile(output_path)
         return output_path
 
     except Exception as e:
@@ -64,42 +198,104 @@ def run_stc(carrier_path, payload_path, output_path):
         return None
 
 
-def run_s_uniward(carrier_path, payload_path, output_path):
+S_UNIWARD_WAVELET = 'db8'
+S_UNIWARD_LEVEL = 2
+S_UNIWARD_MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes of tile working memory shared by all run_s_uniward workers
+S_UNIWARD_TILE_BYTES = 32  # Working bytes per tile pixel: the float32 tile plus PyWavelets' padded copies and subbands
+
+
+def _s_uniward_support(k, filter_length, level=S_UNIWARD_LEVEL):
+    """First and last pixel, along one axis, feeding level-`level` coefficient k of a 'symmetric' mode DWT."""
+    scale = 1 << level
+    return scale * k - (scale - 1) * (filter_length - 2), scale * k + scale - 1
+
+
+def _s_uniward_positions(n, filter_length, level=S_UNIWARD_LEVEL):
+    """
+    Level-`level` coefficients along an axis of n pixels whose support is centred inside the image.
+    Returns (first coefficient, pixel at the centre of each); the pixels are 2^level apart.
+    """
+    count = n
+    for _ in range(level):
+        count = (count + filter_length - 1) // 2
+    first, last = _s_uniward_support(np.arange(count), filter_length, level)
+    centres = (first + last) // 2
+    inside = np.flatnonzero((centres >= 0) & (centres < n))
+    return int(inside[0]), centres[inside]
+
+
+def _s_uniward_costs(img_np, memory_budget=S_UNIWARD_MEMORY_BUDGET, workers=None):
+    """
+    S-UNIWARD cost 1 / (1 + |LH| + |HL| + |HH|) of every level-2 db8 detail position centred inside
+    the image, plus the pixel rows and columns those positions map to.
+    The image is cut into tiles of coefficients. Each tile is transformed with a halo covering its
+    filter support, and starts on a multiple of 2^level so it keeps the decimation phase. Its
+    coefficients therefore equal those of the whole-image transform. Tiles are sized so that
+    `workers` of them in flight fit in `memory_budget`, and run on a thread pool; PyWavelets releases
+    the GIL while it filters.
+    """
+    filter_length = pywt.Wavelet(S_UNIWARD_WAVELET).dec_len
+    scale = 1 << S_UNIWARD_LEVEL
+    halo = (scale - 1) * (filter_length - 2) + scale
+    first_row, row_pixels = _s_uniward_positions(img_np.shape[0], filter_length)
+    first_col, col_pixels = _s_uniward_positions(img_np.shape[1], filter_length)
+    cost_map = np.empty((len(row_pixels), len(col_pixels)), dtype=np.float32)
+
+    # Full-width bands when the image is narrow enough, square tiles otherwise
+    workers = workers or os.cpu_count() or 1
+    tile_pixels = max(1, memory_budget // workers // S_UNIWARD_TILE_BYTES)
+    tile_cols = min(len(col_pixels), max(1, (math.isqrt(tile_pixels) - halo) // scale))
+    tile_rows = max(1, (tile_pixels // (scale * tile_cols + halo) - halo) // scale)
+    tiles = [(top, left) for top in range(0, len(row_pixels), tile_rows) for left in range(0, len(col_pixels), tile_cols)]
+
+    def tile_axis(first, stop, n):
+        # Pixel range [begin, end) holding the support of coefficients first..stop-1 (global numbering)
+        begin = max(0, _s_uniward_support(first, filter_length)[0] // scale * scale)
+        end = min(n, _s_uniward_support(stop - 1, filter_length)[1] + 1)
+        return begin, end
+
+    def cost_tile(top, left):
+        bottom, right = min(len(row_pixels), top + tile_rows), min(len(col_pixels), left + tile_cols)
+        row_begin, row_end = tile_axis(first_row + top, first_row + bottom, img_np.shape[0])
+        col_begin, col_end = tile_axis(first_col + left, first_col + right, img_np.shape[1])
+        tile = img_np[row_begin:row_end, col_begin:col_end].astype(np.float32)
+        LH, HL, HH = pywt.wavedec2(tile, S_UNIWARD_WAVELET, level=S_UNIWARD_LEVEL)[1]
+        r0, c0 = first_row + top - row_begin // scale, first_col + left - col_begin // scale
+        window = (slice(r0, r0 + bottom - top), slice(c0, c0 + right - left))
+        costs = 1 / (1 + (np.abs(LH[window]) + np.abs(HL[window]) + np.abs(HH[window])))
+        cost_map[top:bottom, left:right] = np.clip(costs, 0.001, 1.0)
+
+    with ThreadPoolExecutor(max_workers=min(len(tiles), workers)) as pool:
+        for future in [pool.submit(cost_tile, top, left) for top, left in tiles]:
+            future.result()
+    return cost_map, row_pixels, col_pixels
+
+
+@handler_capabilities(PAYLOAD_BUFFER)
+def run_s_uniward(carrier_path, payload_path=None, output_path=None, payload=None,
+                  memory_budget=S_UNIWARD_MEMORY_BUDGET, workers=None):
     """
     S-UNIWARD using wavelet-domain distortion modeling.
     Input: grayscale PNG/JPEG, payload file (binary), output file path.
+    One bit goes into the pixel at the centre of each chosen level-2 detail position.
+    The wavelet costs are computed tile by tile within `memory_budget` bytes (see _s_uniward_costs).
     """
     try:
         img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
-
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
+        img_np = np.array(img)
 
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
+        payload = _payload_buffer(payload_path, payload)
+        payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
 
-        coeffs = pywt.wavedec2(img_np, 'db8', level=2)
-        _, (LH, HL, HH) = coeffs[1]
-        cost_map = np.abs(LH) + np.abs(HL) + np.abs(HH)
-        cost_map = 1 / (1 + cost_map)
-        cost_map = np.clip(cost_map, 0.001, 1.0)
+        cost_map, row_pixels, col_pixels = _s_uniward_costs(img_np, memory_budget, workers)
 
-        flat_img = img_np.flatten()
-        flat_costs = np.repeat(cost_map.flatten(), 1)
-        modifiable_indices = np.argsort(flat_costs)
-
-        if total_bits > len(modifiable_indices):
+        if len(payload_bits) > cost_map.size:
             raise ValueError("Payload too large to embed with distortion constraints.")
 
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            current_pixel = int(flat_img[idx])
-            if (current_pixel % 2) != bit:
-                flat_img[idx] = np.clip(current_pixel ^ 1, 0, 255)
+        rows, cols = np.divmod(_select_cheapest(cost_map, len(payload_bits)), len(col_pixels))
+        _write_parity(img_np.reshape(-1), row_pixels[rows] * img_np.shape[1] + col_pixels[cols], payload_bits)
 
-        stego_img = Image.fromarray(flat_img.reshape(img_np.shape).astype(np.uint8))
+        stego_img = Image.fromarray(img_np)
         stego_img.save(output_path)
         return output_path
 
@@ -108,66 +304,73 @@ def run_s_uniward(carrier_path, payload_path, output_path):
         return None
 
 
-def run_hugo(carrier_path, payload_path, output_path, gamma=1.0, sigma=1.0):
+HUGO_BAND_PIXELS = 1 << 20  # Pixels per row band in _hugo_costs; bounds its temporary arrays
+HUGO_DIRECTIONS = ((-1, 1), (0, 1), (1, 1), (1, 0))
+
+
+def _hugo_costs(img_np, gamma=1.0, sigma=1.0):
     """
-    HUGO-inspired embedding: calculates pixel-wise costs using directional differences and embeds data minimizing distortion.
+    HUGO costs of changing each pixel by -1 and by +1, as two float32 arrays. For each direction the
+    pixel sits in four triples of neighbouring differences, each costing (sigma + |triple|) ** -gamma.
+    Works on whole row bands of shifted difference arrays, summing in the same order as the
+    per-pixel formula so the float32 costs come out bit-for-bit the same.
     """
-    try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.int32)
-        padded = np.pad(img_np, pad_width=3, mode='reflect')
+    rows, cols = img_np.shape
+    padded = np.pad(img_np.astype(np.int32), pad_width=3, mode='reflect')
+    decrease = np.empty((rows, cols), dtype=np.float32)
+    increase = np.empty((rows, cols), dtype=np.float32)
 
-        rows, cols = img_np.shape
-        costs = np.zeros((rows, cols, 3), dtype=np.float32)  # [decrease, unchanged, increase]
+    def eval_cost(k, l, m):
+        return (sigma + np.sqrt((k * k + l * l + m * m).astype(np.float64))) ** -gamma
 
-        def eval_cost(k, l, m):
-            return (sigma + math.sqrt(k*k + l*l + m*m)) ** -gamma
+    band = max(1, HUGO_BAND_PIXELS // cols)
+    for top in range(0, rows, band):
+        bottom = min(rows, top + band)
+        total_decrease = total_increase = 0.0
+        for dr, dc in HUGO_DIRECTIONS:
+            # p[k + 3] is the neighbour k steps along the direction, for every pixel of the band
+            p = [padded[3 + top + dr * k:3 + bottom + dr * k, 3 + dc * k:3 + dc * k + cols] for k in range(-3, 4)]
+            d = [p[i + 1] - p[i] for i in range(6)]
 
-        def eval_direction(r, c, dr, dc):
-            p = [padded[r + dr*k, c + dc*k] for k in range(-3, 4)]
-            d = [p[i+1] - p[i] for i in range(6)]
-            pixel_costs = np.zeros(3)
+            direction_decrease = eval_cost(d[0], d[1], d[2] - 1) + eval_cost(d[1], d[2] - 1, d[3] + 1)
+            direction_increase = eval_cost(d[0], d[1], d[2] + 1) + eval_cost(d[1], d[2] + 1, d[3] - 1)
 
-            pixel_costs[0] += eval_cost(d[0], d[1], d[2]-1) + eval_cost(d[1], d[2]-1, d[3]+1)
-            pixel_costs[2] += eval_cost(d[0], d[1], d[2]+1) + eval_cost(d[1], d[2]+1, d[3]-1)
+            direction_decrease += eval_cost(d[2] - 1, d[3] + 1, d[4]) + eval_cost(d[3] + 1, d[4], d[5])
+            direction_increase += eval_cost(d[2] + 1, d[3] - 1, d[4]) + eval_cost(d[3] - 1, d[4], d[5])
 
-            pixel_costs[0] += eval_cost(d[2]-1, d[3]+1, d[4]) + eval_cost(d[3]+1, d[4], d[5])
-            pixel_costs[2] += eval_cost(d[2]+1, d[3]-1, d[4]) + eval_cost(d[3]-1, d[4], d[5])
+            total_decrease = total_decrease + direction_decrease
+            total_increase = total_increase + direction_increase
 
-            return pixel_costs
+        decrease[top:bottom] = total_decrease
+        increase[top:bottom] = total_increase
 
-        for r in range(rows):
-            for c in range(cols):
-                r_p, c_p = r + 3, c + 3
-                total = eval_direction(r_p, c_p, -1, 1) + eval_direction(r_p, c_p, 0, 1) + \
-                        eval_direction(r_p, c_p, 1, 1) + eval_direction(r_p, c_p, 1, 0)
-                if img_np[r, c] == 255:
-                    total[2] = np.inf
-                if img_np[r, c] == 0:
-                    total[0] = np.inf
-                costs[r, c] = [total[0], 0, total[2]]
+    decrease[img_np == 0] = np.inf
+    increase[img_np == 255] = np.inf
+    return decrease, increase
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
 
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
+@handler_capabilities(PAYLOAD_BUFFER)
+def run_hugo(carrier_path, payload_path=None, output_path=None, payload=None, gamma=1.0, sigma=1.0):
+    """
+    HUGO-inspired embedding: calculates pixel-wise costs using directional differences and embeds data minimizing distortion.
+    """
+    try:
+        img = Image.open(carrier_path).convert("L")
+        img_np = np.array(img)
+        decrease, increase = _hugo_costs(img_np, gamma, sigma)
+
+        payload = _payload_buffer(payload_path, payload)
+        payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
 
-        flat_img = img_np.flatten()
-        cost_scores = (costs[:, :, 0] + costs[:, :, 2]).flatten()
-        modifiable_indices = np.argsort(cost_scores)
+        cost_scores = decrease + increase
+        del decrease, increase
 
-        if total_bits > len(modifiable_indices):
+        if len(payload_bits) > cost_scores.size:
             raise ValueError("Payload too large to embed into carrier.")
 
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            pixel_val = flat_img[idx]
-            if (pixel_val % 2) != bit:
-                flat_img[idx] = np.clip(pixel_val ^ 1, 0, 255)
+        _write_parity(img_np.reshape(-1), _select_cheapest(cost_scores, len(payload_bits)), payload_bits)
 
-        stego_img = Image.fromarray(flat_img.reshape(rows, cols).astype(np.uint8))
+        stego_img = Image.fromarray(img_np)
         stego_img.save(output_path)
         return output_path
 
@@ -176,77 +379,90 @@ def run_hugo(carrier_path, payload_path, output_path, gamma=1.0, sigma=1.0):
         return None
 
 
-def run_mvg(carrier_path, payload_path, output_path):
+MVG_WINDOW = 8  # Side of the square DCT windows whose coefficient variance drives run_mvg
+
+
+def _window_sums(a, size):
+    """Sums of `a` over every size × size window that fits, from its integral image."""
+    integral = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=a.dtype)
+    np.cumsum(np.cumsum(a, axis=0), axis=1, out=integral[1:, 1:])
+    return integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+
+
+def _mvg_variances(img_np, window=MVG_WINDOW):
+    """
+    For every pixel, the variance of the orthonormal 2-D DCT coefficients of each window × window
+    block that covers it, summed over those blocks and divided by the block area.
+    The DCT preserves energy, so the mean square coefficient of a block is its pixel sum of squares
+    over the block area, taken from an integral image. The coefficient sum is w·X·w, where
+    w holds the column sums of the DCT matrix; that is a separable weighted sum over the block.
+    """
+    rows, cols = img_np.shape
+    if rows < window or cols < window:
+        return np.zeros((rows, cols))
+    pixels = img_np.astype(np.int64)
+    area = window * window
+    energy = _window_sums(pixels * pixels, window) / area  # Exact: integer sums of integers
+
+    w = dct(np.eye(window), norm='ortho', axis=0).sum(axis=0)
+    pixels = pixels.astype(np.float64)
+    partial = sum(w[k] * pixels[:, k:cols - window + 1 + k] for k in range(window))
+    coefficient_sum = sum(w[k] * partial[k:rows - window + 1 + k] for k in range(window))
+    block_variances = np.maximum(energy - (coefficient_sum / area) ** 2, 0)
+    del energy, partial, coefficient_sum
+
+    # Spread each block's variance back over its pixels. Shifted sums rather than a second integral
+    # image, so pixels covered only by zero-variance (all black) blocks stay exactly zero
+    padded = np.pad(block_variances, window - 1)
+    spread = sum(padded[:, k:cols + k] for k in range(window))
+    return sum(spread[k:rows + k] for k in range(window)) / area
+
+
+@handler_capabilities(PAYLOAD_BUFFER)
+def run_mvg(carrier_path, payload_path=None, output_path=None, payload=None):
     """
     MVG-like steganography based on local Fisher information embedding simulation.
     """
     try:
         img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
+        img_np = np.array(img)
         shape = img_np.shape
 
         # Read payload and convert to bits
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
-
-        # 1. Compute Wiener-filtered residuals
-        residuals = img_np - wiener(img_np, (3, 3))
-
-        # 2. Estimate local variance using blockwise DCT energy
-        def local_variance(block):
-            dct_block = dct(dct(block.T, norm='ortho').T, norm='ortho')
-            return np.var(dct_block)
-
-        window_size = 8
-        variances = np.zeros(shape)
-        for i in range(0, shape[0] - window_size + 1):
-            for j in range(0, shape[1] - window_size + 1):
-                block = img_np[i:i+window_size, j:j+window_size]
-                var = local_variance(block)
-                variances[i:i+window_size, j:j+window_size] += var
-        variances /= (window_size * window_size)
-
-        # 3. Compute Fisher Information (1/variance^2)
+        payload = _payload_buffer(payload_path, payload)
+        bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+
+        # 1. Estimate local variance using blockwise DCT energy
+        variances = _mvg_variances(img_np)
+
+        # 2. Compute Fisher Information (1/variance^2)
         with np.errstate(divide='ignore'): # handle division by zero
             fisher_map = 1.0 / (variances**2)
             fisher_map = np.nan_to_num(fisher_map, nan=0.0, posinf=0.0, neginf=0.0)
-        fisher_flat = fisher_map.flatten()
+        fisher_flat = fisher_map.ravel()
 
-        # 4. Probabilistic ±1, ±2 pixel modifications
+        # 3. Probabilistic ±1, ±2 pixel modifications on the highest-FI pixels, one per payload bit
         beta = 2.0
         theta = 0.25
-        rand_map = np.random.rand(fisher_flat.shape[0])
-        flat_img = img_np.flatten()
-        payload_index = 0
-
-        for idx in np.argsort(-fisher_flat): # descending FI importance
-            if payload_index >= total_bits:
-                break
-
-            bit = int(payload_bits[payload_index])
-            current_pixel = flat_img[idx]
-            modified_pixel = current_pixel
-
-            # Decide modification based on cost and bit
-            cost_plus_1 = fisher_flat[idx]
-            cost_minus_1 = fisher_flat[idx]
-
-            if (current_pixel % 2) != bit:
-                if rand_map[idx] < (cost_plus_1 / (cost_plus_1 + cost_minus_1)):
-                    modified_pixel += 1
-                else:
-                    modified_pixel -= 1
-            else:
-                if rand_map[idx] < theta:
-                    if rand_map[idx] < (theta * cost_plus_1 / (cost_plus_1 + cost_minus_1)):
-                        modified_pixel += 2
-                    else:
-                        modified_pixel -= 2
-
-            flat_img[idx] = np.clip(modified_pixel, 0, 255)
-            payload_index += 1
+        indices = _select_cheapest(-fisher_flat, len(bits)) # descending FI importance
+        bits = bits[:len(indices)]
+        flat_img = img_np.flatten().astype(np.int16)
+        pixels = flat_img[indices]
+        rand_map = np.random.rand(len(indices))
+
+        # Decide modification based on cost and bit
+        cost_plus_1 = fisher_flat[indices]
+        cost_minus_1 = fisher_flat[indices]
+        with np.errstate(invalid='ignore'): # zero-FI pixels give NaN, which never compares below
+            plus_ratio = cost_plus_1 / (cost_plus_1 + cost_minus_1)
+
+        mismatch = (pixels % 2) != bits
+        step = np.where(rand_map < plus_ratio, 1, -1)
+        keep = ~mismatch & (rand_map < theta)
+        step[keep] = np.where(rand_map[keep] < theta * plus_ratio[keep], 2, -2)
+        step[~mismatch & ~keep] = 0
+
+        flat_img[indices] = np.clip(pixels + step, 0, 255)
 
         stego_img = Image.fromarray(flat_img.reshape(shape).astype(np.uint8))
         stego_img.save(output_path)
@@ -257,11 +473,13 @@ def run_mvg(carrier_path, payload_path, output_path):
         return None
 
 
+@handler_capabilities(PAYLOAD_BUFFER | PAYLOAD_STREAM)
 def image_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None,
-                        payload_size=None, **kwargs):
+                        payload_size=None, in_place=False, **kwargs):
     """
     Append-based steganography for any image file type.
     This version is self-contained and uses a size-prefix to ensure correct extraction.
+    With in_place=True the payload is appended to the carrier itself (see core.carrier_output).
     """
     SIZE_HEADER_LENGTH = 8
 
@@ -276,7 +494,10 @@ def image_steg(carrier_path, payload_path=None, output_path=None, extract=False,
                 payload_size_from_file = int.from_bytes(size_header_bytes, 'big')
 
                 # seek to the beginning of the payload
-                f.seek(-(SIZE_HEADER_LENGTH + payload_size_from_file), os.SEEK_END)
+                payload_offset = f.seek(-(SIZE_HEADER_LENGTH + payload_size_from_file), os.SEEK_END)
+
+                if kwargs.get("stream"):
+                    return CarrierRegion(carrier_path, payload_offset, payload_size_from_file)
 
                 # Read exactly the number of bytes for the payload
                 payload_data = f.read(payload_size_from_file)
@@ -288,217 +509,478 @@ def image_steg(carrier_path, payload_path=None, output_path=None, extract=False,
     else:
         # --- EMBEDDING LOGIC ---
         try:
-            if payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
-            elif payload:
-                payload_data = payload
-            else:
-                raise ValueError("A payload must be provided.")
-
-            payload_size = len(payload_data)
-            size_header = payload_size.to_bytes(SIZE_HEADER_LENGTH, 'big')
-            data_to_append = payload_data + size_header
+            with carrier_output(carrier_path, output_path, in_place) as f_out:
+                # Stream the payload across; its size goes in the trailer, so it need not be known up front
+                payload_size = _write_payload(f_out, payload_path, payload)
+                f_out.write(payload_size.to_bytes(SIZE_HEADER_LENGTH, 'big'))
 
-            shutil.copy(carrier_path, output_path)
-            with open(output_path, "ab") as f_out:
-                f_out.write(data_to_append)
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
-            return output_path
+            return f_out.name
         except Exception as e:
             print(f"[image_steg EMBED ERROR] {e}")
             return None
 
 
-def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, **kwargs):
+MP3_PRIV_OWNER = b'com.apple.iTunes'  # Owner of the PRIV frames holding the payload, chosen to look ordinary
+MP3_PRIV_CHUNK = 1 << 20  # Payload bytes per PRIV frame
+MP3_INDEX_MAGIC = b'RYGI'  # Starts the index frame: payload size (8 bytes), then chunk frame count (4 bytes)
+MP3_TAG_PADDING = 1 << 16  # Spare tag space left for later embeds, at least...
+MP3_TAG_HEADROOM = 4  # ...or a quarter of the tag, so a re-embed up to 25% larger is written in place
+
+
+def _mp3_payload_frames(payload, version):
+    """The index frame and the numbered chunk frames holding `payload`, each a list of parts."""
+    owner = MP3_PRIV_OWNER + b'\0'
+    count = -(-len(payload) // MP3_PRIV_CHUNK)
+    index = owner + MP3_INDEX_MAGIC + len(payload).to_bytes(8, 'big') + count.to_bytes(4, 'big')
+    frames = [[pack_frame_header(b'PRIV', len(index), version), index]]
+    for number in range(count):
+        head = owner + number.to_bytes(4, 'big')
+        chunk = payload[number * MP3_PRIV_CHUNK:(number + 1) * MP3_PRIV_CHUNK]
+        frames.append([pack_frame_header(b'PRIV', len(head) + len(chunk), version), head, chunk])
+    return frames
+
+
+def _is_payload_frame(f, frame):
+    owner = MP3_PRIV_OWNER + b'\0'
+    return frame.id == b'PRIV' and not frame.flags and read_frame(f, frame, len(owner)) == owner
+
+
+def _assemble_mp3_payload(frames):
+    """
+    Reassembles the payload from the data of the PRIV frames (owner stripped), or returns the single
+    frame of the old layout.
+    """
+    index_size = len(MP3_INDEX_MAGIC) + 12
+    index = next((data for data in frames if len(data) == index_size and data[:4] == MP3_INDEX_MAGIC), None)
+    if index is None:
+        return frames[0] if frames else b""
+
+    payload_size, count = int.from_bytes(index[4:12], 'big'), int.from_bytes(index[12:], 'big')
+    chunks = {int.from_bytes(data[:4], 'big'): data[4:] for data in frames if data is not index}
+    if any(number not in chunks for number in range(count)):
+        return b""
+    payload_data = b"".join(chunks[number] for number in range(count))
+    return payload_data if len(payload_data) == payload_size else b""
+
+
+def _read_mp3_payload(f, tag):
+    """The payload held in the PRIV frames of a tag walked by read_id3_tag()."""
+    prefix = len(MP3_PRIV_OWNER) + 1
+    return _assemble_mp3_payload([read_frame(f, frame)[prefix:] for frame in tag.frames
+                                  if _is_payload_frame(f, frame)])
+
+
+def _mp3_capacity(carrier_path) -> int:
     """
-    MP3 steganography using a private (PRIV) ID3 tag.
-    - Embedding: Places the payload into a custom PRIV tag owned by 'Rygelock'.
-    - Extraction: Searches for the 'Rygelock' PRIV tag and returns its data.
+    Payload bytes mp3_steg can hide: what the largest ID3v2 tag leaves after the carrier's other
+    frames (cover art, text, ...), the index frame and the header of every chunk frame.
     """
-    ANONYMOUS_OWNER_ID = 'com.apple.iTunes'
+    with open(carrier_path, "rb") as f:
+        tag = read_id3_tag(f)
+        if tag is None:
+            kept = 0
+        elif tag.supported:
+            kept = sum(ID3_FRAME_HEADER_SIZE + frame.size for frame in tag.frames if not _is_payload_frame(f, frame))
+        else:
+            kept = tag.size  # Converted to ID3v2.4 before embedding; the old tag body bounds its frames
+    owner = len(MP3_PRIV_OWNER) + 1
+    available = ID3_MAX_SIZE - kept - (ID3_FRAME_HEADER_SIZE + owner + len(MP3_INDEX_MAGIC) + 12)
+    chunk_overhead = ID3_FRAME_HEADER_SIZE + owner + 4
+    full_chunks, rest = divmod(max(0, available), MP3_PRIV_CHUNK + chunk_overhead)
+    return full_chunks * MP3_PRIV_CHUNK + max(0, rest - chunk_overhead)
 
+
+@handler_capabilities(PAYLOAD_BUFFER, max_payload=_mp3_capacity)
+def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, in_place=False,
+             **kwargs):
+    """
+    MP3 steganography using private (PRIV) ID3 frames.
+    - Embedding: Splits the payload over numbered PRIV frames behind a small index frame (see
+      _mp3_payload_frames) and reserves padding in the tag. When the new frames fit in the carrier's
+      tag it is overwritten and the audio is left alone; otherwise the tag is written with room to
+      spare and the audio copied behind it once. With in_place=True the carrier itself is modified
+      (see core.carrier_output).
+    - Extraction: Walks the frames of the tag (see core.id3_tags); the audio is never read.
+    """
     if extract:
         try:
-            audio = MP3(carrier_path, ID3=ID3)
-            for frame in audio.tags.getall('PRIV'):
-                if frame.owner == ANONYMOUS_OWNER_ID:
-                    return frame.data
-            return b""
+            with open(carrier_path, "rb") as f:
+                tag = read_id3_tag(f)
+                if tag is None:
+                    return b""
+                if not tag.supported:
+                    # Another tool rewrote the tag in a form core.id3_tags does not walk
+                    owner = MP3_PRIV_OWNER.decode()
+                    return _assemble_mp3_payload([frame.data for frame in ID3(carrier_path).getall('PRIV')
+                                                  if frame.owner == owner])
+                return _read_mp3_payload(f, tag)
         except Exception as e:
             print(f"[mp3_steg EXTRACT ERROR] {e}")
             return b""
     else:
         # --- EMBEDDING LOGIC ---
         try:
-            if payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
-            elif payload:
-                payload_data = payload
-            else:
-                raise ValueError("A payload_path or payload bytes must be provided.")
-
-            shutil.copy(carrier_path, output_path)
-
-
-            # 2. Now, load the NEW file at the output path to modify it
-            audio = MP3(output_path, ID3=ID3)
-
-            audio.tags.delall(f'PRIV:{ANONYMOUS_OWNER_ID}')
-
-            frame = PRIV(
-                owner=ANONYMOUS_OWNER_ID,
-                data=payload_data
-            )
-
-            audio.tags.add(frame)
+            payload_data = _payload_buffer(payload_path, payload)
 
-            # 3. Save the modifications to the file (in-place)
-            audio.save()
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
-
-            return output_path
+            with open(carrier_path, "rb") as f:
+                tag = read_id3_tag(f)
+            if tag is not None and not tag.supported:
+                # ID3v2.2 and unsynchronised tags are converted to a plain ID3v2.4 tag once, by mutagen
+                carrier_path = output_target(carrier_path, output_path, in_place)
+                ID3(carrier_path).save(carrier_path, v2_version=4)
+                output_path, in_place = None, True
+                with open(carrier_path, "rb") as f:
+                    tag = read_id3_tag(f)
+
+            version = tag.version if tag else 4
+            with open(carrier_path, "rb") as f:
+                frames = [[read_raw_frame(f, frame)] for frame in (tag.frames if tag else [])
+                          if not _is_payload_frame(f, frame)]
+            frames += _mp3_payload_frames(payload_data, version)
+            used = sum(len(part) for frame in frames for part in frame)
+            if used > ID3_MAX_SIZE:
+                raise ValueError("Payload too large for an ID3v2 tag.")
+
+            if tag is not None and used <= tag.end - ID3_HEADER_SIZE:
+                # Overwrite the tag within its old space; the audio stays where it is
+                with carrier_output(carrier_path, output_path, in_place) as f_out:
+                    f_out.seek(0)
+                    f_out.writelines(pack_id3_tag(version, tag.flags, frames, tag.end - ID3_HEADER_SIZE))
+                return f_out.name
+
+            audio_start = tag.end if tag else 0
+            size = min(ID3_MAX_SIZE, used + max(MP3_TAG_PADDING, used // MP3_TAG_HEADROOM))
+            with carrier_rewrite(carrier_path, output_path, in_place) as f_out, open(carrier_path, "rb") as f_in:
+                f_out.writelines(pack_id3_tag(version, tag.flags if tag else 0, frames, size))
+                copy_file_region(f_in, f_out, audio_start, os.fstat(f_in.fileno()).st_size - audio_start)
+
+            return carrier_path if in_place else output_path
         except Exception as e:
             print(f"[mp3_steg EMBED ERROR] {e}")
             return None
 
 # --- Steganography for mp4 ---
-def mp4_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, **kwargs):
+@handler_capabilities(PAYLOAD_BUFFER | PAYLOAD_STREAM)
+def mp4_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, in_place=False,
+             **kwargs):
     """
     MP4 steganography by appending a custom top-level box.
-    - Embedding: Appends a custom 'rygl' box to the end of the file.
-    - Extraction: Searches for the 'rygl' box at the top level.
+    - Embedding: Appends a custom 'rygl' box to the end of the file, with a 64-bit size when the payload
+      needs one. With in_place=True the box is appended to the carrier itself (see core.carrier_output).
+    - Extraction: Looks up the last 'rygl' box in the top-level box index (see core.mp4_boxes).
     """
     RYGELOCK_BOX_TYPE = b'rygl'
 
     if extract:
         try:
+            box = find_last_box(read_box_index(carrier_path), RYGELOCK_BOX_TYPE)
+            if box is None:
+                return b""
+            if kwargs.get("stream"):
+                return CarrierRegion(carrier_path, box.data_offset, box.data_size)
             with open(carrier_path, "rb") as f:
-                while True:
-                    header = f.read(8)
-                    if not header: break
-                    box_size = int.from_bytes(header[:4], 'big')
-                    box_type = header[4:]
-
-                    if box_type == RYGELOCK_BOX_TYPE:
-                        return f.read(box_size - 8)
-
-                    if box_size == 0:
-                        break
-
-                    f.seek(box_size - 8, 1)
-            return b""
+                f.seek(box.data_offset)
+                return f.read(box.data_size)
         except Exception as e:
             print(f"[mp4_steg EXTRACT ERROR] {e}")
             return b""
     else:
         try:
-            print("\n--- MP4 Structure Analysis (Manual Parser) ---")
-            with open(carrier_path, "rb") as f:
-                while True:
-                    header = f.read(8)
-                    if not header:
-                        break
-                    box_size = int.from_bytes(header[:4], 'big')
-                    box_type = header[4:]
-                    try:
-                        box_type_str = box_type.decode('ascii')
-                    except UnicodeDecodeError:
-                        box_type_str = str(box_type)
-                    print(f"Found Box: '{box_type_str}', Size: {box_size}")
-                    if box_size == 0:
-                        break
-                    f.seek(box_size - 8, 1)
-            print("--- Analysis Complete ---")
-            # --- END: ADDED ANALYSIS SECTION ---
+            boxes = read_box_index(carrier_path)
 
-            if payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
-            elif payload:
-                payload_data = payload
-            else:
-                raise ValueError("A payload_path or payload bytes must be provided.")
+            with carrier_output(carrier_path, output_path, in_place) as f_out:
+                close_open_box(f_out, boxes)  # A size-0 'mdat' would otherwise swallow the new box
 
-            rygl_box_size = 8 + len(payload_data)
-            rygl_box_header = rygl_box_size.to_bytes(4, 'big') + RYGELOCK_BOX_TYPE
-            rygl_box = rygl_box_header + payload_data
+                # Write a placeholder box header, stream the payload, then patch in the real size
+                box_start = f_out.tell()
+                f_out.write(pack_box_header(RYGELOCK_BOX_TYPE, 0))
+                payload_size = _write_payload(f_out, payload_path, payload)
+                f_out.seek(box_start)
+                f_out.write(pack_box_header(RYGELOCK_BOX_TYPE, payload_size))  # 64-bit largesize past 4 GB
 
-            shutil.copy(carrier_path, output_path)
-
-            with open(output_path, "ab") as f_out:
-                f_out.write(rygl_box)
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
-
-            return output_path
+            return f_out.name
 
         except Exception as e:
             print(f"[mp4_steg EMBED ERROR] An unhandled error occurred: {e}")
             return None
 
 
-def run_mipod(carrier_path, payload_path, output_path):
+# --- Steganography for wav ---
+WAV_CHUNK_FRAMES = 1 << 16  # Frames read, embedded and written per step (multiple of 8); bounds wav_steg's memory
+WAV_LSB_MAGIC = b"RYGW"
+WAV_LSB_TRAILER_BITS = (len(WAV_LSB_MAGIC) + 4) * 8  # Magic and 32-bit big-endian payload length, in the last samples
+
+
+def _wav_capacity(carrier_path) -> int:
+    """Payload bytes wav_steg can hide in a WAV carrier: one bit per sample, less the trailer."""
+    with wave.open(carrier_path, 'rb') as w:
+        samples = w.getnframes() * w.getnchannels()
+    return min(max(0, (samples - WAV_LSB_TRAILER_BITS) // 8), 0xFFFFFFFF)
+
+
+def _read_up_to(stream, count: int) -> bytearray:
+    """Reads `count` bytes from `stream`, or fewer only at its end."""
+    data = bytearray()
+    while len(data) < count:
+        chunk = stream.read(count - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _pcm_values(samples):
+    """Integer values of little-endian PCM samples, given as an (n, sample width) uint8 array."""
+    width = samples.shape[1]
+    values = sum(samples[:, i].astype(np.int64) << (8 * i) for i in range(width))
+    if width > 1:  # 8-bit samples are unsigned, wider ones two's complement
+        values -= (values >> (8 * width - 1)) << (8 * width)
+    return values
+
+
+def _embed_pcm_bits(samples, bits, rng=None):
+    """
+    Gives a run of samples (an (n, sample width) uint8 view) the least significant bits `bits`. Without
+    `rng` by LSB replacement on the low byte; with it by LSB matching: a mismatched sample moves by +1
+    or -1 at random, inward at the ends of the sample range.
     """
-    MIPOD-like simulation: embeds data by modifying DCT coefficients in JPEG/image files.
+    low_bytes = samples[:, 0]
+    if rng is None:
+        low_bytes ^= (low_bytes ^ bits) & 1
+        return
+    values = _pcm_values(samples)
+    width = samples.shape[1]
+    low, high = (0, 0xFF) if width == 1 else (-(1 << (8 * width - 1)), (1 << (8 * width - 1)) - 1)
+    step = rng.integers(0, 2, len(values), dtype=np.int8) * np.int8(2) - np.int8(1)
+    step[values == low] = 1
+    step[values == high] = -1
+    values += step * ((values ^ bits) & 1)
+    for i in range(width):
+        samples[:, i] = values >> (8 * i)
+
+
+@handler_capabilities(PAYLOAD_BUFFER | PAYLOAD_STREAM, max_payload=_wav_capacity)
+def wav_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, lsb_matching=False,
+             in_place=False, **kwargs):
     """
+    LSB steganography for PCM WAV (8, 16, 24 or 32-bit samples), one bit per sample.
+    - Embedding: The payload fills the samples in order and a trailer (WAV_LSB_MAGIC and the payload
+      length) the last WAV_LSB_TRAILER_BITS samples, so a payload stream is embedded in one pass without
+      knowing its length. Frames are read, embedded and written WAV_CHUNK_FRAMES at a time, so memory stays
+      constant however long the recording. lsb_matching=True changes samples by ±1 instead of replacing
+      their LSB. With in_place=True the carrier is replaced once the output is complete (see core.carrier_output).
+    - Extraction: Reads the trailer, then the payload bits chunk by chunk.
+    """
+    if extract:
+        try:
+            with wave.open(carrier_path, 'rb') as w:
+                width, channels, frames = w.getsampwidth(), w.getnchannels(), w.getnframes()
+                total = frames * channels
+                if total < WAV_LSB_TRAILER_BITS:
+                    return b""
+                first_frame = (total - WAV_LSB_TRAILER_BITS) // channels
+                w.setpos(first_frame)
+                tail = np.frombuffer(w.readframes(frames - first_frame), dtype=np.uint8)[::width] & 1
+                start = total - WAV_LSB_TRAILER_BITS - first_frame * channels
+                trailer = np.packbits(tail[start:start + WAV_LSB_TRAILER_BITS]).tobytes()
+                if not trailer.startswith(WAV_LSB_MAGIC):
+                    return b""
+                payload_size = int.from_bytes(trailer[len(WAV_LSB_MAGIC):], 'big')
+                if payload_size > _wav_capacity(carrier_path):
+                    return b""
+
+                w.rewind()
+                extracted = bytearray()
+                while len(extracted) < payload_size:
+                    raw = w.readframes(WAV_CHUNK_FRAMES)
+                    if not raw:
+                        break
+                    bits = np.frombuffer(raw, dtype=np.uint8)[::width] & 1
+                    extracted += np.packbits(bits[:(payload_size - len(extracted)) * 8]).tobytes()
+                return bytes(extracted)
+        except Exception as e:
+            print(f"[wav_steg EXTRACT ERROR] {e}")
+            return b""
+
     try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img, dtype=np.float32)
+        rng = np.random.default_rng() if lsb_matching else None
+        if output_path is None and not in_place:
+            name, ext = os.path.splitext(carrier_path)
+            output_path = f"{name}_stego{ext}"
+
+        with contextlib.ExitStack() as stack:
+            if payload_path:
+                source = stack.enter_context(open(payload_path, 'rb'))
+            elif payload is None:
+                raise ValueError("A payload_path or payload must be provided.")
+            else:
+                source = payload if hasattr(payload, "read") else io.BytesIO(payload)
+            with wave.open(carrier_path, 'rb') as w_in:
+                params = w_in.getparams()
+            width, total = params.sampwidth, params.nframes * params.nchannels
+            if total < WAV_LSB_TRAILER_BITS:
+                raise ValueError("The WAV carrier is too short to hold a payload.")
+            capacity = _wav_capacity(carrier_path)
+            trailer_start = total - WAV_LSB_TRAILER_BITS
+
+            with carrier_rewrite(carrier_path, output_path, in_place) as f_out, \
+                    wave.open(carrier_path, 'rb') as w_in, wave.open(f_out, 'wb') as w_out:
+                w_out.setparams(params)
+                position = 0  # Index of the chunk's first sample
+                embedded = 0  # Payload bytes embedded so far
+                finished = False
+                while True:
+                    buffer = bytearray(w_in.readframes(WAV_CHUNK_FRAMES))
+                    if not buffer:
+                        break
+                    samples = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, width)
+
+                    if not finished:
+                        wanted = min(len(samples) // 8, capacity - embedded)
+                        data = _read_up_to(source, wanted)
+                        embedded += len(data)
+                        finished = len(data) < wanted
+                        if not finished and embedded == capacity:
+                            if _read_up_to(source, 1):
+                                raise ValueError(f"Payload exceeds the carrier's capacity of {capacity} bytes.")
+                            finished = True
+                        payload_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+                        _embed_pcm_bits(samples[:len(payload_bits)], payload_bits, rng)
+
+                    # The payload ends before trailer_start, so its length is final here
+                    lo, hi = max(position, trailer_start), position + len(samples)
+                    if lo < hi:
+                        trailer = WAV_LSB_MAGIC + embedded.to_bytes(4, 'big')
+                        trailer_bits = np.unpackbits(np.frombuffer(trailer, dtype=np.uint8))
+                        _embed_pcm_bits(samples[lo - position:hi - position],
+                                        trailer_bits[lo - trailer_start:hi - trailer_start], rng)
+
+                    w_out.writeframesraw(buffer)
+                    position += len(samples)
+
+        return carrier_path if in_place else output_path
 
-        # Apply DCT
-        dct_coeffs = dct(dct(img_np.T, norm='ortho').T, norm='ortho')
+    except Exception as e:
+        print(f"[wav_steg EMBED ERROR] {e}")
+        return None
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
 
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
-        payload_idx = 0
+MIPOD_BLOCK = 8
+MIPOD_STEP = 4.0  # Quantization step of the AC coefficients whose parities carry run_mipod's bits
+MIPOD_VARIANCE_FLOOR = 0.01
+MIPOD_SATURATION_MARGIN = 8  # Blocks with pixels this close to 0 or 255 are wet: requantizing them could clip
+MIPOD_ATTEMPTS = 3
 
-        # Simple embedding: embed in low-frequency DCT coefficients
-        # This is a highly simplified approach for demonstration
-        flat_coeffs = dct_coeffs.flatten()
 
-        if total_bits > len(flat_coeffs) // 2: # Can embed about half the coefficients
-            raise ValueError("Payload too large for MIPOD embedding capacity.")
+def _block_dct(img_np):
+    """Orthonormal 2-D DCT of every full 8 × 8 block of `img_np`, as (block rows, block cols, 8, 8) float64."""
+    rows, cols = img_np.shape[0] // MIPOD_BLOCK, img_np.shape[1] // MIPOD_BLOCK
+    blocks = img_np[:rows * MIPOD_BLOCK, :cols * MIPOD_BLOCK].reshape(rows, MIPOD_BLOCK, cols, MIPOD_BLOCK)
+    blocks = blocks.swapaxes(1, 2).astype(np.float64)
+    return dct(dct(blocks, axis=-1, norm='ortho'), axis=-2, norm='ortho')
 
-        for i in range(total_bits):
-            if payload_idx >= len(flat_coeffs):
-                break # No more space
 
-            # Modify coefficient based on payload bit (LSB-like for DCT)
-            # This is a conceptual modification, real MIPOD is more complex
-            current_coeff = flat_coeffs[payload_idx]
-            bit = int(payload_bits[i])
+def _mipod_costs(coeffs):
+    """
+    Cost of moving each AC coefficient by one quantization step, as (block rows, block cols, 63) float32.
+    Every coefficient is modelled as zero-mean Gaussian with the variance of the same frequency over
+    the 3 × 3 surrounding blocks; its cost is the Fisher information 2 / σ⁴ of that variance.
+    """
+    ac = coeffs.reshape(*coeffs.shape[:2], MIPOD_BLOCK * MIPOD_BLOCK)[..., 1:]
+    variances = uniform_filter(ac * ac, size=(3, 3, 1), mode='reflect') + MIPOD_VARIANCE_FLOOR
+    return (2 / (variances * variances)).astype(np.float32)
 
-            # Simple LSB-like embedding on the integer part of the coefficient
-            int_coeff = int(current_coeff)
-            if (int_coeff % 2) != bit:
-                if current_coeff >= 0:
-                    flat_coeffs[payload_idx] = math.floor(current_coeff) + (1 if bit == 1 else 0) if (math.floor(current_coeff) % 2) != bit else current_coeff
-                else:
-                    flat_coeffs[payload_idx] = math.ceil(current_coeff) + (1 if bit == 1 else 0) if (math.ceil(current_coeff) % 2) != bit else current_coeff
 
+def _mipod_layout(n):
+    """Splits n cover coefficients into the STC_HEADER_ELEMENTS holding the length, spread evenly, and the rest."""
+    if n <= STC_HEADER_ELEMENTS:
+        raise ValueError("Carrier is too small for MIPOD embedding.")
+    header = np.arange(STC_HEADER_ELEMENTS) * (n // STC_HEADER_ELEMENTS)
+    return header, np.delete(np.arange(n), header)
 
-            flat_coeffs[payload_idx] = (flat_coeffs[payload_idx] & 0xFE) | bit # Simple bit manipulation, conceptual for DCT
-            payload_idx += 1
 
+def _mipod_capacity(carrier_path) -> int:
+    """Payload bytes run_mipod can hide: one bit per AC coefficient of the full blocks, less the length header."""
+    with Image.open(carrier_path) as img:
+        coefficients = (img.height // MIPOD_BLOCK) * (img.width // MIPOD_BLOCK) * (MIPOD_BLOCK * MIPOD_BLOCK - 1)
+    return min(max(0, (coefficients - STC_HEADER_ELEMENTS) // 8), (1 << STC_LENGTH_BITS) - 1)
 
-        # Inverse DCT
-        modified_dct_coeffs = flat_coeffs.reshape(dct_coeffs.shape)
-        stego_img_np = idct(idct(modified_dct_coeffs.T, norm='ortho').T, norm='ortho')
 
-        # Clip and convert back to image
-        stego_img_np = np.clip(stego_img_np, 0, 255).astype(np.uint8)
-        stego_img = Image.fromarray(stego_img_np)
-        stego_img.save(output_path)
+@handler_capabilities(PAYLOAD_BUFFER, max_payload=_mipod_capacity)
+def run_mipod(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, **kwargs):
+    """
+    MIPOD-like embedding in the quantized AC coefficients of the image's 8 × 8 block DCT.
+    Each coefficient divided by MIPOD_STEP and rounded carries one bit in its parity. Syndrome-trellis
+    coding (see core.stc) chooses which parities to flip at the least total Fisher-information cost,
+    so the extractor needs only the coefficients, not the costs. A flipped coefficient moves to the
+    nearest step of the other parity. Blocks holding a change are requantized so that rounding the
+    pixels cannot move any of their coefficients across a step boundary; other blocks keep their pixels.
+    The length takes STC_HEADER_ELEMENTS coefficients spread over the image, as in run_stc.
+    """
+    try:
+        img = Image.open(carrier_path).convert("L")
+        img_np = np.array(img)
+        coeffs = _block_dct(img_np)
+        scaled = coeffs.reshape(*coeffs.shape[:2], MIPOD_BLOCK * MIPOD_BLOCK)[..., 1:] / MIPOD_STEP
+        quantized = np.rint(scaled)
+        cover_bits = (quantized.astype(np.int64) & 1).astype(np.uint8).ravel()
+        header, body = _mipod_layout(len(cover_bits))
+    except Exception as e:
+        print(f"[run_mipod {'EXTRACT ' if extract else ''}ERROR] {e}")
+        return b"" if extract else None
+
+    if extract:
+        try:
+            length_bits = stc_extract(cover_bits[header], STC_LENGTH_BITS)
+            payload_size = int.from_bytes(np.packbits(length_bits).tobytes(), 'big')
+            if payload_size * 8 > len(body):
+                return b""
+            return np.packbits(stc_extract(cover_bits[body], payload_size * 8)).tobytes()
+        except Exception as e:
+            print(f"[run_mipod EXTRACT ERROR] {e}")
+            return b""
+
+    try:
+        payload = _payload_buffer(payload_path, payload)
+        payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+        if len(payload_bits) > len(body):
+            raise ValueError("Payload too large for MIPOD embedding capacity.")
+        length_bits = np.unpackbits(np.frombuffer(len(payload).to_bytes(STC_LENGTH_BITS // 8, 'big'), dtype=np.uint8))
+
+        rows, cols = coeffs.shape[:2]
+        region = img_np[:rows * MIPOD_BLOCK, :cols * MIPOD_BLOCK]
+        blocks = region.reshape(rows, MIPOD_BLOCK, cols, MIPOD_BLOCK).swapaxes(1, 2)  # View onto img_np
+        costs = _mipod_costs(coeffs)
+        saturated = (blocks.min(axis=(2, 3)) < MIPOD_SATURATION_MARGIN) | (blocks.max(axis=(2, 3)) > 255 - MIPOD_SATURATION_MARGIN)
+        costs[saturated] = np.inf
+        step = np.where(scaled >= quantized, 1.0, -1.0)  # Towards the nearest step of the other parity
+
+        for _ in range(MIPOD_ATTEMPTS):
+            flat_costs = costs.ravel()
+            stego_bits = np.empty_like(cover_bits)
+            stego_bits[header] = stc_embed(cover_bits[header], flat_costs[header], length_bits)
+            stego_bits[body] = stc_embed(cover_bits[body], flat_costs[body], payload_bits)
+            changed = (stego_bits != cover_bits).reshape(quantized.shape)
+            touched = changed.any(axis=2)
+
+            # Quantize, modify and inverse-transform every touched block in one batch
+            modified = coeffs[touched]
+            modified.reshape(len(modified), -1)[:, 1:] = (quantized[touched] + step[touched] * changed[touched]) * MIPOD_STEP
+            pixels = np.clip(np.rint(idct(idct(modified, axis=-2, norm='ortho'), axis=-1, norm='ortho')), 0, 255)
+
+            # Clipping can still move a coefficient; such blocks become wet and the trellis runs again
+            check = dct(dct(pixels, axis=-1, norm='ortho'), axis=-2, norm='ortho').reshape(len(pixels), -1)[:, 1:]
+            decoded = (np.rint(check / MIPOD_STEP).astype(np.int64) & 1).astype(np.uint8)
+            failed = (decoded != stego_bits.reshape(quantized.shape)[touched]).any(axis=1)
+            if not failed.any():
+                blocks[touched] = pixels
+                break
+            costs[tuple(np.argwhere(touched)[failed].T)] = np.inf
+        else:
+            raise ValueError("Carrier is too saturated to hold the payload with MIPOD.")
+
+        stego_img = Image.fromarray(img_np)
+        stego_img.save(output_path, format="WEBP", lossless=True)  # The engine writes to a .tmp path; WebP is lossy unless asked
         return output_path
 
     except Exception as e:
@@ -506,49 +988,80 @@ def run_mipod(carrier_path, payload_path, output_path):
         return None
 
 
-def run_wow(carrier_path, payload_path, output_path):
+WOW_WAVELET = 'db8'
+WOW_P = -1  # Hölder-norm exponent aggregating the three directional suitabilities
+WOW_WET_COST = 1e10
+WOW_BAND_PIXELS = 1 << 20  # Padded pixels per row band in _wow_costs; bounds its temporary arrays
+
+
+def _wow_costs(img_np, workers=None):
     """
-    WOW-like simulation: Embeds data by modifying pixel values in a way that minimizes changes based on local complexity.
+    WOW costs of changing each pixel, as float32. The three directional filters are outer products of
+    the wavelet's low- and high-pass decomposition filters (LH, HL, HH). Each residual R = X * F is
+    convolved in magnitude with |F| rotated by 180° to give that direction's suitability ξ, and the
+    cost is the Hölder norm (Σ ξ^p)^(-1/p). Symmetric padding and alignment follow the reference
+    implementation. Every filter is separable, so each 2-D convolution is two 1-D FFT convolutions;
+    the low- and high-pass column passes are shared by the filters. Row bands with a halo of twice
+    the filter length are handled on `workers` threads (the FFTs release the GIL).
+    """
+    wavelet = pywt.Wavelet(WOW_WAVELET)
+    lo, hi = (np.array(f, dtype=np.float32) for f in (wavelet.dec_lo, wavelet.dec_hi))
+    halo = len(lo) - 1
+    rows, cols = img_np.shape
+    padded = np.pad(img_np, halo, mode='symmetric')
+    cost_map = np.empty((rows, cols), dtype=np.float32)
+    workers = workers or os.cpu_count() or 1
+    band = max(1, WOW_BAND_PIXELS // padded.shape[1] - 2 * halo)
+
+    def column(a, f):
+        return fftconvolve(a, f[:, None], mode='valid', axes=0)
+
+    def row(a, f):
+        return fftconvolve(a, f[None, :], mode='valid', axes=1)
+
+    def cost_band(top):
+        bottom = min(rows, top + band)
+        x = padded[top:bottom + 2 * halo].astype(np.float32)
+        low, high = column(x, lo), column(x, hi)
+        holder = 0
+        for vertical, horizontal, columns_done in ((lo, hi, low), (hi, lo, high), (hi, hi, high)):
+            residual = np.abs(row(columns_done, horizontal))
+            xi = column(row(residual, np.abs(horizontal[::-1])), np.abs(vertical[::-1]))
+            with np.errstate(divide='ignore'):
+                holder = holder + xi ** WOW_P
+        with np.errstate(divide='ignore', over='ignore'):
+            cost = holder ** (-1 / WOW_P)
+        cost_map[top:bottom] = np.where(np.isnan(cost), WOW_WET_COST, np.minimum(cost, WOW_WET_COST))
+
+    tops = range(0, rows, band)
+    with ThreadPoolExecutor(max_workers=min(len(tops), workers)) as pool:
+        for future in [pool.submit(cost_band, top) for top in tops]:
+            future.result()
+    return cost_map
+
+
+@handler_capabilities(PAYLOAD_BUFFER)
+def run_wow(carrier_path, payload_path=None, output_path=None, payload=None, workers=None):
+    """
+    WOW (Wavelet Obtained Weights) embedding: one bit goes into the LSB of each of the cheapest pixels
+    under the directional filter-bank costs of _wow_costs.
     """
     try:
         img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
+        img_np = np.array(img)
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
-
-        # Calculate local complexity (e.g., using variance or gradient magnitude)
-        # This is a very simple approximation; actual WOW uses more sophisticated cost functions
-        complexity_map = uniform_filter(img_np, size=3) # Example: blur for smoothness, inverse for complexity
-        complexity_map = np.abs(img_np - complexity_map) + 1 # Higher difference = higher complexity
-        cost_map = 1 / complexity_map # Lower cost for higher complexity areas
-        cost_map = np.clip(cost_map, 0.001, 1.0) # Avoid division by zero, ensure valid range
-
-        flat_img = img_np.flatten()
-        flat_costs = cost_map.flatten()
-        modifiable_indices = np.argsort(flat_costs) # Sort by increasing cost (embed in cheapest first)
-
-        if total_bits > len(modifiable_indices):
+        payload = _payload_buffer(payload_path, payload)
+        payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+
+        cost_map = _wow_costs(img_np, workers)
+
+        if len(payload_bits) > cost_map.size:
             raise ValueError("Payload too large to embed with WOW distortion constraints.")
 
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            current_pixel = int(flat_img[idx])
-
-            if (current_pixel % 2) != bit:
-                # Modify pixel to match bit, with minimal change (+1 or -1)
-                if current_pixel == 0: # Can only increase
-                    flat_img[idx] = 1 if bit == 1 else 0 # Should ideally be 0 if bit is 0
-                elif current_pixel == 255: # Can only decrease
-                    flat_img[idx] = 254 if bit == 0 else 255 # Should ideally be 255 if bit is 1
-                else:
-                    # Choose direction that results in lower distortion if possible, or just flip
-                    flat_img[idx] = current_pixel ^ 1 # Simple flip for demonstration
-
-        stego_img = Image.fromarray(flat_img.reshape(img_np.shape).astype(np.uint8))
+        # Flipping the LSB is the minimal ±1 change, and keeps 0 and 255 inside the pixel range
+        _write_parity(img_np.reshape(-1), _select_cheapest(cost_map, len(payload_bits)), payload_bits)
+
+        stego_img = Image.fromarray(img_np)
         stego_img.save(output_path)
         return output_path
 
@@ -557,73 +1070,87 @@ def run_wow(carrier_path, payload_path, output_path):
         return None
 
 
-def synch_steg(carrier_path, payload_path, output_path):
+@handler_capabilities(PAYLOAD_BUFFER | PAYLOAD_STREAM)
+def synch_steg(carrier_path, payload_path=None, output_path=None, payload=None, in_place=False):
     """
     SYNCH steganography for video (MP4, MKV, AVI).
     Embeds data by appending it to a 'free' box, similar to MP4 handling.
+    The video is cloned (see core.carrier_output), never read; with in_place=True it is appended to directly.
     """
     try:
-        with open(carrier_path, 'rb') as f:
-            video_data = f.read()
-
-        with open(payload_path, 'rb') as f:
-            payload_data = f.read()
-
-        # Simple appending of the payload
-        stego_data = video_data + payload_data + b"\0" # Add a null terminator for safety
-
-        if output_path is None:
+        if output_path is None and not in_place:
             name, ext = os.path.splitext(carrier_path)
             output_path = f"{name}_stego{ext}"
 
-        with open(output_path, "wb") as f:
-            f.write(stego_data)
-
-        if payload_path and payload_path.endswith(".payload"):
-            os.remove(payload_path)
+        with carrier_output(carrier_path, output_path, in_place) as f_out:
+            # Simple appending of the payload
+            _write_payload(f_out, payload_path, payload)
+            f_out.write(b"\0")  # Add a null terminator for safety
 
-        return output_path
+        return f_out.name
     except Exception as e:
         print(f"[synch_steg ERROR] {e}")
         return None
 
 
+ADVANCED_LSB_MAGIC = b"RYGLSB"
+ADVANCED_LSB_HEADER_BITS = (len(ADVANCED_LSB_MAGIC) + 4) * 8  # Magic and 32-bit big-endian payload length
+ADVANCED_LSB_DELIMITER = b'---RYGELOCK_EOF---'  # Terminates payloads embedded before the length header
+ADVANCED_LSB_SCAN_BITS = 1 << 23  # Channel values unpacked per step of the legacy delimiter search (multiple of 8)
+
+
+def _lsb_bytes(flat, first, count):
+    """Packs the least significant bits of flat[first:first + count] into bytes."""
+    return np.packbits(flat[first:first + count] & 1).tobytes()
+
+
+def _find_lsb_delimiter(flat, delimiter):
+    """
+    Bytes carried by the LSB stream before the first `delimiter`, or None. The stream is packed
+    ADVANCED_LSB_SCAN_BITS at a time and searched as bytes, so the scan stops at the delimiter.
+    """
+    found = bytearray()
+    usable = len(flat) - len(flat) % 8
+    for first in range(0, usable, ADVANCED_LSB_SCAN_BITS):
+        search_from = max(0, len(found) - len(delimiter) + 1)
+        found += _lsb_bytes(flat, first, min(ADVANCED_LSB_SCAN_BITS, usable - first))
+        at = found.find(delimiter, search_from)
+        if at >= 0:
+            return bytes(found[:at])
+    return None
+
+
+def _advanced_lsb_capacity(carrier_path) -> int:
+    """Payload bytes advanced_image_steg can hide: one bit per R, G and B value, less the header."""
+    with Image.open(carrier_path) as img:
+        channel_values = img.width * img.height * 3
+    return min(max(0, (channel_values - ADVANCED_LSB_HEADER_BITS) // 8), 0xFFFFFFFF)  # 32-bit length header
+
+
+@handler_capabilities(PAYLOAD_BUFFER, max_payload=_advanced_lsb_capacity)
 def advanced_image_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, **kwargs):
     """
     LSB implementation for lossless images (PNG, BMP).
-    Handles different image modes and uses a memory-efficient extraction method.
+    Bits go into the R, G, B channel LSBs in pixel order: a magic and 32-bit length header, then the payload.
+    Images written with the older delimiter-terminated layout still extract.
     """
-    DELIMITER = b'---RYGELOCK_EOF---'
-    DELIMITER_BITS = ''.join(f'{byte:08b}' for byte in DELIMITER)
-
     if extract:
         try:
             with Image.open(carrier_path) as img:
                 # Handle images with transparency (Alpha channel) by ignoring it
-                if img.mode in ('RGBA', 'LA'):
+                if img.mode != 'RGB':
                     img = img.convert('RGB')
+                flat = np.asarray(img).reshape(-1)
 
-                pixels = img.load()
-                width, height = img.size
-
-                bit_buffer = ""
-                delimiter_len = len(DELIMITER_BITS)
-
-                for y in range(height):
-                    for x in range(width):
-                        r, g, b = pixels[x, y]
-                        # Extract LSB from each channel
-                        bit_buffer += str(r & 1)
-                        bit_buffer += str(g & 1)
-                        bit_buffer += str(b & 1)
+                if len(flat) >= ADVANCED_LSB_HEADER_BITS:
+                    header = _lsb_bytes(flat, 0, ADVANCED_LSB_HEADER_BITS)
+                    length = int.from_bytes(header[len(ADVANCED_LSB_MAGIC):], 'big')
+                    if header.startswith(ADVANCED_LSB_MAGIC) and ADVANCED_LSB_HEADER_BITS + length * 8 <= len(flat):
+                        return _lsb_bytes(flat, ADVANCED_LSB_HEADER_BITS, length * 8)
 
-                        # Check for delimiter efficiently without building a huge string
-                        if len(bit_buffer) >= delimiter_len:
-                            if bit_buffer.endswith(DELIMITER_BITS):
-                                payload_bits = bit_buffer[:-delimiter_len]
-                                num_bytes = len(payload_bits) // 8
-                                payload_data = int(payload_bits, 2).to_bytes(num_bytes, byteorder='big')
-                                return payload_data
+                payload_data = _find_lsb_delimiter(flat, ADVANCED_LSB_DELIMITER)
+                if payload_data is not None:
+                    return payload_data
 
                 print("[advanced_image_steg EXTRACT WARNING] Reached end of image without finding delimiter.")
                 return b""
@@ -633,59 +1160,32 @@ def advanced_image_steg(carrier_path, payload_path=None, output_path=None, extra
     else:
         # --- LSB EMBEDDING LOGIC ---
         try:
-            if payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
-            elif payload:
-                payload_data = payload
-            else:
-                raise ValueError("A payload must be provided.")
+            payload_data = _payload_buffer(payload_path, payload)
 
             with Image.open(carrier_path) as img:
                 # Handle images with transparency by converting to a consistent RGB format
                 if img.mode in ('RGBA', 'LA'):
-                    img = img.convert('RGB')
                     print(f"[INFO] Carrier image converted to RGB to handle transparency.")
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
 
-                pixels = img.load()
-                width, height = img.size
+                pixels = np.array(img)
+                flat = pixels.reshape(-1)
 
-                payload_bits = ''.join(f'{byte:08b}' for byte in payload_data) + DELIMITER_BITS
+                header = ADVANCED_LSB_MAGIC + len(payload_data).to_bytes(4, 'big')
+                payload_bits = np.unpackbits(np.frombuffer(header + payload_data, dtype=np.uint8))
                 required_bits = len(payload_bits)
-                available_bits = width * height * 3
+                available_bits = len(flat)
 
                 if required_bits > available_bits:
                     raise ValueError(f"Payload is too large. Required: {required_bits}, Available: {available_bits}")
 
-                bit_index = 0
-                for y in range(height):
-                    for x in range(width):
-                        if bit_index < required_bits:
-                            r, g, b = pixels[x, y]
-
-                            # Embed in R channel
-                            if bit_index < required_bits:
-                                r = (r & 0xFE) | int(payload_bits[bit_index])
-                                bit_index += 1
-                            # Embed in G channel
-                            if bit_index < required_bits:
-                                g = (g & 0xFE) | int(payload_bits[bit_index])
-                                bit_index += 1
-                            # Embed in B channel
-                            if bit_index < required_bits:
-                                b = (b & 0xFE) | int(payload_bits[bit_index])
-                                bit_index += 1
-
-                            pixels[x, y] = (r, g, b)
-                        else:
-                            break
-                    if bit_index >= required_bits:
-                        break
+                _write_parity(flat, slice(0, required_bits), payload_bits)
 
-                img.save(output_path, "PNG")
+                stego_img = Image.fromarray(pixels, 'RGB')
+                stego_img.info = img.info  # Keeps what PNG saving reads from it (ICC profile, transparency, dpi)
+                stego_img.save(output_path, "PNG")
 
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
 
             return output_path
         except Exception as e:
@@ -693,121 +1193,58 @@ def advanced_image_steg(carrier_path, payload_path=None, output_path=None, extra
             return None
 
 
+JPEG_STEG_LENGTH_BITS = 32
+
+
+def _jsteg_eligible(coeffs):
+    """JSteg rule: coefficients 0 and 1 carry no data."""
+    return np.flatnonzero((coeffs != 0) & (coeffs != 1))
+
+
+def _jpeg_steg_capacity(carrier_path) -> int:
+    """Payload bytes new_jpeg_steg can hide: one bit per eligible luminance coefficient, less the length."""
+    eligible = len(_jsteg_eligible(read_jpeg(carrier_path).components[0].visible_blocks))
+    return min(max(0, (eligible - JPEG_STEG_LENGTH_BITS) // 8), (1 << JPEG_STEG_LENGTH_BITS) - 1)
+
+
+@handler_capabilities(PAYLOAD_BUFFER, max_payload=_jpeg_steg_capacity)
 def new_jpeg_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, **kwargs):
     """
     Steganography for JPEG files using LSB of DCT coefficients.
+    A 32-bit length, then the payload, go into the quantized coefficients of the first (luminance) component,
+    in block and row-major order. The coefficients are read from and written back to the file directly
+    (see core.jpeg_coefficients), so the image is never decoded or requantized.
     """
-    DELIMITER = "1111111111111110"  # 16-bit delimiter
-
-    def apply_dct(image_block):
-        # Apply DCT to an 8x8 block
-        return dct(dct(image_block.T, norm='ortho').T, norm='ortho')
-
-    def apply_idct(dct_block):
-        # Apply inverse DCT to an 8x8 block
-        return idct(idct(dct_block.T, norm='ortho').T, norm='ortho')
-
     try:
-        with Image.open(carrier_path) as img:
-            # 1. Convert to YCbCr color space (Luminance, Chroma Blue, Chroma Red)
-            # This is how JPEG separates brightness from color information.
-            img_ycbcr = img.convert('YCbCr')
-            y, cb, cr = img_ycbcr.split()
-
-            # We will only modify the luminance (Y) channel
-            y_array = np.array(y, dtype=float)
-            height, width = y_array.shape
+        jpeg = read_jpeg(carrier_path)
+        luminance = jpeg.components[0]
+        coeffs = luminance.visible_blocks.reshape(-1)  # A copy unless the visible blocks fill the grid
+        eligible = _jsteg_eligible(coeffs)
 
         if extract:
-            all_coeffs = []
-            # Process the image in 8x8 blocks
-            for i in range(0, height, 8):
-                for j in range(0, width, 8):
-                    block = y_array[i:i + 8, j:j + 8]
-                    dct_block = apply_dct(block)
-                    all_coeffs.extend(dct_block.flatten().astype(int))
-
-            extracted_bits = ""
-            for coeff in all_coeffs:
-                if coeff != 0 and coeff != 1:  # JSteg rule
-                    extracted_bits += str(abs(coeff) & 1)
-                    if extracted_bits.endswith(DELIMITER):
-                        payload_bits = extracted_bits[:-len(DELIMITER)]
-                        num_bytes = len(payload_bits) // 8
-                        payload_data = int(payload_bits, 2).to_bytes(num_bytes, byteorder='big')
-                        return payload_data
-            return b""
+            if len(eligible) < JPEG_STEG_LENGTH_BITS:
+                return b""
+            length = int.from_bytes(np.packbits(coeffs[eligible[:JPEG_STEG_LENGTH_BITS]] & 1).tobytes(), 'big')
+            required = JPEG_STEG_LENGTH_BITS + 8 * length
+            if required > len(eligible):
+                return b""
+            return np.packbits(coeffs[eligible[JPEG_STEG_LENGTH_BITS:required]] & 1).tobytes()
         else:
             # --- EMBEDDING LOGIC ---
-            if payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
-            elif payload:
-                payload_data = payload
-            else:
-                raise ValueError("A payload must be provided.")
-
-            payload_bits = ''.join(f'{byte:08b}' for byte in payload_data) + DELIMITER
-
-            # 2. Break the luminance channel into 8x8 blocks and apply DCT
-            dct_blocks = []
-            all_coeffs = []
-            for i in range(0, height, 8):
-                for j in range(0, width, 8):
-                    block = y_array[i:i + 8, j:j + 8]
-                    dct_block = apply_dct(block)
-                    dct_blocks.append(dct_block)
-                    all_coeffs.extend(dct_block.flatten().astype(int))
-
-            # 3. Check Capacity
-            available_bits = len([c for c in all_coeffs if c != 0 and c != 1])
-            if len(payload_bits) > available_bits:
-                raise ValueError(f"Payload too large. Required: {len(payload_bits)}, Available: {available_bits}")
-
-            # 4. Embed Data into coefficients
-            bit_index = 0
-            new_coeffs = []
-            for coeff in all_coeffs:
-                if bit_index < len(payload_bits) and coeff != 0 and coeff != 1:
-                    bit_to_hide = int(payload_bits[bit_index])
-                    current_lsb = abs(coeff) & 1
-                    if current_lsb != bit_to_hide:
-                        if coeff > 0:
-                            coeff -= 1
-                        else:
-                            coeff += 1
-                    bit_index += 1
-                new_coeffs.append(coeff)
-
-            # 5. Reconstruct the image
-            new_y_array = np.zeros_like(y_array)
-            coeff_index = 0
-            for i in range(0, height, 8):
-                for j in range(0, width, 8):
-                    # Take 64 coefficients for the block
-                    block_coeffs_flat = new_coeffs[coeff_index: coeff_index + 64]
-                    block_coeffs = np.array(block_coeffs_flat).reshape(8, 8)
-
-                    # Apply inverse DCT to get the pixel block
-                    pixel_block = apply_idct(block_coeffs)
-                    new_y_array[i:i + 8, j:j + 8] = pixel_block
-                    coeff_index += 64
-
-            # Clip values to be in the valid 0-255 range for images
-            new_y_array = np.clip(new_y_array, 0, 255)
-
-            # Convert the modified luminance array back to an image
-            new_y_image = Image.fromarray(new_y_array.astype('uint8'))
-
-            # Merge the new luminance channel with the original color channels
-            stego_image = Image.merge('YCbCr', (new_y_image, cb, cr))
-
-            # Convert back to RGB and save
-            stego_image.convert('RGB').save(output_path, 'jpeg', quality=100)
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
+            payload_data = _payload_buffer(payload_path, payload)
+
+            header = len(payload_data).to_bytes(JPEG_STEG_LENGTH_BITS // 8, 'big')
+            payload_bits = np.unpackbits(np.frombuffer(header + payload_data, dtype=np.uint8))
 
+            # Check Capacity
+            if len(payload_bits) > len(eligible):
+                raise ValueError(f"Payload too large. Required: {len(payload_bits)}, Available: {len(eligible)}")
+
+            # Embed Data into coefficients. Replacing the LSB never turns an eligible coefficient into 0 or 1
+            _write_parity(coeffs, eligible[:len(payload_bits)], payload_bits)
+            luminance.visible_blocks[...] = coeffs.reshape(luminance.visible_blocks.shape)
+
+            write_jpeg(jpeg, output_path)
             return output_path
 
     except Exception as e:
@@ -816,58 +1253,82 @@ def new_jpeg_steg(carrier_path, payload_path=None, output_path=None, extract=Fal
 
 
 class LSBImageHandler:
+    """
+    LSB access to an image carrier, 3 bits per pixel (R, G, B), numbered in pixel order. Only the header
+    is read up front; the pixels are decoded into one NumPy array on first access. All reads and writes
+    work on that array in place, and it is converted back to an image only by save().
+    """
     def __init__(self, carrier_path):
+        self.carrier_path = carrier_path
+        self._pixels = None
         try:
-            self.image = Image.open(carrier_path)
-            # Convert to a standard format to ensure consistency and handle palettes
-            if self.image.mode != 'RGB':
-                self.image = self.image.convert('RGB')
-            self.pixels = self.image.load()
-            self.width, self.height = self.image.size
+            with Image.open(carrier_path) as img:
+                self.width, self.height = img.size
             # Capacity is 3 bits per pixel (1 for each R, G, B channel)
             self.capacity = self.width * self.height * 3
-            print(f"[LSB Handler] Image loaded. Capacity: {self.capacity} bits.")
+            print(f"[LSB Handler] Image opened. Capacity: {self.capacity} bits.")
         except Exception as e:
             raise IOError(f"Failed to load or process image carrier: {e}")
 
+    @property
+    def pixels(self) -> np.ndarray:
+        """The (height, width, 3) uint8 pixel array, decoded on first use."""
+        if self._pixels is None:
+            try:
+                with Image.open(self.carrier_path) as img:
+                    # Convert to a standard format to ensure consistency and handle palettes
+                    self._pixels = np.array(img if img.mode == 'RGB' else img.convert('RGB'))
+            except Exception as e:
+                raise IOError(f"Failed to load or process image carrier: {e}")
+        return self._pixels
+
     def get_capacity_in_bits(self):
         """Returns the total number of bits that can be hidden."""
         return self.capacity
 
-    def embed_bit(self, bit: int, index: int):
-        """Hides a single bit at the Nth available LSB location."""
-        if index >= self.capacity:
-            raise ValueError("Index out of bounds for embedding.")
+    def _range(self, start: int, count: int) -> slice:
+        if start < 0 or count < 0 or start + count > self.capacity:
+            raise ValueError("Bit range out of bounds.")
+        return slice(start, start + count)
+
+    def _indices(self, indices) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size and (indices.min() < 0 or indices.max() >= self.capacity):
+            raise ValueError("Index out of bounds.")
+        return indices
 
-        pixel_index = index // 3
-        channel_index = index % 3
+    def embed_bits(self, bits, start: int = 0):
+        """Hides `bits` (0/1 values) at LSB locations start, start + 1, ..."""
+        bits = np.asarray(bits, dtype=np.uint8)
+        _write_parity(self.pixels.reshape(-1), self._range(start, len(bits)), bits)
 
-        x = pixel_index % self.width
-        y = pixel_index // self.width
+    def extract_bits(self, start: int = 0, count: int = None) -> np.ndarray:
+        """Returns `count` bits (uint8 0/1) from LSB locations starting at `start`; by default up to the end."""
+        count = self.capacity - start if count is None else count
+        return self.pixels.reshape(-1)[self._range(start, count)] & 1
 
-        r, g, b = self.pixels[x, y]
-        pixel_list = [r, g, b]
+    def embed_bits_at(self, indices, bits):
+        """Hides bits[i] at LSB location indices[i]. Indices should not repeat."""
+        _write_parity(self.pixels.reshape(-1), self._indices(indices), np.asarray(bits, dtype=np.uint8))
 
-        # Modify the LSB of the chosen channel
-        pixel_list[channel_index] = (pixel_list[channel_index] & 0xFE) | bit
-        self.pixels[x, y] = tuple(pixel_list)
+    def extract_bits_at(self, indices) -> np.ndarray:
+        """Returns the bits (uint8 0/1) at the given LSB locations."""
+        return self.pixels.reshape(-1)[self._indices(indices)] & 1
+
+    def embed_bit(self, bit: int, index: int):
+        """Hides a single bit at the Nth available LSB location."""
+        if not 0 <= index < self.capacity:
+            raise ValueError("Index out of bounds for embedding.")
+        self.embed_bits((bit,), index)
 
     def extract_bit(self, index: int) -> int:
         """Extracts a single bit from the Nth available LSB location."""
-        if index >= self.capacity:
+        if not 0 <= index < self.capacity:
             raise ValueError("Index out of bounds for extraction.")
-
-        pixel_index = index // 3
-        channel_index = index % 3
-
-        x = pixel_index % self.width
-        y = pixel_index // self.width
-
-        # Return the LSB from the chosen channel
-        return self.pixels[x, y][channel_index] & 1
+        return int(self.pixels.reshape(-1)[index] & 1)
 
     def save(self, output_path):
         """Saves the modified image to the output path, always as PNG for data integrity."""
-        self.image.save(output_path, "PNG")
+        Image.fromarray(self.pixels, 'RGB').save(output_path, "PNG")
         print(f"[LSB Handler] Saved stego image to {output_path}")
 
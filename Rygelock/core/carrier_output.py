@@ -0,0 +1,178 @@
+# core/carrier_output.py — Creates the output file of append-style carrier handlers
+#
+# Container handlers (image_steg, mp3_steg, mp4_steg, synch_steg) leave the carrier's bytes as they
+# are and add or rewrite a little data at the end or in a tag. The output starts as a clone of the
+# carrier, made the cheapest way the platform offers:
+#   1. FICLONE reflink (Btrfs, XFS, bcachefs, ...): shares the extents, no data is copied at all
+#   2. os.copy_file_range: the kernel copies, or server-side on NFS 4.2 / SMB
+#   3. os.sendfile: in-kernel copy without passing through user space
+#   4. chunked read/write
+# With in_place=True nothing is cloned: the handler modifies the carrier itself, and an append that
+# fails is truncated back to the carrier's original length. Handlers that must move the carrier's
+# data (a tag that outgrew its space) write a new file with carrier_rewrite() instead.
+
+import contextlib
+import errno
+import os
+import shutil
+import sys
+import tempfile
+
+from core.tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CLONE_CHUNK = 1024 * 1024
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+# errnos meaning "this copy method is not available here", as opposed to a real I/O error
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF,
+                errno.ETXTBSY, errno.EPERM}
+
+
+def _kernel_copy(copy, src_fd, dst_fd, src_offset, dst_offset, size, copied):
+    """
+    Runs copy(src_fd, dst_fd, src position, dst position, count) until `size` bytes from src_offset
+    are at dst_offset. Returns the bytes done so far.
+    """
+    while copied < size:
+        try:
+            done = copy(src_fd, dst_fd, src_offset + copied, dst_offset + copied, size - copied)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                break
+            raise
+        if not done:  # Source shrank underneath us
+            break
+        copied += done
+    return copied
+
+
+def _copy_file_range(src_fd, dst_fd, src_offset, dst_offset, count):
+    return os.copy_file_range(src_fd, dst_fd, min(count, 1 << 30), src_offset, dst_offset)
+
+
+def _sendfile(src_fd, dst_fd, src_offset, dst_offset, count):
+    os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, src_offset, min(count, 1 << 30))
+
+
+def copy_file_region(f_in, f_out, offset, size) -> str:
+    """
+    Copies `size` bytes of f_in from `offset` to the current position of f_out, in the kernel when
+    possible, and leaves f_out positioned after them. Returns the method used, as clone_file() does.
+    """
+    f_out.flush()
+    dst_offset = f_out.tell()
+    method, copied = "copy", 0
+    for name, copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile)):
+        if copied < size and hasattr(os, name):
+            done = _kernel_copy(copy, f_in.fileno(), f_out.fileno(), offset, dst_offset, size, copied)
+            if done > copied:
+                method, copied = name, done
+    f_out.seek(dst_offset + copied)
+    if copied < size:
+        f_in.seek(offset + copied)
+        remaining = size - copied
+        while remaining:
+            chunk = f_in.read(min(remaining, CLONE_CHUNK))
+            if not chunk:
+                break
+            f_out.write(chunk)
+            remaining -= len(chunk)
+    return method
+
+
+def clone_file(src_path, dst_path) -> str:
+    """
+    Makes dst_path a copy of src_path, with its permission bits, by the cheapest method that works.
+    Returns the method used: "reflink", "copy_file_range", "sendfile" or "copy".
+    """
+    with open(src_path, "rb") as f_in, open(dst_path, "wb") as f_out:
+        size = os.fstat(f_in.fileno()).st_size
+        with span("carrier_clone", size) as clone_span:
+            method = None
+            if fcntl is not None and sys.platform.startswith("linux"):
+                try:
+                    fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+                    method = "reflink"
+                except OSError:
+                    pass
+            if method is None:
+                method = copy_file_region(f_in, f_out, 0, size)
+            clone_span.set(method=method)
+    shutil.copymode(src_path, dst_path)
+    return method
+
+
+def _target_path(carrier_path, output_path, in_place) -> str:
+    if in_place:
+        if output_path and os.path.abspath(output_path) != os.path.abspath(carrier_path):
+            raise ValueError("In-place embedding writes to the carrier; output_path must be omitted or the carrier.")
+        return carrier_path
+    if not output_path:
+        raise ValueError("An output_path is required unless embedding in place.")
+    if os.path.exists(output_path) and os.path.samefile(output_path, carrier_path):
+        raise ValueError("output_path is the carrier itself; embed with in_place=True to modify it.")
+    return output_path
+
+
+def output_target(carrier_path, output_path=None, in_place=False) -> str:
+    """
+    The file a handler should modify: carrier_path itself when in_place, otherwise output_path made
+    a fresh clone of the carrier.
+    """
+    target = _target_path(carrier_path, output_path, in_place)
+    if not in_place:
+        clone_file(carrier_path, target)
+    return target
+
+
+@contextlib.contextmanager
+def carrier_output(carrier_path, output_path=None, in_place=False):
+    """
+    Opens the handler's output (see output_target) for update, positioned at the end of the carrier
+    data. If the block raises, an in-place carrier is truncated back to its original length and a
+    cloned output is removed.
+    """
+    target = output_target(carrier_path, output_path, in_place)
+    f_out = open(target, "r+b")
+    original_size = f_out.seek(0, os.SEEK_END)
+    try:
+        with f_out:
+            yield f_out
+    except BaseException:
+        if in_place:
+            with open(target, "r+b") as f:
+                f.truncate(original_size)
+        else:
+            with contextlib.suppress(OSError):
+                os.remove(target)
+        raise
+
+
+@contextlib.contextmanager
+def carrier_rewrite(carrier_path, output_path=None, in_place=False):
+    """
+    Opens a new, empty output for a handler that writes the whole file itself. In place, the new file
+    is a temporary one next to the carrier that replaces it only once the block succeeds; otherwise it
+    is output_path. Either way the file is removed if the block raises.
+    """
+    path = _target_path(carrier_path, output_path, in_place)
+    if in_place:
+        fd, path = tempfile.mkstemp(prefix=".rygelock-", dir=os.path.dirname(os.path.abspath(carrier_path)))
+        f_out = os.fdopen(fd, "wb")
+    else:
+        f_out = open(path, "wb")
+    try:
+        with f_out:
+            yield f_out
+        shutil.copymode(carrier_path, path)
+        if in_place:
+            os.replace(path, carrier_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        raise
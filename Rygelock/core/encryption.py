@@ -1,8 +1,10 @@
 from Crypto.Cipher import AES, Blowfish
 from Crypto.Random import get_random_bytes
-from Crypto.Protocol.KDF import PBKDF2
+from Crypto.Protocol.KDF import PBKDF2, HKDF
+from Crypto.Hash import SHA256
 from Crypto.Cipher import ChaCha20
 from cryptography.fernet import Fernet, InvalidToken
+from typing import Union
 import base64
 import hashlib
 import os
@@ -12,6 +14,52 @@ BLOCK_SIZE_BLOWFISH = 8
 PBKDF2_ITER = 100_000
 SALT_SIZE = 16 # For salts prepended to ciphertext)
 
+# Key length (bytes) each algorithm expects when it is driven by a raw key
+KEY_SIZES = {"AES": 32, "Blowfish": 56, "Fernet": 32}
+
+# Anything exposing the buffer protocol. Encrypt functions return a bytearray; decrypt functions
+# return a memoryview and work in place when the input buffer is writable (the ciphertext is consumed).
+BytesLike = Union[bytes, bytearray, memoryview]
+
+def _as_view(data: BytesLike) -> memoryview:
+    """Flat byte view over any buffer-protocol object, without copying."""
+    return memoryview(data).cast('B')
+
+def _open_into(cipher, data: memoryview) -> memoryview:
+    """Runs cipher.decrypt over `data` in place when it is writable, otherwise into one new buffer."""
+    if data.readonly:
+        return memoryview(cipher.decrypt(data))
+    cipher.decrypt(data, output=data)
+    return data
+
+# --------------------------- CBC (AES / Blowfish) ----------------------------
+def _cbc_seal(cipher_module, block_size: int, data: BytesLike, key: bytes, prefix_size: int = 0) -> bytearray:
+    """
+    PKCS7-pads and CBC-encrypts into a single preallocated buffer laid out as
+    [prefix_size free bytes][IV][ciphertext], so callers can drop a salt in front without concatenating.
+    """
+    view = _as_view(data)
+    pad_len = block_size - len(view) % block_size
+    out = bytearray(prefix_size + block_size + len(view) + pad_len)
+    iv = get_random_bytes(block_size)
+    out[prefix_size:prefix_size + block_size] = iv
+    body = memoryview(out)[prefix_size + block_size:]
+    body[:len(view)] = view
+    body[len(view):] = bytes([pad_len]) * pad_len
+    cipher_module.new(key, cipher_module.MODE_CBC, iv).encrypt(body, output=body)
+    return out
+
+def _cbc_open(cipher_module, block_size: int, data: BytesLike, key: bytes, name: str) -> memoryview:
+    view = _as_view(data)
+    iv = bytes(view[:block_size])
+    decrypted = _open_into(cipher_module.new(key, cipher_module.MODE_CBC, iv), view[block_size:])
+    # Unpad
+    pad_len = decrypted[-1] if len(decrypted) else 0
+    # Check for valid padding length (important for integrity check)
+    if not (1 <= pad_len <= block_size and decrypted[-pad_len:] == bytes([pad_len]) * pad_len):
+        raise ValueError(f"Invalid padding detected during {name} decryption. Possible incorrect password/key or corrupted data.")
+    return decrypted[:-pad_len]
+
 # --- Helper function for Key Derivation ---
 def _derive_key_material(password: str, salt: bytes, key_data: bytes = None, dkLen: int = 32) -> bytes:
     """
@@ -34,81 +82,85 @@ def _derive_key_material(password: str, salt: bytes, key_data: bytes = None, dkL
     # PBKDF2 handles its internal salt generation if not explicitly given, but here we pass ours.
     return PBKDF2(combined_password_seed, salt, dkLen=dkLen, count=PBKDF2_ITER)
 
+# --- Single-stretch key schedule ---
+def derive_master_key(password: str, salt: bytes, key_data: bytes = None) -> bytes:
+    """
+    Stretches the password (and optional key_data) once with PBKDF2.
+    Every per-layer key is then expanded from this master secret with expand_key().
+    """
+    return _derive_key_material(password, salt, key_data, dkLen=32)
+
+def expand_key(master_key: bytes, label: str, dkLen: int = 32) -> bytes:
+    """
+    Cheap HKDF-SHA256 expansion of an already-stretched master key.
+    Distinct labels give independent keys.
+    """
+    return HKDF(master_key, dkLen, None, SHA256, context=label.encode('utf-8'))
+
 # --------------------------- AES ----------------------------
-def encrypt_aes(data: bytes, password: str, key_data: bytes = None) -> bytes:
+def _encrypt_aes_with_key(data: BytesLike, key: bytes) -> bytearray:
+    return _cbc_seal(AES, BLOCK_SIZE_AES, data, key) # IV is prepended to the ciphertext
+
+def _decrypt_aes_with_key(data: BytesLike, key: bytes) -> memoryview:
+    return _cbc_open(AES, BLOCK_SIZE_AES, data, key, "AES")
+
+def encrypt_aes(data: BytesLike, password: str, key_data: bytes = None) -> bytearray:
     salt = get_random_bytes(SALT_SIZE) # Salt for PBKDF2
     key = _derive_key_material(password, salt, key_data, dkLen=32) # AES key is 32 bytes for AES-256
-    iv = get_random_bytes(BLOCK_SIZE_AES) # IV for CBC mode
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    # PKCS7 padding equivalent
-    pad_len = BLOCK_SIZE_AES - len(data) % BLOCK_SIZE_AES
-    data += bytes([pad_len]) * pad_len
-    encrypted = cipher.encrypt(data)
-    return salt + iv + encrypted # Prepend salt and IV to the ciphertext
-
-def decrypt_aes(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = data[:SALT_SIZE]
-    iv = data[SALT_SIZE:SALT_SIZE + BLOCK_SIZE_AES]
-    encrypted = data[SALT_SIZE + BLOCK_SIZE_AES:]
-    key = _derive_key_material(password, salt, key_data, dkLen=32)
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    decrypted = cipher.decrypt(encrypted)
-    # Unpad
-    pad_len = decrypted[-1]
-    # Check for valid padding length (important for integrity check)
-    if not (1 <= pad_len <= BLOCK_SIZE_AES and decrypted[-pad_len:] == bytes([pad_len]) * pad_len):
-        raise ValueError("Invalid padding detected during AES decryption. Possible incorrect password/key or corrupted data.")
-    return decrypted[:-pad_len]
+    out = _cbc_seal(AES, BLOCK_SIZE_AES, data, key, prefix_size=SALT_SIZE)
+    out[:SALT_SIZE] = salt # Salt and IV precede the ciphertext
+    return out
+
+def decrypt_aes(data: BytesLike, password: str, key_data: bytes = None) -> memoryview:
+    view = _as_view(data)
+    key = _derive_key_material(password, view[:SALT_SIZE], key_data, dkLen=32)
+    return _decrypt_aes_with_key(view[SALT_SIZE:], key)
 
 # ------------------------- Blowfish --------------------------
-def encrypt_blowfish(data: bytes, password: str, key_data: bytes = None) -> bytes:
+def _encrypt_blowfish_with_key(data: BytesLike, key: bytes) -> bytearray:
+    return _cbc_seal(Blowfish, BLOCK_SIZE_BLOWFISH, data, key)
+
+def _decrypt_blowfish_with_key(data: BytesLike, key: bytes) -> memoryview:
+    return _cbc_open(Blowfish, BLOCK_SIZE_BLOWFISH, data, key, "Blowfish")
+
+def encrypt_blowfish(data: BytesLike, password: str, key_data: bytes = None) -> bytearray:
     salt = get_random_bytes(SALT_SIZE)
     # Blowfish key length can be variable (32-448 bits, i.e., 4-56 bytes)
     # derive 56 bytes to provide maximum strength for Blowfish
     key = _derive_key_material(password, salt, key_data, dkLen=56)
-    iv = get_random_bytes(BLOCK_SIZE_BLOWFISH)
-    cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
-    # PKCS7 padding equivalent
-    pad_len = BLOCK_SIZE_BLOWFISH - len(data) % BLOCK_SIZE_BLOWFISH
-    data += bytes([pad_len]) * pad_len
-    encrypted = cipher.encrypt(data)
-    return salt + iv + encrypted
-
-def decrypt_blowfish(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = data[:SALT_SIZE]
-    iv = data[SALT_SIZE:SALT_SIZE + BLOCK_SIZE_BLOWFISH]
-    encrypted = data[SALT_SIZE + BLOCK_SIZE_BLOWFISH:]
-    key = _derive_key_material(password, salt, key_data, dkLen=56)
-    cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
-    decrypted = cipher.decrypt(encrypted)
-    # Unpad
-    pad_len = decrypted[-1]
-    # Check for valid padding length
-    if not (1 <= pad_len <= BLOCK_SIZE_BLOWFISH and decrypted[-pad_len:] == bytes([pad_len]) * pad_len):
-        raise ValueError("Invalid padding detected during Blowfish decryption. Possible incorrect password/key or corrupted data.")
-    return decrypted[:-pad_len]
+    out = _cbc_seal(Blowfish, BLOCK_SIZE_BLOWFISH, data, key, prefix_size=SALT_SIZE)
+    out[:SALT_SIZE] = salt
+    return out
+
+def decrypt_blowfish(data: BytesLike, password: str, key_data: bytes = None) -> memoryview:
+    view = _as_view(data)
+    key = _derive_key_material(password, view[:SALT_SIZE], key_data, dkLen=56)
+    return _decrypt_blowfish_with_key(view[SALT_SIZE:], key)
 
 # -------------------------- Fernet ---------------------------
-def encrypt_fernet(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = get_random_bytes(SALT_SIZE)
+# Fernet only accepts bytes and builds its own base64 token, so this path always copies.
+def _encrypt_fernet_with_key(data: BytesLike, key: bytes) -> bytes:
     # Fernet key needs to be 32 URL-safe base64-encoded bytes
+    f = Fernet(base64.urlsafe_b64encode(key))
+    return f.encrypt(bytes(data))
+
+def _decrypt_fernet_with_key(data: BytesLike, key: bytes) -> memoryview:
+    f = Fernet(base64.urlsafe_b64encode(key))
+    return memoryview(f.decrypt(bytes(data))) # Fernet handles its own integrity/padding internally
+
+def encrypt_fernet(data: BytesLike, password: str, key_data: bytes = None) -> bytes:
+    salt = get_random_bytes(SALT_SIZE)
     key_material = _derive_key_material(password, salt, key_data, dkLen=32)
-    fernet_key = base64.urlsafe_b64encode(key_material)
-    f = Fernet(fernet_key)
-    encrypted = f.encrypt(data)
-    return salt + encrypted # Prepend salt to the Fernet token
-
-def decrypt_fernet(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = data[:SALT_SIZE]
-    encrypted = data[SALT_SIZE:]
-    key_material = _derive_key_material(password, salt, key_data, dkLen=32)
-    fernet_key = base64.urlsafe_b64encode(key_material)
-    f = Fernet(fernet_key)
-    return f.decrypt(encrypted) # Fernet handles its own integrity/padding internally
+    return salt + _encrypt_fernet_with_key(data, key_material) # Prepend salt to the Fernet token
+
+def decrypt_fernet(data: BytesLike, password: str, key_data: bytes = None) -> memoryview:
+    view = _as_view(data)
+    key_material = _derive_key_material(password, view[:SALT_SIZE], key_data, dkLen=32)
+    return _decrypt_fernet_with_key(view[SALT_SIZE:], key_material)
 
 # ---------------------- Dispatcher ---------------------------
 # These functions are the main entry points for your UI
-def encrypt_file(data: bytes, algorithm: str, password: str, key_data: bytes = None) -> bytes:
+def encrypt_file(data: BytesLike, algorithm: str, password: str, key_data: bytes = None) -> BytesLike:
     """
     Encrypts data using the specified algorithm, password, and optional key_data.
     """
@@ -124,9 +176,10 @@ def encrypt_file(data: bytes, algorithm: str, password: str, key_data: bytes = N
     else:
         raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
 
-def decrypt_file(data: bytes, password: str, algorithm: str, key_data: bytes = None) -> bytes:
+def decrypt_file(data: BytesLike, password: str, algorithm: str, key_data: bytes = None) -> memoryview:
     """
     Decrypts data using the specified algorithm, password, and optional key_data.
+    Decrypts in place when `data` is a writable buffer (bytearray / writable memoryview).
     Raises ValueError for decryption failures (wrong password/key, corruption).
     """
     if not password: # Ensure password is not empty for decryption
@@ -145,8 +198,38 @@ def decrypt_file(data: bytes, password: str, algorithm: str, key_data: bytes = N
         # Re-raise with a more generic message for UI, but preserve original for debugging
         raise ValueError(f"Decryption failed. Incorrect password/key or corrupted data. Original error: {e}")
 
+def encrypt_with_key(data: BytesLike, algorithm: str, key: bytes) -> BytesLike:
+    """
+    Encrypts data with an already-derived key (see expand_key), skipping PBKDF2.
+    The key must be KEY_SIZES[algorithm] bytes long.
+    """
+    if algorithm == "AES":
+        return _encrypt_aes_with_key(data, key)
+    elif algorithm == "Fernet":
+        return _encrypt_fernet_with_key(data, key)
+    elif algorithm == "Blowfish":
+        return _encrypt_blowfish_with_key(data, key)
+    else:
+        raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
+
+def decrypt_with_key(data: BytesLike, algorithm: str, key: bytes) -> memoryview:
+    """
+    Reverses encrypt_with_key(), in place when `data` is writable. Raises ValueError for decryption failures.
+    """
+    try:
+        if algorithm == "AES":
+            return _decrypt_aes_with_key(data, key)
+        elif algorithm == "Fernet":
+            return _decrypt_fernet_with_key(data, key)
+        elif algorithm == "Blowfish":
+            return _decrypt_blowfish_with_key(data, key)
+        else:
+            raise ValueError(f"Unsupported decryption algorithm: {algorithm}")
+    except (ValueError, InvalidToken) as e:
+        raise ValueError(f"Decryption failed. Incorrect password/key or corrupted data. Original error: {e}")
+
 # -------------------- Optional Masking ------------------------
-def apply_masking(data: bytes, password: str) -> bytes:
+def apply_masking(data: BytesLike, password: str) -> bytearray:
     """
     Applies a secure obfuscation layer using the ChaCha20 stream cipher.
     A random nonce is generated and prepended to the output.
@@ -155,31 +238,43 @@ def apply_masking(data: bytes, password: str) -> bytes:
     # static salt for nonce provides the uniqueness.
     masking_salt = b'rygelock_masking_salt'
     masking_key = PBKDF2(password.encode('utf-8'), masking_salt, dkLen=32, count=1000)  # Faster KDF for this layer
+    return apply_masking_with_key(data, masking_key)
 
+def apply_masking_with_key(data: BytesLike, masking_key: bytes) -> bytearray:
+    """
+    ChaCha20 masking with an already-derived 32-byte key.
+    """
     # Create the ChaCha20 cipher
     cipher = ChaCha20.new(key=masking_key)
-    masked_data = cipher.encrypt(data)
+    view = _as_view(data)
 
     # Prepend the nonce to the data. The nonce is required for decryption.
     # The nonce is public, not secret.
-    return cipher.nonce + masked_data
+    out = bytearray(len(cipher.nonce) + len(view))
+    out[:len(cipher.nonce)] = cipher.nonce
+    cipher.encrypt(view, output=memoryview(out)[len(cipher.nonce):])
+    return out
 
 
-def apply_demasking(data: bytes, password: str) -> bytes:
+def apply_demasking(data: BytesLike, password: str) -> memoryview:
     """
     Reverses the ChaCha20 stream cipher obfuscation layer.
     """
-    # The nonce is the first 8 bytes of the data
-    nonce = data[:8]
-    masked_data = data[8:]
-
     # Derive the same key that was used for masking
     masking_salt = b'rygelock_masking_salt'
     masking_key = PBKDF2(password.encode('utf-8'), masking_salt, dkLen=32, count=1000)
+    return apply_demasking_with_key(data, masking_key)
+
+
+def apply_demasking_with_key(data: BytesLike, masking_key: bytes) -> memoryview:
+    """
+    Reverses apply_masking_with_key(), in place when `data` is writable.
+    """
+    # The nonce is the first 8 bytes of the data
+    view = _as_view(data)
+    nonce = bytes(view[:8])
 
     # Create the cipher with the original key and nonce to decrypt
     cipher = ChaCha20.new(key=masking_key, nonce=nonce)
-    original_data = cipher.decrypt(masked_data)
-
+    return _open_into(cipher, view[8:])
 
-    return original_data
@@ -0,0 +1,124 @@
+# core/id3_tags.py — Minimal ID3v2.3 / v2.4 frame walker and writer for mp3_steg
+#
+# Only the tag at the start of the file is read: read_id3_tag() walks the frame headers with seeks, so
+# large frames (cover art, payload chunks) are only read when asked for, and the audio is never touched.
+# pack_id3_tag() lays frames out in a tag of a given size, the rest being zero padding. A tag written
+# into the space of the old one (frames, padding, extended header and footer) leaves the audio where it
+# is; only a tag that outgrows that space means writing the file again.
+# ID3v2.2 and unsynchronised tags are not walked (read_id3_tag() marks them unsupported).
+
+ID3_HEADER_SIZE = 10
+ID3_FRAME_HEADER_SIZE = 10
+ID3_MAX_SIZE = (1 << 28) - 1  # Tag sizes are 28-bit synchsafe integers
+ID3_FLAG_UNSYNC = 0x80
+ID3_FLAG_EXTENDED = 0x40
+ID3_FLAG_FOOTER = 0x10
+
+
+def synchsafe(value: int) -> bytes:
+    """`value` as a 4-byte synchsafe integer (7 bits per byte)."""
+    if not 0 <= value <= ID3_MAX_SIZE:
+        raise ValueError("Value does not fit a synchsafe integer.")
+    return bytes(((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F))
+
+
+def unsynchsafe(data: bytes) -> int:
+    return (data[0] & 0x7F) << 21 | (data[1] & 0x7F) << 14 | (data[2] & 0x7F) << 7 | (data[3] & 0x7F)
+
+
+class Id3Frame:
+    """One frame: its 4-character id, where its data starts, the data size and the frame flags."""
+    __slots__ = ("id", "offset", "size", "flags")
+
+    def __init__(self, frame_id: bytes, offset: int, size: int, flags: int):
+        self.id = frame_id
+        self.offset = offset
+        self.size = size
+        self.flags = flags
+
+    @property
+    def header_offset(self) -> int:
+        return self.offset - ID3_FRAME_HEADER_SIZE
+
+
+class Id3Tag:
+    """The tag at the start of a file. `end` is where the audio starts (after padding and any footer)."""
+    def __init__(self, version: int, flags: int, size: int):
+        self.version = version
+        self.flags = flags
+        self.size = size
+        self.end = ID3_HEADER_SIZE + size + (ID3_HEADER_SIZE if version == 4 and flags & ID3_FLAG_FOOTER else 0)
+        self.frames = []
+
+    @property
+    def supported(self) -> bool:
+        return self.version in (3, 4) and not self.flags & ID3_FLAG_UNSYNC
+
+
+def read_id3_tag(f):
+    """
+    Walks the ID3v2 tag at the start of `f` (a binary file). Returns None when the file has no tag.
+    Frames are only listed for supported tags; the walk stops at the padding or at a frame that does
+    not fit inside the tag.
+    """
+    f.seek(0)
+    header = f.read(ID3_HEADER_SIZE)
+    if len(header) < ID3_HEADER_SIZE or header[:3] != b"ID3" or header[3] == 0xFF:
+        return None
+    tag = Id3Tag(header[3], header[5], unsynchsafe(header[6:10]))
+    if not tag.supported:
+        return tag
+
+    position = ID3_HEADER_SIZE
+    body_end = ID3_HEADER_SIZE + tag.size
+    if tag.flags & ID3_FLAG_EXTENDED:
+        extended = f.read(4)
+        if len(extended) < 4:
+            return tag
+        # v2.3 counts the size bytes separately; v2.4 includes them
+        position += unsynchsafe(extended) if tag.version == 4 else 4 + int.from_bytes(extended, 'big')
+
+    while position + ID3_FRAME_HEADER_SIZE <= body_end:
+        f.seek(position)
+        frame_header = f.read(ID3_FRAME_HEADER_SIZE)
+        if len(frame_header) < ID3_FRAME_HEADER_SIZE or not frame_header[0]:  # Padding
+            break
+        size_bytes = frame_header[4:8]
+        size = unsynchsafe(size_bytes) if tag.version == 4 else int.from_bytes(size_bytes, 'big')
+        data_offset = position + ID3_FRAME_HEADER_SIZE
+        if data_offset + size > body_end:
+            break
+        tag.frames.append(Id3Frame(frame_header[:4], data_offset, size, int.from_bytes(frame_header[8:10], 'big')))
+        position = data_offset + size
+    return tag
+
+
+def read_frame(f, frame, count=None) -> bytes:
+    """The data of `frame`, or only its first `count` bytes."""
+    f.seek(frame.offset)
+    return f.read(frame.size if count is None else min(count, frame.size))
+
+
+def read_raw_frame(f, frame) -> bytes:
+    """`frame` as stored, header included, for copying into a new tag of the same version."""
+    f.seek(frame.header_offset)
+    return f.read(ID3_FRAME_HEADER_SIZE + frame.size)
+
+
+def pack_frame_header(frame_id: bytes, size: int, version: int, flags: int = 0) -> bytes:
+    size_bytes = synchsafe(size) if version == 4 else size.to_bytes(4, 'big')
+    return frame_id + size_bytes + flags.to_bytes(2, 'big')
+
+
+def pack_id3_tag(version: int, flags: int, frames, size: int) -> list:
+    """
+    A tag of `size` bytes after the header (no extended header or footer) holding `frames`, each a
+    list of byte-like parts making up one whole frame, followed by zero padding. Returns the parts
+    to write, so payload buffers are never copied.
+    """
+    used = sum(len(part) for frame in frames for part in frame)
+    if used > size:
+        raise ValueError("Frames do not fit in the ID3 tag.")
+    flags &= ~(ID3_FLAG_UNSYNC | ID3_FLAG_EXTENDED | ID3_FLAG_FOOTER)
+    header = b"ID3" + bytes((version, 0, flags)) + synchsafe(size)
+    return [header] + [part for frame in frames for part in frame] + [bytes(size - used)]
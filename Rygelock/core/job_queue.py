@@ -0,0 +1,184 @@
+# core/job_queue.py — Bounded job scheduler shared by the embed and extract front ends
+#
+# Jobs run on a fixed-size thread pool. Cancellation is cooperative: each job carries a
+# threading.Event that the engine polls at its checkpoints (see check_cancelled).
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Job states ---
+JOB_QUEUED = "Queued"
+JOB_RUNNING = "Running"
+JOB_SUCCEEDED = "Succeeded"
+JOB_FAILED = "Failed"
+JOB_CANCELLED = "Cancelled"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised at a cancellation checkpoint once the running job has been cancelled."""
+
+
+def check_cancelled(cancel_event):
+    """Cancellation checkpoint for engine stages. `cancel_event` is a threading.Event or None."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("Job was cancelled.")
+
+
+class Job:
+    """One queued embed/extract run. Attributes are updated by the scheduler; treat them as read-only."""
+    def __init__(self, job_id: int, kind: str, label: str, fn):
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.state = JOB_QUEUED
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._fn = fn
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+
+def _state_from_result(result) -> str:
+    # embed_files reports "Success"/"Failed"/"Cancelled", extract_payload "success"/"error"/"cancelled"
+    status = str((result or {}).get("status", "")).lower()
+    if status == "success":
+        return JOB_SUCCEEDED
+    if status == "cancelled":
+        return JOB_CANCELLED
+    return JOB_FAILED
+
+
+class JobScheduler:
+    """
+    Queues jobs and runs at most `max_workers` of them at a time. Listeners registered with
+    add_listener() are called with the Job on every state or progress change, from worker threads;
+    those registered with add_clear_listener() are called with no arguments after clear_finished().
+    """
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rygelock-job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._clear_listeners = []
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def add_clear_listener(self, callback):
+        self._clear_listeners.append(callback)
+
+    def _notify(self, job: Job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"[JobScheduler] Listener failed: {e}")
+
+    def submit(self, kind: str, label: str, fn) -> Job:
+        """Queues `fn(job)`, which must return a result dict and should honour job.cancel_event."""
+        with self._lock:
+            job = Job(next(self._ids), kind, label, fn)
+            self._jobs[job.id] = job
+        self._notify(job)
+        self._pool.submit(self._run, job)
+        return job
+
+    def submit_embed(self, config: dict, label: str = None) -> Job:
+        from core.steg_engine import embed_files  # Imported lazily; the engine imports this module
+
+        def run(job):
+            return embed_files(config, lambda value: self._set_progress(job, value), cancel_event=job.cancel_event)
+        label = label or ", ".join(os.path.basename(c["file"]) for c in config["carriers"])
+        return self.submit("embed", label, run)
+
+    def submit_extract(self, file_path, password: str, key_data: bytes = None, output_dir: str = None,
+                       label: str = None) -> Job:
+        from core.steg_engine import extract_payload
+
+        def run(job):
+            return extract_payload(file_path, password=password, key_data=key_data, output_dir=output_dir,
+                                   cancel_event=job.cancel_event)
+        paths = file_path if isinstance(file_path, (list, tuple)) else [file_path]
+        label = label or ", ".join(os.path.basename(p) for p in paths)
+        return self.submit("extract", label, run)
+
+    def _set_progress(self, job: Job, value: int):
+        job.progress = value
+        self._notify(job)
+
+    def _run(self, job: Job):
+        with self._lock:
+            if job.state != JOB_QUEUED:  # Cancelled while still queued
+                return
+            job.state = JOB_RUNNING
+            job.started_at = time.time()
+        self._notify(job)
+
+        try:
+            check_cancelled(job.cancel_event)
+            job.result = job._fn(job)
+            state = _state_from_result(job.result)
+        except JobCancelled:
+            state = JOB_CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            state = JOB_FAILED
+
+        with self._lock:
+            job.state = state
+            job.finished_at = time.time()
+            if state == JOB_SUCCEEDED:
+                job.progress = 100
+        self._notify(job)
+
+    def cancel(self, job_id: int) -> bool:
+        """Requests cancellation. A queued job is cancelled at once, a running one at its next checkpoint."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        with self._lock:
+            cancelled_while_queued = job.state == JOB_QUEUED
+            if cancelled_while_queued:
+                job.state = JOB_CANCELLED
+                job.finished_at = time.time()
+        if cancelled_while_queued:
+            self._notify(job)
+        return True
+
+    def get(self, job_id: int) -> Job:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def clear_finished(self):
+        with self._lock:
+            for job_id in [job.id for job in self._jobs.values() if job.finished]:
+                del self._jobs[job_id]
+        for callback in list(self._clear_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"[JobScheduler] Clear listener failed: {e}")
+
+    def shutdown(self, cancel_pending: bool = True):
+        """Stops the pool; with `cancel_pending`, queued and running jobs are cancelled first."""
+        if cancel_pending:
+            for job in self.jobs():
+                self.cancel(job.id)
+        self._pool.shutdown(wait=True)
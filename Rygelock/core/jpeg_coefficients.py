@@ -0,0 +1,787 @@
+# core/jpeg_coefficients.py — Quantized DCT coefficients of JPEG files, read and written without a pixel round trip
+#
+# read_jpeg() parses a baseline, extended-sequential or progressive Huffman-coded JPEG and entropy-decodes
+# its scans into one array of quantized coefficients per component. write_jpeg() codes those arrays back
+# behind the original APPn/COM segments and quantization tables, so nothing is requantized. A sequential
+# file keeps its scans and Huffman tables, unless a table no longer covers every symbol after the
+# coefficients changed. In that case, and for progressive files (written back as one sequential scan),
+# optimal tables are built from the coefficients, as libjpeg does with optimize_coding.
+# Arithmetic-coded, lossless, hierarchical and 12-bit files raise ValueError.
+#
+# Decoding walks the Huffman codes in Python through 16-bit lookup tables and is the slow half; encoding
+# builds and packs the symbol stream of a whole scan with NumPy.
+
+import re
+from array import array
+import numpy as np
+
+# Natural (row-major) index of the k-th coefficient of a block in zigzag order
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+])
+_UNZIGZAG = np.argsort(ZIGZAG)
+
+# --- Markers ---
+SOI, EOI, SOS, DQT, DHT, DRI, DNL, COM = 0xD8, 0xD9, 0xDA, 0xDB, 0xC4, 0xDD, 0xDC, 0xFE
+SOF_BASELINE, SOF_EXTENDED, SOF_PROGRESSIVE = 0xC0, 0xC1, 0xC2
+_UNSUPPORTED_SOF = {0xC3: "lossless", 0xC5: "hierarchical", 0xC6: "hierarchical", 0xC7: "hierarchical",
+                    0xC9: "arithmetic-coded", 0xCA: "arithmetic-coded", 0xCB: "arithmetic-coded",
+                    0xCC: "arithmetic-coded", 0xCD: "arithmetic-coded", 0xCE: "arithmetic-coded",
+                    0xCF: "arithmetic-coded"}
+_ENTROPY_END = re.compile(rb'\xff[^\x00\xd0-\xd7]')  # Entropy-coded data runs until a marker other than RSTn
+_RESTART = re.compile(rb'\xff[\xd0-\xd7]')
+_READ_PADDING = bytes(8)  # Lets the bit reader look ahead past the last byte of an interval
+_MAX_MCU_BLOCKS = 10  # Blocks allowed in one MCU of an interleaved scan
+
+
+class JpegComponent:
+    """
+    One colour component. `blocks` holds its quantized coefficients as (rows, cols, 8, 8) int16 in natural
+    order, over the MCU-padded block grid; the first block_rows × block_cols blocks cover the image.
+    """
+    def __init__(self, component_id: int, h: int, v: int, quant_table: int):
+        self.id = component_id
+        self.h = h
+        self.v = v
+        self.quant_table = quant_table
+        self.blocks = None
+        self.block_rows = self.block_cols = 0
+
+    @property
+    def visible_blocks(self) -> np.ndarray:
+        """View of the blocks that cover the image."""
+        return self.blocks[:self.block_rows, :self.block_cols]
+
+
+class JpegImage:
+    """Everything write_jpeg() needs to code the coefficients back into a file."""
+    def __init__(self):
+        self.width = self.height = 0
+        self.frame_marker = SOF_BASELINE
+        self.components = []
+        self.quant_tables = {}  # Table id -> (8, 8) uint16 in natural order
+        self.restart_interval = 0
+        self.segments = []  # (marker, payload) of the APPn and COM segments, in file order
+        self.scans = []  # Sequential files only: (component indexes, [(DC id, table)], [(AC id, table)])
+
+    @property
+    def progressive(self) -> bool:
+        return self.frame_marker == SOF_PROGRESSIVE
+
+    def _mcu_grid(self):
+        h_max = max(c.h for c in self.components)
+        v_max = max(c.v for c in self.components)
+        return h_max, v_max, -(-self.width // (8 * h_max)), -(-self.height // (8 * v_max))
+
+
+# --- Huffman tables ---
+# A table is (counts, values): counts[i] codes of length i + 1 bits, values the symbols in code order.
+def _huffman_lookup(table) -> list:
+    """16-bit lookup: entry (length << 8) | symbol for every 16-bit window starting with a code, 0 otherwise."""
+    counts, values = table
+    lookup = [0] * 65536
+    code = k = 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            first, span = code << (16 - length), 1 << (16 - length)
+            if first + span > 65536:
+                raise ValueError("Invalid Huffman table.")
+            lookup[first:first + span] = [(length << 8) | values[k]] * span
+            code += 1
+            k += 1
+        code <<= 1
+    return lookup
+
+
+def _huffman_codes(table):
+    """Code and code length of every symbol, as two length-256 arrays (length 0: symbol not in the table)."""
+    counts, values = table
+    codes = np.zeros(256, dtype=np.int64)
+    sizes = np.zeros(256, dtype=np.int64)
+    code = k = 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            codes[values[k]], sizes[values[k]] = code, length
+            code += 1
+            k += 1
+        code <<= 1
+    return codes, sizes
+
+
+def _optimal_table(frequencies):
+    """Length-limited Huffman table for the symbol counts (JPEG Annex K.2), never using the all-ones code."""
+    freq = [int(f) for f in frequencies] + [1]  # Pseudo-symbol 256 takes the all-ones code
+    code_size = [0] * 257
+    others = [-1] * 257
+    while True:
+        c1 = c2 = -1
+        for i, f in enumerate(freq):
+            if f and (c1 < 0 or f <= freq[c1]):
+                c1 = i
+        for i, f in enumerate(freq):
+            if f and i != c1 and (c2 < 0 or f <= freq[c2]):
+                c2 = i
+        if c2 < 0:
+            break
+        freq[c1] += freq[c2]
+        freq[c2] = 0
+        code_size[c1] += 1
+        while others[c1] >= 0:
+            c1 = others[c1]
+            code_size[c1] += 1
+        others[c1] = c2
+        code_size[c2] += 1
+        while others[c2] >= 0:
+            c2 = others[c2]
+            code_size[c2] += 1
+
+    bits = [0] * 33
+    for size in code_size:
+        if size:
+            bits[size] += 1
+    for i in range(32, 16, -1):  # Move codes longer than 16 bits up the tree
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+    i = 16
+    while bits[i] == 0:
+        i -= 1
+    bits[i] -= 1  # Drop the pseudo-symbol
+    values = [s for size in range(1, 33) for s in range(256) if code_size[s] == size]
+    return bytes(bits[1:17]), bytes(values)
+
+
+# --- Reading ---
+def read_jpeg(path: str) -> JpegImage:
+    """Parses the JPEG at `path` and decodes the quantized coefficients of every component."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG file.")
+
+    jpeg = JpegImage()
+    dc_tables, ac_tables = {}, {}
+    coefficients = None  # One array('h') per component, blocks of 64 in zigzag order
+    pos = 2
+    while True:
+        pos = data.find(b"\xff", pos)
+        while 0 <= pos < len(data) - 1 and data[pos + 1] == 0xFF:  # Fill bytes
+            pos += 1
+        if not 0 <= pos < len(data) - 1:
+            break  # Missing EOI: the file ends after the last scan
+        marker = data[pos + 1]
+        pos += 2
+        if marker == EOI:
+            break
+        if marker == SOI or 0xD0 <= marker <= 0xD7:
+            continue
+        length = int.from_bytes(data[pos:pos + 2], 'big')
+        segment = data[pos + 2:pos + length]
+        pos += length
+
+        if marker in _UNSUPPORTED_SOF:
+            raise ValueError(f"Unsupported JPEG: {_UNSUPPORTED_SOF[marker]}.")
+        if marker in (SOF_BASELINE, SOF_EXTENDED, SOF_PROGRESSIVE):
+            coefficients = _read_frame(jpeg, marker, segment)
+        elif marker == DQT:
+            _read_quant_tables(jpeg, segment)
+        elif marker == DHT:
+            i = 0
+            while i < len(segment):
+                table_class, table_id = segment[i] >> 4, segment[i] & 15
+                counts = segment[i + 1:i + 17]
+                values = segment[i + 17:i + 17 + sum(counts)]
+                (ac_tables if table_class else dc_tables)[table_id] = (bytes(counts), bytes(values))
+                i += 17 + sum(counts)
+        elif marker == DRI:
+            jpeg.restart_interval = int.from_bytes(segment[:2], 'big')
+        elif marker == SOS:
+            if coefficients is None:
+                raise ValueError("Scan before frame header.")
+            end = _ENTROPY_END.search(data, pos)
+            end = end.start() if end else len(data)
+            _read_scan(jpeg, coefficients, segment, data[pos:end], dc_tables, ac_tables)
+            pos = end
+        elif marker == DNL:
+            raise ValueError("Unsupported JPEG: DNL marker.")
+        elif 0xE0 <= marker <= 0xEF or marker == COM:
+            jpeg.segments.append((marker, bytes(segment)))
+
+    if coefficients is None:
+        raise ValueError("JPEG has no frame header.")
+    for component, coefs in zip(jpeg.components, coefficients):
+        zigzag_blocks = np.frombuffer(coefs, dtype=np.int16).reshape(component.blocks.shape[:2] + (64,))
+        component.blocks = np.ascontiguousarray(zigzag_blocks[..., _UNZIGZAG]).reshape(component.blocks.shape)
+    return jpeg
+
+
+def _read_quant_tables(jpeg: JpegImage, segment: bytes):
+    i = 0
+    while i < len(segment):
+        precision, table_id = segment[i] >> 4, segment[i] & 15
+        size = 128 if precision else 64
+        values = np.frombuffer(segment[i + 1:i + 1 + size], dtype='>u2' if precision else np.uint8)
+        table = np.zeros(64, dtype=np.uint16)
+        table[ZIGZAG] = values
+        jpeg.quant_tables[table_id] = table.reshape(8, 8)
+        i += 1 + size
+
+
+def _read_frame(jpeg: JpegImage, marker: int, segment: bytes) -> list:
+    if segment[0] != 8:
+        raise ValueError(f"Unsupported JPEG: {segment[0]}-bit samples.")
+    jpeg.frame_marker = marker
+    jpeg.height = int.from_bytes(segment[1:3], 'big')
+    jpeg.width = int.from_bytes(segment[3:5], 'big')
+    if not jpeg.height or not jpeg.width:
+        raise ValueError("Unsupported JPEG: image size given by a DNL marker.")
+    for i in range(segment[5]):
+        component_id, sampling, quant_table = segment[6 + 3 * i:9 + 3 * i]
+        jpeg.components.append(JpegComponent(component_id, sampling >> 4, sampling & 15, quant_table))
+
+    h_max, v_max, mcus_x, mcus_y = jpeg._mcu_grid()
+    coefficients = []
+    for c in jpeg.components:
+        c.block_cols = -(-(-(-jpeg.width * c.h // h_max)) // 8)
+        c.block_rows = -(-(-(-jpeg.height * c.v // v_max)) // 8)
+        rows, cols = mcus_y * c.v, mcus_x * c.h
+        c.blocks = np.zeros((rows, cols, 8, 8), dtype=np.int16)  # Replaced by the decoded blocks
+        coefficients.append(array('h', bytes(rows * cols * 64 * 2)))
+    return coefficients
+
+
+def _scan_blocks(jpeg: JpegImage, component_indexes):
+    """
+    Coding order of a scan's blocks: (component index per block, offset of the block in its component's
+    array, blocks per MCU). An interleaved scan codes whole MCUs; a single-component scan codes only
+    the blocks covering the image, one per MCU.
+    """
+    if len(component_indexes) == 1:
+        c = jpeg.components[component_indexes[0]]
+        cols = c.blocks.shape[1]
+        rows, columns = np.meshgrid(np.arange(c.block_rows), np.arange(c.block_cols), indexing='ij')
+        offsets = (rows * cols + columns).ravel() * 64
+        return np.full(len(offsets), component_indexes[0]), offsets, 1
+
+    _, _, mcus_x, mcus_y = jpeg._mcu_grid()
+    mcu_y, mcu_x = np.meshgrid(np.arange(mcus_y), np.arange(mcus_x), indexing='ij')
+    slots, offsets = [], []
+    for index in component_indexes:
+        c = jpeg.components[index]
+        for by in range(c.v):
+            for bx in range(c.h):
+                rows, columns = mcu_y * c.v + by, mcu_x * c.h + bx
+                slots.append(np.full(rows.size, index))
+                offsets.append((rows * c.blocks.shape[1] + columns).ravel() * 64)
+    if len(slots) > _MAX_MCU_BLOCKS:
+        raise ValueError("Invalid JPEG: too many blocks per MCU.")
+    # Blocks of one MCU are consecutive: MCU-major, then component and position within the MCU
+    return np.stack(slots, axis=1).ravel(), np.stack(offsets, axis=1).ravel(), len(slots)
+
+
+def _read_scan(jpeg, coefficients, header, entropy_data, dc_tables, ac_tables):
+    count = header[0]
+    component_ids = [header[1 + 2 * i] for i in range(count)]
+    selectors = [header[2 + 2 * i] for i in range(count)]
+    ss, se, approximation = header[1 + 2 * count:4 + 2 * count]
+    ah, al = approximation >> 4, approximation & 15
+    by_id = {c.id: i for i, c in enumerate(jpeg.components)}
+    indexes = [by_id[component_id] for component_id in component_ids]
+
+    slots, offsets, blocks_per_mcu = _scan_blocks(jpeg, indexes)
+    dc = {i: dc_tables.get(s >> 4) for i, s in zip(indexes, selectors)}
+    ac = {i: ac_tables.get(s & 15) for i, s in zip(indexes, selectors)}
+    if not jpeg.progressive:
+        jpeg.scans.append((indexes, [(s >> 4, dc[i]) for i, s in zip(indexes, selectors)],
+                           [(s & 15, ac[i]) for i, s in zip(indexes, selectors)]))
+
+    # Pick the decoder for this scan and the lookup tables it needs
+    if not jpeg.progressive or ss == 0 and ah == 0:
+        lookups = {i: _huffman_lookup(dc[i]) for i in indexes}
+        if not jpeg.progressive:
+            ac_lookups = {i: _huffman_lookup(ac[i]) for i in indexes}
+            decode = lambda buf, s, o: _decode_sequential(buf, s, o, coefficients, lookups, ac_lookups)
+        else:
+            decode = lambda buf, s, o: _decode_dc_first(buf, s, o, coefficients, lookups, al)
+    elif ss == 0:
+        decode = lambda buf, s, o: _decode_dc_refine(buf, s, o, coefficients, al)
+    else:
+        if len(indexes) != 1:
+            raise ValueError("Invalid JPEG: interleaved AC scan.")
+        lookup = _huffman_lookup(ac[indexes[0]])
+        coefs = coefficients[indexes[0]]
+        if ah == 0:
+            decode = lambda buf, s, o: _decode_ac_first(buf, o, coefs, lookup, ss, se, al)
+        else:
+            decode = lambda buf, s, o: _decode_ac_refine(buf, o, coefs, lookup, ss, se, al)
+
+    # Each restart interval starts with fresh predictions and a byte-aligned bit stream
+    intervals = _RESTART.split(entropy_data) if jpeg.restart_interval else [entropy_data]
+    per_interval = jpeg.restart_interval * blocks_per_mcu if jpeg.restart_interval else len(offsets)
+    slots, offsets = slots.tolist(), offsets.tolist()
+    for n, first in enumerate(range(0, len(offsets), per_interval or 1)):
+        if n >= len(intervals):
+            raise ValueError("Truncated JPEG scan.")
+        buf = intervals[n].replace(b"\xff\x00", b"\xff") + _READ_PADDING
+        decode(buf, slots[first:first + per_interval], offsets[first:first + per_interval])
+
+
+# The decoders below share one inlined bit reader: `acc` holds the next `nbits` bits of `buf` (from
+# `pos`) in its low bits. Each refill tops it up to at least 24 bits, enough for a 16-bit lookup
+# window or an 11-bit magnitude.
+def _decode_sequential(buf, slots, offsets, coefficients, dc_lookups, ac_lookups):
+    acc = nbits = pos = 0
+    predictions = dict.fromkeys(dc_lookups, 0)
+    for slot, base in zip(slots, offsets):
+        out = coefficients[slot]
+        dc, ac = dc_lookups[slot], ac_lookups[slot]
+
+        if nbits < 16:
+            while nbits < 24:
+                acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                pos += 1
+                nbits += 8
+        e = dc[(acc >> (nbits - 16)) & 0xFFFF]
+        if not e:
+            raise ValueError("Corrupt JPEG data.")
+        nbits -= e >> 8
+        s = e & 255
+        diff = 0
+        if s:
+            if nbits < s:
+                while nbits < 24:
+                    acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                    pos += 1
+                    nbits += 8
+            diff = (acc >> (nbits - s)) & ((1 << s) - 1)
+            nbits -= s
+            if diff < (1 << (s - 1)):
+                diff -= (1 << s) - 1
+        predictions[slot] += diff
+        out[base] = predictions[slot]
+
+        k = 1
+        while k < 64:
+            if nbits < 16:
+                while nbits < 24:
+                    acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                    pos += 1
+                    nbits += 8
+            e = ac[(acc >> (nbits - 16)) & 0xFFFF]
+            if not e:
+                raise ValueError("Corrupt JPEG data.")
+            nbits -= e >> 8
+            rs = e & 255
+            s = rs & 15
+            if s:
+                k += rs >> 4
+                if nbits < s:
+                    while nbits < 24:
+                        acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                        pos += 1
+                        nbits += 8
+                v = (acc >> (nbits - s)) & ((1 << s) - 1)
+                nbits -= s
+                if v < (1 << (s - 1)):
+                    v -= (1 << s) - 1
+                out[base + k] = v
+                k += 1
+            elif rs == 0xF0:
+                k += 16
+            else:
+                break
+
+
+def _decode_dc_first(buf, slots, offsets, coefficients, dc_lookups, al):
+    acc = nbits = pos = 0
+    predictions = dict.fromkeys(dc_lookups, 0)
+    for slot, base in zip(slots, offsets):
+        dc = dc_lookups[slot]
+        if nbits < 16:
+            while nbits < 24:
+                acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                pos += 1
+                nbits += 8
+        e = dc[(acc >> (nbits - 16)) & 0xFFFF]
+        if not e:
+            raise ValueError("Corrupt JPEG data.")
+        nbits -= e >> 8
+        s = e & 255
+        diff = 0
+        if s:
+            if nbits < s:
+                while nbits < 24:
+                    acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                    pos += 1
+                    nbits += 8
+            diff = (acc >> (nbits - s)) & ((1 << s) - 1)
+            nbits -= s
+            if diff < (1 << (s - 1)):
+                diff -= (1 << s) - 1
+        predictions[slot] += diff
+        coefficients[slot][base] = predictions[slot] << al
+
+
+def _decode_dc_refine(buf, slots, offsets, coefficients, al):
+    acc = nbits = pos = 0
+    bit = 1 << al
+    for slot, base in zip(slots, offsets):
+        if not nbits:
+            acc = buf[pos]
+            pos += 1
+            nbits = 8
+        nbits -= 1
+        if (acc >> nbits) & 1:
+            coefficients[slot][base] |= bit
+
+
+def _decode_ac_first(buf, offsets, out, lookup, ss, se, al):
+    acc = nbits = pos = 0
+    eobrun = 0
+    for base in offsets:
+        if eobrun:
+            eobrun -= 1
+            continue
+        k = ss
+        while k <= se:
+            if nbits < 16:
+                while nbits < 24:
+                    acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                    pos += 1
+                    nbits += 8
+            e = lookup[(acc >> (nbits - 16)) & 0xFFFF]
+            if not e:
+                raise ValueError("Corrupt JPEG data.")
+            nbits -= e >> 8
+            rs = e & 255
+            r, s = rs >> 4, rs & 15
+            if s:
+                k += r
+                if nbits < s:
+                    while nbits < 24:
+                        acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                        pos += 1
+                        nbits += 8
+                v = (acc >> (nbits - s)) & ((1 << s) - 1)
+                nbits -= s
+                if v < (1 << (s - 1)):
+                    v -= (1 << s) - 1
+                out[base + k] = v << al
+                k += 1
+            elif r == 15:
+                k += 16
+            else:
+                eobrun = 1 << r
+                if r:
+                    if nbits < r:
+                        while nbits < 24:
+                            acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                            pos += 1
+                            nbits += 8
+                    eobrun += (acc >> (nbits - r)) & ((1 << r) - 1)
+                    nbits -= r
+                eobrun -= 1
+                break
+
+
+def _decode_ac_refine(buf, offsets, out, lookup, ss, se, al):
+    """Successive-approximation AC refinement, following libjpeg's decode_mcu_AC_refine."""
+    acc = nbits = pos = 0
+    p1, m1 = 1 << al, -1 << al
+    eobrun = 0
+    for base in offsets:
+        k = ss
+        if not eobrun:
+            while k <= se:
+                if nbits < 16:
+                    while nbits < 24:
+                        acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                        pos += 1
+                        nbits += 8
+                e = lookup[(acc >> (nbits - 16)) & 0xFFFF]
+                if not e:
+                    raise ValueError("Corrupt JPEG data.")
+                nbits -= e >> 8
+                rs = e & 255
+                r, s = rs >> 4, rs & 15
+                value = 0
+                if s:
+                    if nbits < 1:
+                        acc, pos, nbits = buf[pos], pos + 1, 8
+                    nbits -= 1
+                    value = p1 if (acc >> nbits) & 1 else m1
+                elif r != 15:
+                    eobrun = 1 << r
+                    if r:
+                        if nbits < r:
+                            while nbits < 24:
+                                acc = ((acc & 0xFFFFFF) << 8) | buf[pos]
+                                pos += 1
+                                nbits += 8
+                        eobrun += (acc >> (nbits - r)) & ((1 << r) - 1)
+                        nbits -= r
+                    break
+                # Skip r zero coefficients (refining the nonzero ones passed on the way), then place the new one
+                while k <= se:
+                    coef = out[base + k]
+                    if coef:
+                        if nbits < 1:
+                            acc, pos, nbits = buf[pos], pos + 1, 8
+                        nbits -= 1
+                        if (acc >> nbits) & 1 and not coef & p1:
+                            out[base + k] = coef + (p1 if coef >= 0 else m1)
+                    else:
+                        if r == 0:
+                            break
+                        r -= 1
+                    k += 1
+                if value and k <= se:
+                    out[base + k] = value
+                k += 1
+        if eobrun:
+            # Inside an end-of-band run only the already nonzero coefficients get a correction bit
+            while k <= se:
+                coef = out[base + k]
+                if coef:
+                    if nbits < 1:
+                        acc, pos, nbits = buf[pos], pos + 1, 8
+                    nbits -= 1
+                    if (acc >> nbits) & 1 and not coef & p1:
+                        out[base + k] = coef + (p1 if coef >= 0 else m1)
+                k += 1
+            eobrun -= 1
+
+
+# --- Writing ---
+def write_jpeg(jpeg: JpegImage, path: str):
+    """Writes the coefficients of `jpeg` as a sequential JPEG file."""
+    if jpeg.progressive:
+        # One interleaved scan when the MCU allows it, otherwise one scan per component; optimal tables
+        # shared by all chroma components, as libjpeg assigns them
+        every = list(range(len(jpeg.components)))
+        groups = [every] if len(every) <= 4 and sum(c.h * c.v for c in jpeg.components) <= _MAX_MCU_BLOCKS \
+            else [[i] for i in every]
+        scans = [(group, [(min(i, 1), None) for i in group], [(min(i, 1), None) for i in group]) for group in groups]
+        frame_marker = SOF_EXTENDED if any(t.max() > 255 for t in jpeg.quant_tables.values()) else SOF_BASELINE
+    else:
+        scans = jpeg.scans
+        frame_marker = jpeg.frame_marker
+
+    out = bytearray(b"\xff\xd8")
+    for marker, payload in jpeg.segments:
+        out += _segment(marker, payload)
+    for table_id, table in sorted(jpeg.quant_tables.items()):
+        values = table.ravel()[ZIGZAG]
+        if values.max() > 255:
+            out += _segment(DQT, bytes([0x10 | table_id]) + values.astype('>u2').tobytes())
+        else:
+            out += _segment(DQT, bytes([table_id]) + values.astype(np.uint8).tobytes())
+    frame = bytearray([8]) + jpeg.height.to_bytes(2, 'big') + jpeg.width.to_bytes(2, 'big')
+    frame.append(len(jpeg.components))
+    for c in jpeg.components:
+        frame += bytes([c.id, (c.h << 4) | c.v, c.quant_table])
+    out += _segment(frame_marker, bytes(frame))
+    if jpeg.restart_interval:
+        out += _segment(DRI, jpeg.restart_interval.to_bytes(2, 'big'))
+
+    for indexes, dc_tables, ac_tables in scans:
+        symbols = _scan_symbols(jpeg, indexes)
+        dc_tables = _fit_tables(dc_tables, indexes, symbols, 0)
+        ac_tables = _fit_tables(ac_tables, indexes, symbols, 1)
+        tables = bytearray()
+        for table_class, assigned in ((0, dc_tables), (1, ac_tables)):
+            for table_id, (counts, values) in sorted(dict(assigned).items()):
+                tables += bytes([(table_class << 4) | table_id]) + counts + values
+        out += _segment(DHT, bytes(tables))
+        header = bytearray([len(indexes)])
+        for i, (dc_id, _), (ac_id, _) in zip(indexes, dc_tables, ac_tables):
+            header += bytes([jpeg.components[i].id, (dc_id << 4) | ac_id])
+        out += _segment(SOS, bytes(header) + bytes([0, 63, 0]))
+        out += _encode_scan(jpeg, indexes, symbols, dc_tables, ac_tables)
+    out += b"\xff\xd9"
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + (len(payload) + 2).to_bytes(2, 'big') + payload
+
+
+def _fit_tables(assigned, indexes, symbols, table_class):
+    """
+    Keeps each (id, table) if the table codes every symbol its components use in this scan, otherwise
+    replaces it (and any table that is None) with the optimal table for the symbols of all components sharing the id.
+    """
+    slot_of, values = symbols[0], symbols[1]
+    by_id = {}
+    for position, (table_id, _) in enumerate(assigned):
+        by_id.setdefault(table_id, []).append(position)
+    tables = {}
+    for table_id, positions in by_id.items():
+        used = np.isin(slot_of, [2 * p + table_class for p in positions])
+        frequencies = np.bincount(values[used], minlength=256)
+        table = assigned[positions[0]][1]
+        if table is not None and all(assigned[p][1] == table for p in positions):
+            sizes = _huffman_codes(table)[1]
+            if not np.any((frequencies > 0) & (sizes == 0)):
+                tables[table_id] = table
+                continue
+        tables[table_id] = _optimal_table(frequencies)
+    return [(table_id, tables[table_id]) for table_id, _ in assigned]
+
+
+def _magnitude_category(values):
+    """Bits needed for |values| (the JPEG SSSS category)."""
+    magnitude = np.abs(values.astype(np.int64))
+    category = np.zeros(magnitude.shape, dtype=np.int64)
+    nonzero = magnitude > 0
+    category[nonzero] = np.floor(np.log2(magnitude[nonzero])).astype(np.int64) + 1
+    return category
+
+
+def _scan_symbols(jpeg: JpegImage, indexes):
+    """
+    Symbol stream of a sequential scan, built for all blocks at once. Returns arrays over the symbols:
+    (table slot = 2 * scan position + AC flag, Huffman symbol, extra bits, extra bit count), plus the
+    symbol index where each restart interval starts.
+    """
+    slots, offsets, blocks_per_mcu = _scan_blocks(jpeg, indexes)
+    zigzag = np.empty((len(offsets), 64), dtype=np.int16)
+    position = np.empty(len(offsets), dtype=np.int64)
+    for scan_position, index in enumerate(indexes):
+        mask = slots == index
+        flat = jpeg.components[index].blocks.reshape(-1, 64)
+        zigzag[mask] = flat[offsets[mask] // 64][:, ZIGZAG]
+        position[mask] = scan_position
+    count = len(offsets)
+
+    # DC differences, with the prediction reset at the start of every restart interval
+    per_interval = jpeg.restart_interval * blocks_per_mcu if jpeg.restart_interval else count
+    interval = np.arange(count) // max(per_interval, 1)
+    dc = zigzag[:, 0].astype(np.int64)
+    diff = np.empty(count, dtype=np.int64)
+    for scan_position in range(len(indexes)):
+        own = np.flatnonzero(position == scan_position)
+        previous = np.concatenate(([0], dc[own[:-1]]))
+        restart = np.concatenate(([True], interval[own[1:]] != interval[own[:-1]]))
+        previous[restart] = 0
+        diff[own] = dc[own] - previous
+
+    # AC: every nonzero coefficient is (run of zeros, category) behind ZRL symbols for runs of 16 or more
+    block, k = np.nonzero(zigzag[:, 1:])
+    k = k + 1
+    boundary = block[1:] != block[:-1]
+    first_in_block = np.concatenate(([True], boundary))[:len(block)]
+    run = k - np.where(first_in_block, 0, np.concatenate(([0], k[:-1]))) - 1
+    zrl = run // 16
+    run = run % 16
+    ac_values = zigzag[block, k].astype(np.int64)
+    last_in_block = np.concatenate((boundary, [True]))[:len(block)]
+    last = np.zeros(count, dtype=np.int64)
+    last[block[last_in_block]] = k[last_in_block]
+    eob = last < 63
+
+    # Lay the symbols out block by block: DC, then each coefficient's ZRLs and symbol, then EOB
+    per_entry = zrl + 1
+    entries = np.bincount(block, weights=per_entry, minlength=count).astype(np.int64)
+    per_block = 1 + entries + eob
+    block_start = np.concatenate(([0], np.cumsum(per_block)[:-1]))
+    total = int(per_block.sum())
+    entry_start = np.cumsum(per_entry) - per_entry
+    block_entry_base = np.zeros(count, dtype=np.int64)
+    first_entry = np.flatnonzero(first_in_block)
+    block_entry_base[block[first_entry]] = entry_start[first_entry]
+    entry_position = block_start[block] + 1 + entry_start - block_entry_base[block]
+
+    table = np.empty(total, dtype=np.int64)
+    symbol = np.empty(total, dtype=np.int64)
+    extra = np.zeros(total, dtype=np.int64)
+    extra_bits = np.zeros(total, dtype=np.int64)
+
+    dc_category = _magnitude_category(diff)
+    table[block_start] = 2 * position
+    symbol[block_start] = dc_category
+    extra[block_start] = np.where(diff < 0, diff + (1 << dc_category) - 1, diff)
+    extra_bits[block_start] = dc_category
+
+    zrl_entries = np.flatnonzero(zrl)
+    if len(zrl_entries):
+        zrl_positions = np.repeat(entry_position[zrl_entries], zrl[zrl_entries]) + \
+            (np.arange(zrl[zrl_entries].sum()) - np.repeat(np.cumsum(zrl[zrl_entries]) - zrl[zrl_entries], zrl[zrl_entries]))
+        table[zrl_positions] = 2 * position[np.repeat(block[zrl_entries], zrl[zrl_entries])] + 1
+        symbol[zrl_positions] = 0xF0
+    ac_positions = entry_position + zrl
+    ac_category = _magnitude_category(ac_values)
+    table[ac_positions] = 2 * position[block] + 1
+    symbol[ac_positions] = (run << 4) | ac_category
+    extra[ac_positions] = np.where(ac_values < 0, ac_values + (1 << ac_category) - 1, ac_values)
+    extra_bits[ac_positions] = ac_category
+
+    eob_positions = (block_start + per_block - 1)[eob]
+    table[eob_positions] = 2 * position[eob] + 1
+    symbol[eob_positions] = 0
+
+    interval_starts = block_start[np.arange(0, count, max(per_interval, 1))]
+    return table, symbol, extra, extra_bits, interval_starts
+
+
+def _encode_scan(jpeg: JpegImage, indexes, symbols, dc_tables, ac_tables) -> bytes:
+    """Huffman-codes the symbol stream and returns the byte-stuffed entropy data, with RSTn markers."""
+    table, symbol, extra, extra_bits, interval_starts = symbols
+    codes = np.zeros((2 * len(indexes), 256), dtype=np.int64)
+    sizes = np.zeros((2 * len(indexes), 256), dtype=np.int64)
+    for scan_position in range(len(indexes)):
+        for table_class, assigned in ((0, dc_tables), (1, ac_tables)):
+            codes[2 * scan_position + table_class], sizes[2 * scan_position + table_class] = \
+                _huffman_codes(assigned[scan_position][1])
+    value = (codes[table, symbol] << extra_bits) | extra
+    length = sizes[table, symbol] + extra_bits
+
+    # Each restart interval ends padded with 1-bits to a byte boundary: a pad symbol per interval
+    ends = np.append(interval_starts[1:], len(value))
+    bit_ends = np.cumsum(length)
+    pad = np.empty(len(ends), dtype=np.int64)
+    offset = 0
+    for i, end in enumerate(ends.tolist()):
+        bits = offset + (int(bit_ends[end - 1]) if end else 0)
+        pad[i] = -bits % 8
+        offset += int(pad[i])
+    value = np.insert(value, ends, (1 << pad) - 1)
+    length = np.insert(length, ends, pad)
+
+    # Pack the codes, most significant bit first, into 64-bit words. Codes never overlap, so the parts
+    # landing in one word can simply be summed; a code crossing a word boundary adds its tail to the next word
+    total_bits = int(length.sum())
+    start = np.cumsum(length) - length
+    word = start >> 6
+    end = (start & 63) + length
+    value = value.astype(np.uint64)
+    fits = end <= 64
+    head = np.where(fits, value << (64 - np.minimum(end, 64)).astype(np.uint64),
+                    value >> (np.maximum(end, 64) - 64).astype(np.uint64))
+    words = np.zeros(total_bits // 64 + 2, dtype=np.uint64)
+    first = np.flatnonzero(np.concatenate(([True], word[1:] != word[:-1])))
+    words[word[first]] = np.add.reduceat(head, first) if len(first) else 0
+    crossing = np.flatnonzero(~fits)
+    words[word[crossing] + 1] += value[crossing] << (128 - end[crossing]).astype(np.uint64)
+    packed = words.astype('>u8').tobytes()[:-(-total_bits // 8)]
+
+    # Stuff a zero byte after every 0xFF and put RSTn between intervals
+    interval_bytes = (bit_ends[ends - 1] + np.cumsum(pad)) // 8
+    pieces = []
+    previous = 0
+    for n, end in enumerate(interval_bytes.tolist()):
+        if n:
+            pieces.append(bytes([0xFF, 0xD0 + (n - 1) % 8]))
+        pieces.append(packed[previous:end].replace(b"\xff", b"\xff\x00"))
+        previous = end
+    return b"".join(pieces)
@@ -0,0 +1,108 @@
+# core/mp4_boxes.py — Index of the top-level boxes of an ISO base media (MP4/MOV) file
+#
+# A box starts with a 32-bit size and a 4-byte type. Size 1 means a 64-bit largesize follows the
+# type; size 0 means the box runs to the end of the file; type "uuid" is followed by a 16-byte user
+# type. read_box_index() maps the file and reads only the box headers, so indexing a 20 GB recording
+# touches a handful of pages. Appended boxes are the last entries, which find_last_box() checks first.
+
+import mmap
+import os
+
+BOX_HEADER_SIZE = 8
+LARGE_BOX_HEADER_SIZE = 16
+UUID_SIZE = 16
+MAX_COMPACT_BOX_SIZE = 0xFFFFFFFF
+FREE_BOX = (BOX_HEADER_SIZE).to_bytes(4, 'big') + b'free'  # An empty 8-byte 'free' box
+
+
+class Box:
+    """One top-level box. `size` includes the header; for a size-0 box it is the rest of the file."""
+    __slots__ = ("type", "offset", "header_size", "size", "to_end")
+
+    def __init__(self, box_type: bytes, offset: int, header_size: int, size: int, to_end: bool = False):
+        self.type = box_type
+        self.offset = offset
+        self.header_size = header_size
+        self.size = size
+        self.to_end = to_end
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def data_size(self) -> int:
+        return self.size - self.header_size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+def read_box_index(path) -> list:
+    """
+    The top-level boxes of `path` in file order. Indexing stops at a header that does not fit its
+    own size; a last box that claims more bytes than the file has is cut to the end of the file.
+    """
+    boxes = []
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < BOX_HEADER_SIZE:
+            return boxes
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            offset = 0
+            while offset + BOX_HEADER_SIZE <= file_size:
+                size = int.from_bytes(view[offset:offset + 4], 'big')
+                box_type = view[offset + 4:offset + 8]
+                header_size = BOX_HEADER_SIZE
+                if size == 1:
+                    if offset + LARGE_BOX_HEADER_SIZE > file_size:
+                        break
+                    size = int.from_bytes(view[offset + 8:offset + 16], 'big')
+                    header_size = LARGE_BOX_HEADER_SIZE
+                if box_type == b'uuid':
+                    header_size += UUID_SIZE
+                to_end = size == 0
+                if to_end:
+                    size = file_size - offset
+                if size < header_size or offset + header_size > file_size:
+                    break
+                boxes.append(Box(box_type, offset, header_size, min(size, file_size - offset), to_end))
+                offset += size
+    return boxes
+
+
+def find_last_box(boxes, box_type: bytes):
+    """The last box of type `box_type`, searching from the end of the index, or None."""
+    for box in reversed(boxes):
+        if box.type == box_type:
+            return box
+    return None
+
+
+def pack_box_header(box_type: bytes, data_size: int) -> bytes:
+    """
+    A LARGE_BOX_HEADER_SIZE-byte header for a box holding `data_size` bytes. Small boxes get a 32-bit
+    header behind an empty 'free' box, so a placeholder can be written before the size is known and
+    the data starts at the same offset either way.
+    """
+    if BOX_HEADER_SIZE + data_size <= MAX_COMPACT_BOX_SIZE:
+        return FREE_BOX + (BOX_HEADER_SIZE + data_size).to_bytes(4, 'big') + box_type
+    return (1).to_bytes(4, 'big') + box_type + (LARGE_BOX_HEADER_SIZE + data_size).to_bytes(8, 'big')
+
+
+def close_open_box(f, boxes):
+    """
+    Writes the real size into the header of a size-0 last box (one running to the end of the file),
+    so boxes appended after it stay separate. The box keeps its extent, so the file stays valid whether
+    or not anything is appended. Does nothing when the last box has an explicit size.
+    """
+    if not boxes or not boxes[-1].to_end:
+        return
+    box = boxes[-1]
+    if box.size > MAX_COMPACT_BOX_SIZE:
+        raise ValueError("The carrier's last box runs to the end of the file and is too large to close.")
+    position = f.tell()
+    f.seek(box.offset)
+    f.write(box.size.to_bytes(4, 'big'))
+    f.seek(position)
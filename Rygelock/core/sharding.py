@@ -0,0 +1,141 @@
+# core/sharding.py — Splits one hidden stream across several carriers and puts it back together
+
+import io
+import os
+
+# --- Shard header ---
+# Every shard starts with SHARD_MAGIC + version + set id + shard index + shard count. The set id ties
+# the shards of one embed together; the index gives their order. The envelope's own authentication
+# (see core.stream_envelope) covers the reassembled stream, so shards carry no MAC of their own.
+SHARD_MAGIC = b"RYGS"
+SHARD_VERSION = 1
+SHARD_SET_ID_SIZE = 8
+SHARD_HEADER_SIZE = len(SHARD_MAGIC) + 1 + SHARD_SET_ID_SIZE + 2 + 2
+
+
+def pack_shard_header(set_id: bytes, index: int, count: int) -> bytes:
+    return SHARD_MAGIC + bytes([SHARD_VERSION]) + set_id + index.to_bytes(2, 'big') + count.to_bytes(2, 'big')
+
+
+def is_shard(head: bytes) -> bool:
+    """True if `head` (the first bytes of a carrier's hidden data) is a shard header."""
+    return head[:len(SHARD_MAGIC)] == SHARD_MAGIC
+
+
+def parse_shard_header(head: bytes):
+    """Returns (set id, index, count) from a shard header."""
+    if len(head) < SHARD_HEADER_SIZE or not is_shard(head):
+        raise ValueError("Not a Rygelock shard.")
+    if head[len(SHARD_MAGIC)] != SHARD_VERSION:
+        raise ValueError(f"Unsupported shard version: {head[len(SHARD_MAGIC)]}")
+    offset = len(SHARD_MAGIC) + 1
+    set_id = head[offset:offset + SHARD_SET_ID_SIZE]
+    offset += SHARD_SET_ID_SIZE
+    index = int.from_bytes(head[offset:offset + 2], 'big')
+    count = int.from_bytes(head[offset + 2:offset + 4], 'big')
+    if not 0 <= index < count:
+        raise ValueError("Shard header is corrupted.")
+    return set_id, index, count
+
+
+def plan_shards(frame_count: int, frame_size: int, weights, capacities, head_size: int = 0):
+    """
+    Splits envelope frames 1..frame_count into one contiguous range per carrier, in proportion to
+    `weights` but never past a carrier's capacity in bytes (None = unbounded). Shard 0 also carries
+    `head_size` bytes of envelope header. Returns a list of (first, stop) frame counter ranges.
+    """
+    count = len(weights)
+    limits = []
+    for i, capacity in enumerate(capacities):
+        if capacity is None:
+            limits.append(frame_count)
+        else:
+            room = capacity - SHARD_HEADER_SIZE - (head_size if i == 0 else 0)
+            limits.append(max(0, room // frame_size))
+    if capacities[0] is not None and capacities[0] < SHARD_HEADER_SIZE + head_size:
+        raise ValueError("The first carrier is too small to hold the envelope header.")
+    if any(capacity is not None and capacity < SHARD_HEADER_SIZE for capacity in capacities[1:]):
+        raise ValueError("A carrier is too small to hold its shard header.")
+    if sum(limits) < frame_count:
+        raise ValueError("Payload is too large for the selected carriers.")
+
+    # Water-filling: hand out frames by weight, then pass the overflow of full carriers to the rest
+    counts = [0] * count
+    remaining = frame_count
+    while remaining:
+        open_carriers = [i for i in range(count) if counts[i] < limits[i]]
+        total_weight = sum(weights[i] for i in open_carriers)
+        given = 0
+        for i in open_carriers:
+            share = min(remaining * weights[i] // total_weight, limits[i] - counts[i])
+            counts[i] += share
+            given += share
+        if not given:
+            # Less than one frame per carrier is left; give it to the heaviest carrier with room
+            counts[max(open_carriers, key=lambda i: weights[i])] += 1
+            given = 1
+        remaining -= given
+
+    ranges, first = [], 1
+    for frames in counts:
+        ranges.append((first, first + frames))
+        first += frames
+    return ranges
+
+
+class ConcatReader(io.RawIOBase):
+    """
+    Seekable, read-only view over several seekable streams, each taken from its current position
+    to its end, so reassembled shards read like one continuous hidden stream.
+    """
+    def __init__(self, parts):
+        super().__init__()
+        self._parts = []
+        for part in parts:
+            start = part.tell()
+            self._parts.append((part, start, part.seek(0, os.SEEK_END) - start))
+        self._size = sum(length for _, _, length in self._parts)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        filled, offset = 0, self._position
+        for part, start, length in self._parts:
+            if filled == len(view):
+                break
+            if offset >= length:
+                offset -= length
+                continue
+            part.seek(start + offset)
+            wanted = min(len(view) - filled, length - offset)
+            while wanted:
+                read = part.readinto(view[filled:filled + wanted])
+                if not read:
+                    raise ValueError("Shard is shorter than expected.")
+                filled += read
+                wanted -= read
+            offset = 0
+        self._position += filled
+        return filled
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        for part, _, _ in self._parts:
+            part.close()
+        super().close()
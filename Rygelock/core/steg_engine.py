@@ -1,11 +1,23 @@
+import io
 import os
+import re
 import time
 import hashlib
 import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from core.encryption import encrypt_file, decrypt_file, apply_masking, apply_demasking  # Assuming apply_masking is here
-from core.algorithm import stego_apply, stego_extract, route_extraction_algorithm  # Assuming these handle file I/O or direct bytes
+from core.encryption import derive_master_key, expand_key, encrypt_with_key, decrypt_with_key, \
+    apply_masking_with_key, apply_demasking_with_key, KEY_SIZES
+from core.stream_envelope import ENVELOPE_MAGIC, HEADER_PREFIX_SIZE, STREAM_CHUNK_SIZE, is_stream_envelope, \
+    iter_stream_envelope, open_stream_envelope, skip_stream_envelope, readinto_exact, ChunkedReader, \
+    StreamEnvelopeWriter
+from core.sharding import SHARD_HEADER_SIZE, SHARD_SET_ID_SIZE, pack_shard_header, parse_shard_header, is_shard, \
+    plan_shards, ConcatReader
+from core.job_queue import JobCancelled, check_cancelled
+from core.tracing import span, current_span
+from core.algorithm import stego_apply, stego_extract, route_extraction_algorithm, carrier_capacity  # Assuming these handle file I/O or direct bytes
 from core.deception_mech import prepare_fake_output  # Assuming this is correctly implemented elsewhere
 from core.algorithm_stubs import LSBImageHandler
 from utils.config import get_output_dir  # Assuming this returns a valid directory
@@ -22,6 +34,8 @@ from Crypto.Random import get_random_bytes
 FAKE_TAG = b"d_dm_$&*!@#"
 REAL_TAG = b"g_dlm_$&*!@#*"
 METADATA_PAYLOAD_DELIMITER = b'::RYG_META_END::'
+# re searches buffer-protocol objects directly, so the delimiter is found without copying the block
+_METADATA_DELIMITER_RE = re.compile(re.escape(METADATA_PAYLOAD_DELIMITER))
 
 MATRYOSHKA_SALTS = [
     b'Nyck__L!M~~Ch33__Sh3n9##Dr@g0n!!',
@@ -30,6 +44,12 @@ MATRYOSHKA_SALTS = [
     b'Chr!$T!N3~~L30n9__J!@--Y3@n%%HydrA!!'
 ]
 
+# --- Envelope format versions ---
+# Legacy envelopes have no header (nonce + tag + ciphertext) and run PBKDF2 once per layer.
+# Versioned envelopes start with ENVELOPE_MAGIC + a version byte; v3/v4 live in core.stream_envelope.
+ENVELOPE_V2 = 2  # Password stretched once; every layer key is expanded from that master key
+ENVELOPE_SALT_SIZE = 16
+
 # --- Helper for Multi-Layer Encryption/Masking ---
 def apply_multilayer_encryption(data: bytes, encryption: str, password: str, layers: int, masking: bool = False,
                                 key_data: bytes = None) -> bytes:
@@ -50,58 +70,100 @@ def get_dynamic_header(password: str) -> bytes:
     salt = b'rygelock_dynamic_header_salt_v1'
     return PBKDF2(password.encode('utf-8'), salt, dkLen=8, count=1000)
 
+def is_versioned_envelope(envelope_data: bytes, version: int) -> bool:
+    """True if the envelope starts with the Rygelock magic and the given format version."""
+    magic_len = len(ENVELOPE_MAGIC)
+    return (len(envelope_data) > magic_len and envelope_data[:magic_len] == ENVELOPE_MAGIC
+            and envelope_data[magic_len] == version)
+
+def _file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _verify_key_binding(payload_hash: str, metadata: dict, key: bytes):
+    """Authenticates a generated key file against the SHA-256 of the recovered plaintext."""
+    if metadata.get("generate_key_used"):
+        if not key: raise ValueError("Key file required but not provided.")
+        key_meta = decode_key_metadata(key)
+        if key_meta.get("payload_hash") != payload_hash: raise ValueError("Key does not match payload.")
+
 # --- Embedding Function ---
-def embed_files(config: dict, progress_callback) -> dict:
+def embed_files(config: dict, progress_callback, cancel_event=None) -> dict:
+    """
+    Embeds config["payloads"][0] into the configured carrier(s). `cancel_event` (a threading.Event)
+    is polled between envelope chunks; once set, partial output is removed and the status is "Cancelled".
+    Each stage runs in a core.tracing span under one "embed" span.
+    """
+    with span("embed", carriers=len(config.get("carriers", []))) as embed_span:
+        result = _embed_files(config, progress_callback, cancel_event)
+        embed_span.set(status=result["status"])
+    return result
+
+def _embed_files(config: dict, progress_callback, cancel_event=None) -> dict:
     result = {"status": "Success", "embedded_files": [], "key_generated": False, "errors": []}
-    output_dir = get_output_dir()
+    output_dir = config.get("output_dir") or get_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    temp_output_paths = []
     try:
-        # Helper function to create a secure envelope
-        def create_envelope(payload_data, password, key_data, metadata_dict, is_fake=False):
+        # Helper function returning (encryption, extra layers, masking) for an envelope
+        def envelope_options(is_fake=False):
             encryption_algo = "AES" if is_fake else config["encryption"]
-
-            # 1. Primary Encryption of the payload data
-            encrypted_payload = encrypt_file(payload_data, encryption_algo, password, key_data=key_data)
-
-            # 2. Apply optional extra layers sequentially
-            if not is_fake:
-                extra_layers = config.get("matryoshka_layers", 0)
-                if extra_layers > 0:
-                    print(f"[INFO] Matryoshka enabled. Applying {extra_layers} additional encryption layers.")
-                    master_key = password.encode('utf-8')
-                    for i in range(extra_layers):
-                        layer_salt = MATRYOSHKA_SALTS[i]
-                        layer_key = HKDF(master_key, 32, salt=layer_salt, hashmod=SHA256)
-                        encrypted_payload = encrypt_file(encrypted_payload, encryption_algo, "J0$hu@!ncr3m3nt@l",
-                                                         key_data=layer_key)
-
-                if config.get("masking"):
-                    print("[INFO] Masking enabled.")
-                    encrypted_payload = apply_masking(encrypted_payload, password)
-
-            # 3. Create the pre-encryption block using the final, multi-layered data
-            pre_encryption_block = json.dumps(metadata_dict).encode(
-                'utf-8') + METADATA_PAYLOAD_DELIMITER + encrypted_payload
-
-            # 4. Encrypt the entire block with AES-GCM to create the envelope
-            envelope_master_key = password.encode('utf-8')
-            envelope_salt = key_data if key_data and not is_fake else b'rygelock_default_salt'
-            envelope_key = HKDF(envelope_master_key, 32, salt=envelope_salt, hashmod=SHA256)
-
-            cipher = AES.new(envelope_key, AES.MODE_GCM)
-            encrypted_envelope_data, auth_tag = cipher.encrypt_and_digest(pre_encryption_block)
-
-            return cipher.nonce + auth_tag + encrypted_envelope_data
+            extra_layers = 0 if is_fake else config.get("matryoshka_layers", 0)
+            masking = False if is_fake else config.get("masking", False)
+            if extra_layers > 0:
+                print(f"[INFO] Matryoshka enabled. Applying {extra_layers} additional encryption layers.")
+            if masking:
+                print("[INFO] Masking enabled.")
+            return encryption_algo, extra_layers, masking
+
+        # Helper function to yield a secure envelope piece by piece
+        def envelope_pieces(payload_path, password, key_data, metadata_dict, is_fake=False):
+            encryption_algo, extra_layers, masking = envelope_options(is_fake)
+            with open(payload_path, "rb") as payload_file:
+                yield from iter_stream_envelope(payload_file, password, key_data, metadata_dict, encryption_algo,
+                                                layers=extra_layers, masking=masking)
+
+        def hidden_pieces():
+            # Prepare fake payload if needed
+            if has_decoy:
+                yield FAKE_TAG
+                yield from envelope_pieces(fake_payload_path, config["fake_password"], None, fake_metadata,
+                                           is_fake=True)
+                yield REAL_TAG
+
+            yield from envelope_pieces(real_payload_path, config["password"], real_key_data, real_metadata)
+
+        def counted(pieces):
+            expected_size = max(1, sum(os.path.getsize(p) for p in [real_payload_path] + config.get("fake_payloads", [])[:1]))
+            for piece in pieces:
+                check_cancelled(cancel_event)
+                hidden_size[0] += len(piece)
+                percent = min(99, hidden_size[0] * 100 // expected_size)
+                if percent != hidden_progress[0]:
+                    hidden_progress[0] = percent
+                    progress_callback(percent)
+                yield piece
 
         # --- Main Embedding Logic ---
         real_payload_path = config["payloads"][0]
-        with open(real_payload_path, "rb") as f:
-            real_payload_data = f.read()
+        has_decoy = bool(config.get("fake_payloads") and config.get("fake_password"))
+        if has_decoy:
+            fake_payload_path = config["fake_payloads"][0]
+            fake_metadata = {
+                "original_filename": os.path.basename(fake_payload_path),
+                "encryption_algorithm": "AES"  # Fakes always use AES
+            }
 
         real_key_data = None
         if config.get("generate_key"):
-            payload_hash = hashlib.sha256(real_payload_data).hexdigest()
-            key_meta = {"type": "genuine_key", "payload_hash": payload_hash}
-            real_key_data = encode_key_metadata(key_meta)
+            with span("key_file_generation", os.path.getsize(real_payload_path)):
+                payload_hash = _file_sha256(real_payload_path)
+                key_meta = {"type": "genuine_key", "payload_hash": payload_hash}
+                real_key_data = encode_key_metadata(key_meta)
 
         real_metadata = {
             "original_filename": os.path.basename(real_payload_path),
@@ -111,167 +173,491 @@ def embed_files(config: dict, progress_callback) -> dict:
             "masking_used": config.get("masking", False)
         }
 
-        real_envelope = create_envelope(real_payload_data, config["password"], real_key_data, real_metadata)
-        final_payload_to_embed = real_envelope
-
-        # Prepare fake payload if needed
-        if config.get("fake_payloads") and config.get("fake_password"):
-            fake_payload_path = config["fake_payloads"][0]
-            with open(fake_payload_path, "rb") as f:
-                fake_payload_data = f.read()
-
-            fake_metadata = {
-                "original_filename": os.path.basename(fake_payload_path),
-                "encryption_algorithm": "AES"  # Fakes always use AES
-            }
-            fake_envelope = create_envelope(fake_payload_data, config["fake_password"], None, fake_metadata,
-                                            is_fake=True)
-            final_payload_to_embed = FAKE_TAG + fake_envelope + REAL_TAG + real_envelope
-
-        # 3. EMBED AND SAVE
-        carrier_path = config["carriers"][0]["file"]
-        algorithm = config["carriers"][0]["algorithm"]
+        carriers = config["carriers"]
         temp_output_name = f"stego_temp_{uuid.uuid4().hex[:6]}.tmp"
         temp_output_path = os.path.join(output_dir, temp_output_name)
 
-        hash_before = hashlib.sha256(final_payload_to_embed).hexdigest()
-        print(f"\n[DEBUG EMBED] Size of data to embed: {len(final_payload_to_embed)} bytes")
-        print(f"[DEBUG EMBED] Hash of data BEFORE embedding: {hash_before}\n")
-
-        stego_apply(carrier_path, final_payload_to_embed, algorithm, output_path=temp_output_path)
-
-        if not os.path.exists(temp_output_path):
-            raise FileNotFoundError("Stego file not created by the algorithm.")
-
-        final_output_name = os.path.join(output_dir, os.path.basename(carrier_path))
-        if os.path.exists(final_output_name):
-            base, ext = os.path.splitext(final_output_name)
-            final_output_name = f"{base}_embedded_{uuid.uuid4().hex[:4]}{ext}"
-
-        os.rename(temp_output_path, final_output_name)
-        result["embedded_files"].append(os.path.basename(final_output_name))
+        if len(carriers) > 1:
+            # Sharded mode: the real envelope is split across every carrier and embedded in parallel
+            real_writer = StreamEnvelopeWriter(config["password"], real_key_data, real_metadata,
+                                               *envelope_options())
+            decoy = None
+            if has_decoy:
+                decoy = (StreamEnvelopeWriter(config["fake_password"], None, fake_metadata,
+                                              *envelope_options(is_fake=True)), fake_payload_path)
+            temp_output_paths = _embed_sharded([c["file"] for c in carriers], (real_writer, real_payload_path),
+                                               decoy, temp_output_path, progress_callback, cancel_event)
+        else:
+            carrier_path = carriers[0]["file"]
+            algorithm = carriers[0]["algorithm"]
+
+            # The envelopes are produced chunk by chunk while the handler reads them,
+            # so memory use does not depend on the payload size and nothing is spooled to disk.
+            hidden_size = [0]
+            hidden_progress = [0]
+
+            # 3. EMBED AND SAVE
+            temp_output_paths = [temp_output_path]
+            with span("carrier_embed", algorithm=algorithm) as carrier_span:
+                stego_apply(carrier_path, ChunkedReader(counted(hidden_pieces())), algorithm,
+                            output_path=temp_output_path)
+                carrier_span.add_bytes(hidden_size[0])
+            check_cancelled(cancel_event)  # A handler may have swallowed the cancellation mid-write
+
+            if not os.path.exists(temp_output_path):
+                raise FileNotFoundError("Stego file not created by the algorithm.")
+
+        with span("rename", files=len(temp_output_paths)):
+            for carrier, temp_path in zip(carriers, temp_output_paths):
+                final_output_name = os.path.join(output_dir, os.path.basename(carrier["file"]))
+                if os.path.exists(final_output_name):
+                    base, ext = os.path.splitext(final_output_name)
+                    final_output_name = f"{base}_embedded_{uuid.uuid4().hex[:4]}{ext}"
+
+                os.rename(temp_path, final_output_name)
+                result["embedded_files"].append(os.path.basename(final_output_name))
 
         if config.get("generate_key") and real_key_data:
             key_path = os.path.join(output_dir, "real_key.key")
-            with open(key_path, "wb") as f:
-                f.write(real_key_data)
+            with span("key_file_write", len(real_key_data)):
+                with open(key_path, "wb") as f:
+                    f.write(real_key_data)
             result["key_generated"] = True
 
         progress_callback(100)
 
+    except JobCancelled:
+        result["status"] = "Cancelled"
     except Exception as e:
         result["status"] = "Failed"
         result["errors"].append(str(e))
+    if result["status"] != "Success":
+        # Never leave half-written carriers behind
+        for temp_path in temp_output_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     return result
 
+# --- Sharded Embedding ---
+def _frame_count(payload_size: int, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    return max(1, -(-payload_size // chunk_size))
+
+def _envelope_size(writer: StreamEnvelopeWriter, payload_path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    """Exact size of the stream envelope `writer` will produce for `payload_path`."""
+    payload_size = os.path.getsize(payload_path)
+    frame_count = _frame_count(payload_size, chunk_size)
+    last_chunk = payload_size - (frame_count - 1) * chunk_size
+    return len(writer.head()) + (frame_count - 1) * writer.frame_size(chunk_size) + writer.frame_size(last_chunk)
+
+def _envelope_frames(writer: StreamEnvelopeWriter, payload_path: str, first: int, stop: int,
+                     chunk_size: int = STREAM_CHUNK_SIZE, cancel_event=None):
+    """Yields payload frames first..stop-1 of the envelope for `payload_path`, reading only their chunks."""
+    if first >= stop:
+        return
+    frame_count = _frame_count(os.path.getsize(payload_path), chunk_size)
+    buffer = bytearray(chunk_size)
+    with open(payload_path, "rb") as payload_file:
+        payload_file.seek((first - 1) * chunk_size)
+        for counter in range(first, stop):
+            check_cancelled(cancel_event)
+            with span("payload_read") as read_span:
+                filled = readinto_exact(payload_file, buffer)
+                read_span.add_bytes(filled)
+            yield writer.seal_chunk(counter, memoryview(buffer)[:filled], counter == frame_count)
+
+def _embed_sharded(carrier_paths, real, decoy, temp_output_path: str, progress_callback, cancel_event=None) -> list:
+    """
+    Splits the real envelope across `carrier_paths` at frame boundaries, in proportion to carrier size
+    and within each handler's capacity, and embeds the shards concurrently. Shard 0 also carries the
+    envelope header and the decoy, if any. `real` and `decoy` are (StreamEnvelopeWriter, payload path).
+    Returns the temporary output paths, in carrier order.
+    """
+    real_writer, real_payload_path = real
+    real_head = real_writer.head()
+    head_size = len(real_head)
+    if decoy:
+        head_size += len(FAKE_TAG) + _envelope_size(*decoy) + len(REAL_TAG)
+
+    frame_count = _frame_count(os.path.getsize(real_payload_path))
+    plan = plan_shards(frame_count, real_writer.frame_size(STREAM_CHUNK_SIZE),
+                       weights=[max(1, os.path.getsize(path)) for path in carrier_paths],
+                       capacities=[carrier_capacity(path) for path in carrier_paths], head_size=head_size)
+    set_id = get_random_bytes(SHARD_SET_ID_SIZE)
+    parent_span = current_span()  # Shards embed on pool threads; keep their spans under the caller's
+
+    def shard_pieces(index):
+        yield pack_shard_header(set_id, index, len(plan))
+        if index == 0:
+            if decoy:
+                fake_writer, fake_payload_path = decoy
+                yield FAKE_TAG
+                yield fake_writer.head()
+                yield from _envelope_frames(fake_writer, fake_payload_path, 1,
+                                            _frame_count(os.path.getsize(fake_payload_path)) + 1,
+                                            cancel_event=cancel_event)
+                yield REAL_TAG
+            yield real_head
+        yield from _envelope_frames(real_writer, real_payload_path, *plan[index], cancel_event=cancel_event)
+
+    def counted(pieces, shard_span):
+        for piece in pieces:
+            shard_span.add_bytes(len(piece))
+            yield piece
+
+    def embed_shard(index):
+        shard_output_path = f"{temp_output_path}.{index}"
+        first, stop = plan[index]
+        with span("carrier_embed", parent=parent_span, algorithm="shard", shard=index, frames=stop - first) as shard_span:
+            stego_apply(carrier_paths[index], ChunkedReader(counted(shard_pieces(index), shard_span)), "shard",
+                        output_path=shard_output_path)
+        check_cancelled(cancel_event)
+        if not os.path.exists(shard_output_path):
+            raise FileNotFoundError(f"Stego file not created by the algorithm for {carrier_paths[index]}.")
+        return shard_output_path
+
+    # Sealing and the handlers' file I/O run in C code that releases the GIL, so threads scale with cores
+    shard_output_paths = [None] * len(plan)
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(plan), os.cpu_count() or 1)) as pool:
+            futures = {pool.submit(embed_shard, index): index for index in range(len(plan))}
+            for done, future in enumerate(as_completed(futures), 1):
+                shard_output_paths[futures[future]] = future.result()
+                progress_callback(done * 99 // len(plan))
+    except Exception:
+        for index in range(len(plan)):
+            if os.path.exists(f"{temp_output_path}.{index}"):
+                os.remove(f"{temp_output_path}.{index}")
+        raise
+    return shard_output_paths
+
 # --- Extraction Function ---
-def extract_payload(file_path: str, password: str = None, key_data: bytes = None) -> dict:
+def _open_hidden(file_path: str):
+    """Returns the carrier's hidden data as a seekable stream, or None if there is none."""
+    extraction_fn = route_extraction_algorithm(file_path)
+    if extraction_fn is None:
+        raise ValueError(f"No extraction function found for extension: {file_path}")
+    hidden = extraction_fn(file_path, extract=True, stream=True)
+    if isinstance(hidden, (bytes, bytearray)):
+        hidden = io.BytesIO(hidden)
+    return hidden
+
+def _open_sharded(file_paths):
+    """
+    Opens every carrier of a sharded embed in parallel and chains the shards, ordered by their
+    headers, into one stream positioned at the start of the hidden data.
+    """
+    with ThreadPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as pool:
+        parts = list(pool.map(_open_hidden, file_paths))
     try:
+        shards = {}
+        set_ids = set()
+        for file_path, part in zip(file_paths, parts):
+            head = part.read(SHARD_HEADER_SIZE) if part is not None else b""
+            if not is_shard(head):
+                raise ValueError(f"No Rygelock shard found in {os.path.basename(file_path)}.")
+            set_id, index, count = parse_shard_header(head)
+            set_ids.add(set_id)
+            if index in shards:
+                raise ValueError("Shard set contains duplicate shards.")
+            shards[index] = part
+        if len(set_ids) != 1:
+            raise ValueError("The selected files belong to different sharded embeds.")
+        if sorted(shards) != list(range(count)):
+            raise ValueError(f"Shard set is incomplete: {count - len(shards)} of {count} carriers missing.")
+        return ConcatReader([shards[index] for index in range(count)])
+    except Exception:
+        for part in parts:
+            if part is not None:
+                part.close()
+        raise
+
+def extract_payload(file_path, password: str = None, key_data: bytes = None, output_dir: str = None,
+                    cancel_event=None) -> dict:
+    """
+    Extracts the payload hidden in `file_path`. For a sharded embed, pass every carrier of the set
+    as a list of paths; the shards are opened in parallel and reassembled in order.
+    `cancel_event` (a threading.Event) is polled between stages and between decrypted chunks.
+    Each stage runs in a core.tracing span under one "extract" span.
+    """
+    file_count = len(file_path) if isinstance(file_path, (list, tuple)) else 1
+    with span("extract", files=file_count) as extract_span:
+        result = _extract_payload(file_path, password, key_data, output_dir, cancel_event)
+        extract_span.set(status=result["status"])
+    return result
+
+def _extract_payload(file_path, password: str, key_data: bytes, output_dir: str, cancel_event) -> dict:
+    try:
+        output_dir = output_dir or get_output_dir()
+        os.makedirs(output_dir, exist_ok=True)
         if not password:
             raise ValueError("A password is required for extraction.")
 
-        extraction_fn = route_extraction_algorithm(file_path)
-        hidden_blob = extraction_fn(file_path, extract=True)
-        if not hidden_blob:
-            return {"status": "error", "message": "No hidden Rygelock data found."}
-
-        hash_after = hashlib.sha256(hidden_blob).hexdigest()
-        print(f"\n[DEBUG EXTRACT] Size of data extracted: {len(hidden_blob)} bytes")
-        print(f"[DEBUG EXTRACT] Hash of data AFTER extraction: {hash_after}\n")
-
-        # Helper function to open a secure envelope
-        def open_envelope(envelope_data, pwd, key):
-            # 1. Decrypt the outer envelope (AES-GCM)
-            nonce, auth_tag, encrypted_data = envelope_data[:16], envelope_data[16:32], envelope_data[32:]
-
-            master_key = pwd.encode('utf-8')
-            salt = key if key else b'rygelock_default_salt'
-            decryption_key = HKDF(master_key, 32, salt=salt, hashmod=SHA256)
+        with span("carrier_extract") as carrier_span:
+            if isinstance(file_path, (list, tuple)) and len(file_path) > 1:
+                hidden = _open_sharded(file_path)
+            else:
+                if isinstance(file_path, (list, tuple)):
+                    file_path = file_path[0]
+                hidden = _open_hidden(file_path)
+                head = hidden.read(SHARD_HEADER_SIZE) if hidden is not None else b""
+                if is_shard(head):
+                    hidden.close()
+                    _, index, count = parse_shard_header(head)
+                    return {"status": "error",
+                            "message": f"This file holds shard {index + 1} of {count}. Select all {count} carriers."}
+            if hidden is None:
+                return {"status": "error", "message": "No hidden Rygelock data found."}
+            hidden_size = hidden.seek(0, os.SEEK_END)
+            hidden.seek(0)
+            carrier_span.add_bytes(hidden_size)
+
+        with hidden:
+            check_cancelled(cancel_event)
+            if not hidden_size:
+                return {"status": "error", "message": "No hidden Rygelock data found."}
+
+            is_combined = hidden.read(len(FAKE_TAG)) == FAKE_TAG
+            envelope_start = hidden.tell() if is_combined else 0
+            hidden.seek(envelope_start)
+            is_stream = is_stream_envelope(hidden.read(HEADER_PREFIX_SIZE))
+            hidden.seek(envelope_start)
+
+            if is_stream:
+                return _extract_stream(hidden, is_combined, password, key_data, output_dir, cancel_event)
+
+            # Legacy / v2 envelopes are not chunked and have to be opened in one piece.
+            # Read them into one writable buffer so every layer can decrypt in place.
+            hidden.seek(0)
+            hidden_blob = bytearray(hidden_size)
+            with span("carrier_read", hidden_size):
+                readinto_exact(hidden, hidden_blob)
+            check_cancelled(cancel_event)
+            return _extract_blob(hidden_blob, password, key_data, output_dir)
+
+    except JobCancelled:
+        return {"status": "cancelled", "message": "Extraction cancelled."}
+    except Exception as e:
+        return {"status": "error", "message": f"Extraction failed. Incorrect password or key. Details: {e}"}
 
+def _extract_stream(hidden, is_combined: bool, password: str, key_data: bytes, output_dir: str,
+                    cancel_event=None) -> dict:
+    """Extracts stream (v3/v4) envelopes, decrypting frame by frame straight into the output file."""
+    def write_stream_output(pwd, key):
+        metadata, chunks = open_stream_envelope(hidden, pwd, key)
+        out_path = os.path.join(output_dir, os.path.basename(metadata["original_filename"]))
+        # Only a generated key file binds to the plaintext hash; otherwise nothing needs hashing
+        payload_hash = hashlib.sha256() if metadata.get("generate_key_used") else None
+        try:
+            with open(out_path, "wb") as f:
+                for chunk in chunks:
+                    check_cancelled(cancel_event)
+                    with span("payload_write", len(chunk)):
+                        f.write(chunk)
+                    if payload_hash is not None:
+                        with span("key_binding", len(chunk)):
+                            payload_hash.update(chunk)
+            _verify_key_binding(payload_hash and payload_hash.hexdigest(), metadata, key)
+        except Exception:
+            # Never leave a partially decrypted or unauthenticated file behind
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            raise
+        return {"status": "success", "output_file": out_path, "metadata": metadata}
+
+    if is_combined:
+        # Attempt 1: Try to open the FAKE envelope
+        fake_start = hidden.tell()
+        try:
+            with span("open_envelope", role="decoy"):
+                result = write_stream_output(password, None)
+            print("[INFO] Fake password accepted. Extracting decoy payload.")
+            return result
+        except JobCancelled:
+            raise
+        except Exception:
+            pass
+
+        # Skip over the fake envelope without decrypting it
+        hidden.seek(fake_start)
+        skip_stream_envelope(hidden)
+        if hidden.read(len(REAL_TAG)) != REAL_TAG:
+            return {"status": "error", "message": "Incorrect password or corrupted data."}
+
+    # Attempt 2 (or single payload): Try to open the REAL envelope
+    try:
+        with span("open_envelope", role="real"):
+            result = write_stream_output(password, key_data)
+        if is_combined:
+            print("[INFO] Real password/key accepted. Extracting genuine payload.")
+        return result
+    except JobCancelled:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": f"Incorrect password or key. Details: {e}"}
+
+def _gcm_open(cipher, encrypted_data: memoryview, auth_tag: bytes) -> memoryview:
+    """AES-GCM decrypt_and_verify, in place when the buffer is writable."""
+    if encrypted_data.readonly:
+        return memoryview(cipher.decrypt_and_verify(encrypted_data, auth_tag))
+    cipher.decrypt_and_verify(encrypted_data, auth_tag, output=encrypted_data)
+    return encrypted_data
+
+def _split_metadata(decrypted_block: memoryview):
+    """Splits a decrypted block into (metadata dict, inner payload view) at the delimiter."""
+    match = _METADATA_DELIMITER_RE.search(decrypted_block)
+    if match is None:
+        raise ValueError("Metadata delimiter not found.")
+    metadata = json.loads(bytes(decrypted_block[:match.start()]).decode('utf-8'))
+    return metadata, decrypted_block[match.end():]
+
+def _extract_blob(hidden_blob: bytearray, password: str, key_data: bytes, output_dir: str) -> dict:
+    """
+    Extracts legacy (headerless) and v2 envelopes, which must be decrypted in one piece.
+    Envelopes are addressed as memoryview slices of `hidden_blob` and decrypted in place.
+    """
+    # Helper function to check a generated key file; the payload is only hashed when one was used
+    def verify_key_binding(final_payload, metadata, key):
+        payload_hash = None
+        if metadata.get("generate_key_used"):
+            with span("key_binding", len(final_payload)):
+                payload_hash = hashlib.sha256(final_payload).hexdigest()
+        _verify_key_binding(payload_hash, metadata, key)
+
+    # Helper function to open a secure envelope
+    def open_envelope(envelope_data, pwd, key, role="real"):
+        if is_versioned_envelope(envelope_data, ENVELOPE_V2):
+            with span("open_envelope", role=role, version=ENVELOPE_V2):
+                return open_v2_envelope(envelope_data, pwd, key)
+        with span("open_envelope", role=role, version="legacy"):
+            return open_legacy_envelope(envelope_data, pwd, key)
+
+    # v2: one PBKDF2 run, layer keys expanded from the master key
+    def open_v2_envelope(envelope_data, pwd, key):
+        header_len = len(ENVELOPE_MAGIC) + 1 + ENVELOPE_SALT_SIZE
+        header = bytes(envelope_data[:header_len])
+        salt = header[-ENVELOPE_SALT_SIZE:]
+        nonce = bytes(envelope_data[header_len:header_len + 16])
+        auth_tag = bytes(envelope_data[header_len + 16:header_len + 32])
+        encrypted_data = envelope_data[header_len + 32:]
+
+        # 1. Stretch once, then decrypt the outer envelope (AES-GCM)
+        with span("kdf"):
+            master_key = derive_master_key(pwd, salt, key)
+        with span("gcm_envelope", len(encrypted_data)):
+            cipher = AES.new(expand_key(master_key, "envelope"), AES.MODE_GCM, nonce=nonce)
+            cipher.update(header)
+            decrypted_block = _gcm_open(cipher, encrypted_data, auth_tag)
+
+        # 2. Split the decrypted block into metadata and the inner payload
+        metadata, inner_payload = _split_metadata(decrypted_block)
+
+        encryption_algo = metadata.get("encryption_algorithm", "AES")
+        key_len = KEY_SIZES[encryption_algo]
+
+        # 3. Peel back the optional security layers in reverse order
+        if metadata.get("masking_used"):
+            with span("masking", len(inner_payload)):
+                inner_payload = apply_demasking_with_key(inner_payload, expand_key(master_key, "masking"))
+
+        for i in reversed(range(metadata.get("matryoshka_layers", 0))):
+            with span("matryoshka_layer", len(inner_payload), layer=i):
+                layer_key = expand_key(master_key, f"matryoshka-{i}", key_len)
+                inner_payload = decrypt_with_key(inner_payload, encryption_algo, layer_key)
+
+        with span("primary_cipher", len(inner_payload), algorithm=encryption_algo):
+            final_payload = decrypt_with_key(inner_payload, encryption_algo,
+                                             expand_key(master_key, "primary", key_len))
+
+        # 4. Authenticate the key against the final plaintext payload
+        verify_key_binding(final_payload, metadata, key)
+        return final_payload, metadata
+
+    # Legacy: headerless envelope, one PBKDF2 run per layer
+    def open_legacy_envelope(envelope_data, pwd, key):
+        # 1. Decrypt the outer envelope (AES-GCM)
+        nonce, auth_tag = bytes(envelope_data[:16]), bytes(envelope_data[16:32])
+        encrypted_data = envelope_data[32:]
+
+        master_key = pwd.encode('utf-8')
+        salt = key if key else b'rygelock_default_salt'
+        decryption_key = HKDF(master_key, 32, salt=salt, hashmod=SHA256)
+
+        with span("gcm_envelope", len(encrypted_data)):
             cipher = AES.new(decryption_key, AES.MODE_GCM, nonce=nonce)
-            decrypted_block = cipher.decrypt_and_verify(encrypted_data, auth_tag)
+            decrypted_block = _gcm_open(cipher, encrypted_data, auth_tag)
 
-            # 2. Split the decrypted block into metadata and the inner payload
-            metadata_json, inner_payload = decrypted_block.split(METADATA_PAYLOAD_DELIMITER, 1)
-            metadata = json.loads(metadata_json.decode('utf-8'))
+        # 2. Split the decrypted block into metadata and the inner payload
+        metadata, inner_payload = _split_metadata(decrypted_block)
 
-            encryption_algo = metadata.get("encryption_algorithm", "AES")  # Get the user's original choice
+        encryption_algo = metadata.get("encryption_algorithm", "AES")  # Get the user's original choice
 
-            # 3. Peel back the optional security layers from the inner payload
+        # 3. Peel back the optional security layers from the inner payload
 
-            # Layer 3: Demasking
-            if metadata.get("masking_used"):
+        # Layer 3: Demasking
+        if metadata.get("masking_used"):
+            with span("masking", len(inner_payload)):
                 inner_payload = apply_demasking(inner_payload, pwd)
 
-            # Layer 2: Matryoshka
-            extra_layers = metadata.get("matryoshka_layers", 0)
-            if extra_layers > 0:
-                master_key_matryoshka = pwd.encode('utf-8')
-                # Decrypt in the exact REVERSE order
-                for i in reversed(range(extra_layers)):
-                    layer_salt = MATRYOSHKA_SALTS[i]
-                    layer_key = HKDF(master_key_matryoshka, 32, salt=layer_salt, hashmod=SHA256)
-                    #Use the correct algorithm variable
+        # Layer 2: Matryoshka
+        extra_layers = metadata.get("matryoshka_layers", 0)
+        if extra_layers > 0:
+            master_key_matryoshka = pwd.encode('utf-8')
+            # Decrypt in the exact REVERSE order
+            for i in reversed(range(extra_layers)):
+                layer_salt = MATRYOSHKA_SALTS[i]
+                layer_key = HKDF(master_key_matryoshka, 32, salt=layer_salt, hashmod=SHA256)
+                #Use the correct algorithm variable
+                with span("matryoshka_layer", len(inner_payload), layer=i):
                     inner_payload = decrypt_file(inner_payload, "J0$hu@!ncr3m3nt@l", encryption_algo,
                                                  key_data=layer_key)
 
 
-            # Layer 1: Final, Primary Decryption
+        # Layer 1: Final, Primary Decryption (legacy envelopes run their own PBKDF2 here)
+        with span("primary_cipher", len(inner_payload), algorithm=encryption_algo):
             final_payload = decrypt_file(inner_payload, pwd, encryption_algo, key_data=key)
 
-            # 4. Authenticate the key against the final plaintext payload
-            if metadata.get("generate_key_used"):
-                if not key: raise ValueError("Key file required but not provided.")
-                key_meta = decode_key_metadata(key)
-                stored_hash = key_meta.get("payload_hash")
-                current_hash = hashlib.sha256(final_payload).hexdigest()
-                if stored_hash != current_hash: raise ValueError("Key does not match payload.")
-
-            return final_payload, metadata
-
-        # --- Main Extraction Logic ---
-        is_combined = FAKE_TAG in hidden_blob and REAL_TAG in hidden_blob
-        if is_combined:
-            _, parts = hidden_blob.split(FAKE_TAG, 1)
-            fake_envelope, real_envelope = parts.split(REAL_TAG, 1)
-
-            # Attempt 1: Try to open the FAKE envelope
-            try:
-                decrypted_data, metadata = open_envelope(fake_envelope, password, None)
-                print("[INFO] Fake password accepted. Extracting decoy payload.")
-                output_dir = get_output_dir()
-                out_path = os.path.join(output_dir, metadata["original_filename"])
-                with open(out_path, "wb") as f:
-                    f.write(decrypted_data)
-                return {"status": "success", "output_file": out_path, "metadata": metadata}
-            except Exception:
-                pass
-
-            # Attempt 2: Try to open the REAL envelope
-            try:
-                decrypted_data, metadata = open_envelope(real_envelope, password, key_data)
-                print("[INFO] Real password/key accepted. Extracting genuine payload.")
-                output_dir = get_output_dir()
-                out_path = os.path.join(output_dir, metadata["original_filename"])
-                with open(out_path, "wb") as f:
-                    f.write(decrypted_data)
-                return {"status": "success", "output_file": out_path, "metadata": metadata}
-            except Exception as e:
-                return {"status": "error", "message": f"Incorrect password or key. Details: {e}"}
-
-        else:  # It's a single, real payload
-            try:
-                decrypted_data, metadata = open_envelope(hidden_blob, password, key_data)
-                output_dir = get_output_dir()
-                out_path = os.path.join(output_dir, metadata["original_filename"])
-                with open(out_path, "wb") as f:
-                    f.write(decrypted_data)
-                return {"status": "success", "output_file": out_path, "metadata": metadata}
-            except Exception as e:
-                return {"status": "error", "message": f"Incorrect password or key. Details: {e}"}
-
-        return {"status": "error", "message": "Incorrect password or corrupted data."}
-
-    except Exception as e:
-        return {"status": "error", "message": f"Extraction failed. Incorrect password or key. Details: {e}"}
-
+        # 4. Authenticate the key against the final plaintext payload
+        verify_key_binding(final_payload, metadata, key)
+        return final_payload, metadata
+
+    # --- Main Extraction Logic ---
+    blob_view = memoryview(hidden_blob)
+    fake_pos = hidden_blob.find(FAKE_TAG)
+    real_pos = hidden_blob.find(REAL_TAG, fake_pos + len(FAKE_TAG)) if fake_pos >= 0 else -1
+    is_combined = real_pos >= 0
+    if is_combined:
+        # The two envelopes are disjoint slices, so decrypting one in place never touches the other
+        fake_envelope = blob_view[fake_pos + len(FAKE_TAG):real_pos]
+        real_envelope = blob_view[real_pos + len(REAL_TAG):]
+
+        # Attempt 1: Try to open the FAKE envelope
+        try:
+            decrypted_data, metadata = open_envelope(fake_envelope, password, None, role="decoy")
+            print("[INFO] Fake password accepted. Extracting decoy payload.")
+            out_path = os.path.join(output_dir, metadata["original_filename"])
+            with span("payload_write", len(decrypted_data)), open(out_path, "wb") as f:
+                f.write(decrypted_data)
+            return {"status": "success", "output_file": out_path, "metadata": metadata}
+        except Exception:
+            pass
+
+        # Attempt 2: Try to open the REAL envelope
+        try:
+            decrypted_data, metadata = open_envelope(real_envelope, password, key_data)
+            print("[INFO] Real password/key accepted. Extracting genuine payload.")
+            out_path = os.path.join(output_dir, metadata["original_filename"])
+            with span("payload_write", len(decrypted_data)), open(out_path, "wb") as f:
+                f.write(decrypted_data)
+            return {"status": "success", "output_file": out_path, "metadata": metadata}
+        except Exception as e:
+            return {"status": "error", "message": f"Incorrect password or key. Details: {e}"}
+
+    else:  # It's a single, real payload
+        try:
+            decrypted_data, metadata = open_envelope(blob_view, password, key_data)
+            out_path = os.path.join(output_dir, metadata["original_filename"])
+            with span("payload_write", len(decrypted_data)), open(out_path, "wb") as f:
+                f.write(decrypted_data)
+            return {"status": "success", "output_file": out_path, "metadata": metadata}
+        except Exception as e:
+            return {"status": "error", "message": f"Incorrect password or key. Details: {e}"}
@@ -0,0 +1,290 @@
+# core/stream_envelope.py — Chunked AES-GCM envelope (STREAM construction) for constant-memory embed/extract
+
+import hmac
+import io
+import json
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from core.encryption import derive_master_key, expand_key, encrypt_with_key, decrypt_with_key, \
+    apply_masking_with_key, apply_demasking_with_key, KEY_SIZES
+from core.tracing import span
+
+# --- Envelope header ---
+# Versioned envelopes start with ENVELOPE_MAGIC + a version byte (see core.steg_engine for v2).
+ENVELOPE_MAGIC = b"RYGE"
+ENVELOPE_V3 = 3  # Chunked: metadata frame + payload frames, each sealed on its own
+ENVELOPE_V4 = 4  # v3 + key-check value, so a wrong password/key is rejected from the header alone
+STREAM_VERSIONS = (ENVELOPE_V3, ENVELOPE_V4)
+SALT_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+KEY_CHECK_SIZE = 16
+TAG_SIZE = 16
+HEADER_PREFIX_SIZE = len(ENVELOPE_MAGIC) + 1
+HEADER_SIZES = {
+    ENVELOPE_V3: HEADER_PREFIX_SIZE + SALT_SIZE + NONCE_PREFIX_SIZE,
+    ENVELOPE_V4: HEADER_PREFIX_SIZE + SALT_SIZE + NONCE_PREFIX_SIZE + KEY_CHECK_SIZE,
+}
+
+# --- Framing ---
+# Every frame is: 4-byte big-endian length (top bit marks the final frame) + ciphertext + GCM tag.
+# The GCM nonce is nonce_prefix + 4-byte frame counter + final-frame byte, so frames cannot be
+# reordered, dropped or truncated without failing authentication.
+STREAM_CHUNK_SIZE = 1024 * 1024
+MAX_FRAME_SIZE = 64 * 1024 * 1024  # Sanity bound before allocating a frame buffer
+LAST_FRAME_FLAG = 0x80000000
+
+
+class ChunkedReader(io.RawIOBase):
+    """
+    Read-only file-like view over an iterator of byte chunks, such as iter_stream_envelope().
+    Chunks are produced lazily as the consumer reads, so the whole stream never exists at once.
+    """
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks)).cast('B')
+            except StopIteration:
+                return 0
+        size = min(len(view), len(self._pending))
+        view[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def is_stream_envelope(head: bytes) -> bool:
+    """True if `head` (the first bytes of an envelope) carries a stream (v3/v4) header."""
+    magic_len = len(ENVELOPE_MAGIC)
+    return len(head) > magic_len and head[:magic_len] == ENVELOPE_MAGIC and head[magic_len] in STREAM_VERSIONS
+
+
+def _key_check_value(master_key: bytes) -> bytes:
+    """Short key commitment stored in the v4 header; it reveals nothing beyond a PBKDF2-gated password check."""
+    return expand_key(master_key, "key-check", KEY_CHECK_SIZE)
+
+
+class _LayerStack:
+    """
+    Per-chunk primary encryption, Matryoshka layers and masking, all keyed from one master key.
+    Each chunk is sealed independently so no layer needs more than one chunk in memory.
+    """
+    def __init__(self, master_key, encryption_algo, layers=0, masking=False):
+        key_len = KEY_SIZES[encryption_algo]
+        self.encryption_algo = encryption_algo
+        self.primary_key = expand_key(master_key, "primary", key_len)
+        self.layer_keys = [expand_key(master_key, f"matryoshka-{i}", key_len) for i in range(layers)]
+        self.masking_key = expand_key(master_key, "masking") if masking else None
+
+    def seal(self, chunk):
+        with span("primary_cipher", len(chunk), algorithm=self.encryption_algo):
+            data = encrypt_with_key(chunk, self.encryption_algo, self.primary_key)
+        for i, layer_key in enumerate(self.layer_keys):
+            with span("matryoshka_layer", len(data), layer=i):
+                data = encrypt_with_key(data, self.encryption_algo, layer_key)
+        if self.masking_key:
+            with span("masking", len(data)):
+                data = apply_masking_with_key(data, self.masking_key)
+        return data
+
+    def open(self, data):
+        # `data` is a writable frame buffer, so every layer below decrypts in place
+        if self.masking_key:
+            with span("masking", len(data)):
+                data = apply_demasking_with_key(data, self.masking_key)
+        for i in reversed(range(len(self.layer_keys))):
+            with span("matryoshka_layer", len(data), layer=i):
+                data = decrypt_with_key(data, self.encryption_algo, self.layer_keys[i])
+        with span("primary_cipher", len(data), algorithm=self.encryption_algo):
+            return decrypt_with_key(data, self.encryption_algo, self.primary_key)
+
+
+def _frame_nonce(nonce_prefix: bytes, counter: int, last: bool) -> bytes:
+    return nonce_prefix + counter.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+
+def _seal_frame(key, header, nonce_prefix, counter, data, last) -> bytearray:
+    # Length, ciphertext and tag are written straight into one preallocated frame buffer
+    size = len(data)
+    with span("gcm_envelope", size, frame=counter):
+        frame = bytearray(4 + size + TAG_SIZE)
+        view = memoryview(frame)
+        view[:4] = (size | (LAST_FRAME_FLAG if last else 0)).to_bytes(4, 'big')
+        cipher = AES.new(key, AES.MODE_GCM, nonce=_frame_nonce(nonce_prefix, counter, last))
+        cipher.update(header)
+        cipher.encrypt(data, output=view[4:4 + size])
+        view[4 + size:] = cipher.digest()
+    return frame
+
+
+def readinto_exact(src, buffer) -> int:
+    """
+    Fills `buffer` from the readable `src` with readinto(), looping over short reads.
+    Returns the number of bytes read, which is less than len(buffer) only at end of stream.
+    """
+    view = memoryview(buffer).cast('B')
+    filled = 0
+    while filled < len(view):
+        read = src.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    return filled
+
+
+def _read_exact(src, size: int) -> bytes:
+    data = src.read(size)
+    if data is None or len(data) != size:
+        raise ValueError("Envelope is truncated or corrupted.")
+    return data
+
+
+def _read_header(src):
+    """Reads a stream header. Returns (header bytes, version, salt, nonce prefix, key-check value or None)."""
+    prefix = _read_exact(src, HEADER_PREFIX_SIZE)
+    if not is_stream_envelope(prefix):
+        raise ValueError("Not a Rygelock stream envelope.")
+    version = prefix[-1]
+    header = prefix + _read_exact(src, HEADER_SIZES[version] - HEADER_PREFIX_SIZE)
+    salt = header[HEADER_PREFIX_SIZE:HEADER_PREFIX_SIZE + SALT_SIZE]
+    nonce_prefix = header[HEADER_PREFIX_SIZE + SALT_SIZE:HEADER_PREFIX_SIZE + SALT_SIZE + NONCE_PREFIX_SIZE]
+    key_check = header[-KEY_CHECK_SIZE:] if version >= ENVELOPE_V4 else None
+    return header, version, salt, nonce_prefix, key_check
+
+
+def _read_frame_length(src):
+    raw = int.from_bytes(_read_exact(src, 4), 'big')
+    length, last = raw & ~LAST_FRAME_FLAG, bool(raw & LAST_FRAME_FLAG)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError("Envelope frame exceeds the maximum frame size.")
+    return length, last
+
+
+def _open_frame(src, key, header, nonce_prefix, counter):
+    """Reads one frame into a fresh buffer and decrypts it in place. Returns (memoryview, last)."""
+    length, last = _read_frame_length(src)
+    frame = bytearray(length + TAG_SIZE)
+    with span("carrier_read", len(frame), frame=counter):
+        if readinto_exact(src, frame) != len(frame):
+            raise ValueError("Envelope is truncated or corrupted.")
+    view = memoryview(frame)
+    ciphertext, tag = view[:length], bytes(view[length:])
+    with span("gcm_envelope", length, frame=counter):
+        cipher = AES.new(key, AES.MODE_GCM, nonce=_frame_nonce(nonce_prefix, counter, last))
+        cipher.update(header)
+        cipher.decrypt_and_verify(ciphertext, tag, output=ciphertext)
+    return ciphertext, last
+
+
+class StreamEnvelopeWriter:
+    """
+    Seals a v4 envelope: head() gives the header and metadata frame, seal_chunk() one payload frame.
+    Frames only depend on their counter, so they can be sealed out of order or from several threads.
+    """
+    def __init__(self, password: str, key_data: bytes, metadata: dict, encryption_algo: str,
+                 layers: int = 0, masking: bool = False):
+        salt = get_random_bytes(SALT_SIZE)
+        with span("kdf"):
+            master_key = derive_master_key(password, salt, key_data)  # The only PBKDF2 run
+        self.nonce_prefix = get_random_bytes(NONCE_PREFIX_SIZE)
+        self.header = ENVELOPE_MAGIC + bytes([ENVELOPE_V4]) + salt + self.nonce_prefix + _key_check_value(master_key)
+        self._envelope_key = expand_key(master_key, "envelope")
+        self._stack = _LayerStack(master_key, encryption_algo, layers, masking)
+        self._metadata_json = json.dumps(metadata).encode('utf-8')
+        self._frame_sizes = {}
+
+    def head(self) -> bytes:
+        return self.header + _seal_frame(self._envelope_key, self.header, self.nonce_prefix, 0,
+                                         self._metadata_json, False)
+
+    def seal_chunk(self, counter: int, chunk, last: bool) -> bytearray:
+        """Seals payload chunk number `counter` (1-based) as one frame."""
+        return _seal_frame(self._envelope_key, self.header, self.nonce_prefix, counter, self._stack.seal(chunk), last)
+
+    def frame_size(self, chunk_size: int) -> int:
+        """Exact size of the frame sealed from a `chunk_size`-byte chunk (every layer has a fixed overhead)."""
+        if chunk_size not in self._frame_sizes:
+            self._frame_sizes[chunk_size] = 4 + len(self._stack.seal(bytes(chunk_size))) + TAG_SIZE
+        return self._frame_sizes[chunk_size]
+
+
+def iter_stream_envelope(payload_file, password: str, key_data: bytes, metadata: dict, encryption_algo: str,
+                         layers: int = 0, masking: bool = False, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yields a v4 envelope piece by piece: the header, a metadata frame, then one frame per
+    `chunk_size` bytes read from `payload_file`. Payload chunks are read with readinto() into
+    two reused buffers, so memory use is bounded by a couple of chunks.
+    """
+    writer = StreamEnvelopeWriter(password, key_data, metadata, encryption_algo, layers, masking)
+    yield writer.head()
+
+    # Read one chunk ahead so the final frame can be flagged as such (an empty payload gives one empty frame)
+    buffers = (bytearray(chunk_size), bytearray(chunk_size))
+    counter = 1
+    with span("payload_read") as read_span:
+        filled = readinto_exact(payload_file, buffers[0])
+        read_span.add_bytes(filled)
+    while True:
+        next_filled = 0
+        if filled == chunk_size:
+            with span("payload_read") as read_span:
+                next_filled = readinto_exact(payload_file, buffers[counter % 2])
+                read_span.add_bytes(next_filled)
+        last = not next_filled
+        chunk = memoryview(buffers[(counter - 1) % 2])[:filled]
+        yield writer.seal_chunk(counter, chunk, last)
+        if last:
+            break
+        filled = next_filled
+        counter += 1
+
+
+def open_stream_envelope(src, password: str, key_data: bytes = None):
+    """
+    Reads the header and metadata frame of a stream envelope from the readable `src`.
+    Returns (metadata, chunks) where `chunks` lazily yields the decrypted payload.
+    Raises ValueError on a wrong password/key or corrupted data; for v4 envelopes a wrong
+    password/key is rejected from the header alone, before any frame is read.
+    """
+    header, version, salt, nonce_prefix, key_check = _read_header(src)
+
+    with span("kdf"):
+        master_key = derive_master_key(password, salt, key_data)
+    if key_check is not None and not hmac.compare_digest(_key_check_value(master_key), key_check):
+        raise ValueError("Incorrect password or key.")
+    envelope_key = expand_key(master_key, "envelope")
+    metadata_json, last = _open_frame(src, envelope_key, header, nonce_prefix, 0)
+    if last:
+        raise ValueError("Envelope has no payload frames.")
+    metadata = json.loads(bytes(metadata_json).decode('utf-8'))
+
+    stack = _LayerStack(master_key, metadata.get("encryption_algorithm", "AES"),
+                        metadata.get("matryoshka_layers", 0), metadata.get("masking_used", False))
+
+    def chunks():
+        counter = 1
+        while True:
+            data, last = _open_frame(src, envelope_key, header, nonce_prefix, counter)
+            yield stack.open(data)
+            if last:
+                return
+            counter += 1
+
+    return metadata, chunks()
+
+
+def skip_stream_envelope(src):
+    """Moves `src` past a stream envelope using only the frame lengths (no keys, no decryption)."""
+    _read_header(src)
+    while True:
+        length, last = _read_frame_length(src)
+        src.seek(length + TAG_SIZE, 1)
+        if last:
+            return
@@ -0,0 +1,204 @@
+# core/tracing.py — Stage-level timing spans for the embed and extract pipelines
+#
+# Engine stages are wrapped in `with span("stage", nbytes=n):`. Spans are only built while at least
+# one subscriber is registered; otherwise span() returns a shared no-op object, so instrumentation
+# left in the hot path costs one list check per stage.
+#
+# Never yield from inside a span in a generator: the span stack is per thread, and a suspended
+# generator would leave its span open on whatever code resumes it.
+
+import itertools
+import json
+import os
+import threading
+import time
+
+TRACE_FORMATS = ("jsonl", "chrome")
+
+_subscribers = []
+_ids = itertools.count(1)
+_local = threading.local()
+# perf_counter has no epoch, so it is anchored to the wall clock once at import
+_ORIGIN_NS = time.perf_counter_ns()
+_ORIGIN_WALL = time.time()
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span:
+    """One timed stage. `bytes` counts the data the stage processed; `attrs` holds extra context."""
+    __slots__ = ("id", "parent_id", "name", "thread_id", "thread_name", "start_ns", "end_ns", "bytes", "attrs")
+
+    def __init__(self, name: str, nbytes: int = 0, parent_id: int = None, attrs: dict = None):
+        self.id = next(_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.start_ns = self.end_ns = None
+        self.bytes = nbytes
+        self.attrs = attrs or {}
+
+    def add_bytes(self, count: int):
+        self.bytes += count
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        if self.parent_id is None and stack:
+            self.parent_id = stack[-1].id
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            stack.remove(self)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        for callback in list(_subscribers):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[Tracing] Subscriber failed: {e}")
+        return False
+
+    @property
+    def duration_s(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        start_us = (self.start_ns - _ORIGIN_NS) / 1000
+        return {
+            "id": self.id, "parent": self.parent_id, "name": self.name,
+            "thread": self.thread_name, "start": round(_ORIGIN_WALL + start_us / 1e6, 6),
+            "start_us": round(start_us, 1), "duration_us": round((self.end_ns - self.start_ns) / 1000, 1),
+            "bytes": self.bytes, **self.attrs,
+        }
+
+
+class _NullSpan:
+    """Stand-in returned by span() when nobody is listening."""
+    __slots__ = ()
+    id = None
+
+    def add_bytes(self, count: int):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, nbytes: int = 0, parent=None, **attrs):
+    """
+    Context manager timing one stage. `nbytes` is the amount of data the stage handles (add more
+    with add_bytes()). Spans nest under the innermost open span of the same thread; pass `parent`
+    (a span from current_span()) to attach work running on another thread.
+    """
+    if not _subscribers:
+        return _NULL_SPAN
+    return Span(name, nbytes, getattr(parent, "id", None), attrs)
+
+
+def current_span():
+    """The innermost open span on this thread, or None."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def add_subscriber(callback):
+    """Registers `callback(span)`, called from the finishing thread whenever a span closes."""
+    _subscribers.append(callback)
+
+
+def remove_subscriber(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+# --- Recording and Export ---
+class SpanRecorder:
+    """
+    Subscriber that keeps every finished span. Use it as a context manager to record one run:
+
+        with SpanRecorder() as recorder:
+            embed_files(config, progress_callback)
+        recorder.write("embed.trace.json", "chrome")
+    """
+    def __init__(self):
+        self.spans = []
+
+    def __call__(self, finished: Span):
+        self.spans.append(finished)  # list.append is atomic, so worker threads need no lock
+
+    def __enter__(self):
+        add_subscriber(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        remove_subscriber(self)
+        return False
+
+    def summary(self) -> dict:
+        """Totals per stage name: {"count", "total_s", "bytes"}."""
+        totals = {}
+        for s in self.spans:
+            entry = totals.setdefault(s.name, {"count": 0, "total_s": 0.0, "bytes": 0})
+            entry["count"] += 1
+            entry["total_s"] += s.duration_s
+            entry["bytes"] += s.bytes
+        return totals
+
+    def write_jsonl(self, path: str):
+        """One JSON object per span, in the order the spans finished."""
+        with open(path, "w", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps(s.to_dict(), default=str) + "\n")
+
+    def write_chrome_trace(self, path: str):
+        """Chrome trace event format, for chrome://tracing or https://ui.perfetto.dev."""
+        pid = os.getpid()
+        events = []
+        thread_names = {}
+        for s in self.spans:
+            thread_names[s.thread_id] = s.thread_name
+            events.append({
+                "name": s.name, "cat": "rygelock", "ph": "X", "pid": pid, "tid": s.thread_id,
+                "ts": (s.start_ns - _ORIGIN_NS) / 1000, "dur": (s.end_ns - s.start_ns) / 1000,
+                "args": {"bytes": s.bytes, **s.attrs},
+            })
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def write(self, path: str, fmt: str = None):
+        """Writes the trace as `fmt` ("jsonl" or "chrome"); by default .jsonl files get JSON lines."""
+        fmt = fmt or ("jsonl" if path.endswith(".jsonl") else "chrome")
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {fmt}")
+        if fmt == "jsonl":
+            self.write_jsonl(path)
+        else:
+            self.write_chrome_trace(path)
@@ -3,12 +3,20 @@
 
 import sys
 import os
-from PyQt5.QtWidgets import QApplication
-from ui.main_window import MainWindow
-from core.style_sheet import glass_style
-from utils.resource_path import resource_path #delete
+
+# Subcommands that run headless through cli.py, without importing the GUI stack (PyQt5/pygame)
+HEADLESS_COMMANDS = ("embed", "extract", "batch")
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in HEADLESS_COMMANDS:
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from PyQt5.QtWidgets import QApplication
+    from ui.main_window import MainWindow
+    from core.style_sheet import glass_style
+    from utils.resource_path import resource_path #delete
+
     app = QApplication(sys.argv)
 
     app.setStyleSheet(glass_style)
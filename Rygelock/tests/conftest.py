@@ -0,0 +1,9 @@
+# tests/conftest.py — Makes the application packages (core, utils, ui) importable from the tests
+#
+# The application runs from the Rygelock directory (python rygel.py / cli.py), so its modules import
+# each other as top-level packages; the tests do the same.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+# tests/test_advanced_image_steg.py — Length-header LSB embedding, legacy delimiter images and capacity
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import core.algorithm_stubs as stubs
+from core.algorithm_stubs import (ADVANCED_LSB_DELIMITER, ADVANCED_LSB_HEADER_BITS, _advanced_lsb_capacity,
+                                  advanced_image_steg)
+
+
+def _carrier(tmp_path, shape=(40, 30, 3), mode=None):
+    pixels = np.random.default_rng(0).integers(0, 256, shape).astype(np.uint8)
+    path = tmp_path / "carrier.png"
+    Image.fromarray(pixels, mode).save(path)
+    return path, pixels
+
+
+def test_capacity_is_three_bits_per_pixel_less_header(tmp_path):
+    carrier, _ = _carrier(tmp_path)
+    assert advanced_image_steg.max_payload is _advanced_lsb_capacity
+    assert _advanced_lsb_capacity(str(carrier)) == (40 * 30 * 3 - ADVANCED_LSB_HEADER_BITS) // 8
+
+
+@pytest.mark.parametrize("size", [0, 1, 123, "capacity"])
+def test_roundtrip(tmp_path, size):
+    carrier, pixels = _carrier(tmp_path)
+    if size == "capacity":
+        size = _advanced_lsb_capacity(str(carrier))
+    payload = np.random.default_rng(1).integers(0, 256, size, dtype=np.uint8).tobytes()
+    output = advanced_image_steg(str(carrier), payload=payload, output_path=str(tmp_path / "out.png"))
+    assert output is not None
+    assert advanced_image_steg(output, extract=True) == payload
+    stego = np.array(Image.open(output))
+    assert np.array_equal(stego >> 1, pixels >> 1)  # Only LSBs change
+
+
+def test_payload_over_capacity_is_rejected(tmp_path):
+    carrier, _ = _carrier(tmp_path)
+    payload = bytes(_advanced_lsb_capacity(str(carrier)) + 1)
+    assert advanced_image_steg(str(carrier), payload=payload, output_path=str(tmp_path / "out.png")) is None
+
+
+def test_rgba_carrier_is_embedded_in_rgb(tmp_path):
+    carrier, _ = _carrier(tmp_path, (20, 20, 4), "RGBA")
+    output = advanced_image_steg(str(carrier), payload=b"alpha", output_path=str(tmp_path / "out.png"))
+    assert advanced_image_steg(output, extract=True) == b"alpha"
+
+
+@pytest.mark.parametrize("scan_bits", [stubs.ADVANCED_LSB_SCAN_BITS, 64, 8])  # Delimiter split across scan steps
+def test_legacy_delimiter_images_still_extract(tmp_path, monkeypatch, scan_bits):
+    """Images from before the length header: payload bits then the delimiter, from the first LSB on."""
+    monkeypatch.setattr(stubs, "ADVANCED_LSB_SCAN_BITS", scan_bits)
+    _, pixels = _carrier(tmp_path, (300, 300, 3))
+    payload = b"written by an older release" * 40
+    bits = np.unpackbits(np.frombuffer(payload + ADVANCED_LSB_DELIMITER, dtype=np.uint8))
+    flat = pixels.reshape(-1)
+    flat[:len(bits)] = (flat[:len(bits)] & 0xFE) | bits
+    legacy = tmp_path / "legacy.png"
+    Image.fromarray(pixels).save(legacy)
+    assert advanced_image_steg(str(legacy), extract=True) == payload
+
+
+def test_image_without_payload_extracts_nothing(tmp_path):
+    carrier, _ = _carrier(tmp_path)
+    assert advanced_image_steg(str(carrier), extract=True) == b""
@@ -0,0 +1,114 @@
+# tests/test_carrier_output.py — Carrier cloning, in-place appends and rewrites for container handlers
+
+import errno
+import os
+import stat
+
+import pytest
+
+import core.carrier_output as carrier_output_module
+from core.carrier_output import (carrier_output, carrier_rewrite, clone_file, copy_file_region,
+                                 output_target)
+
+
+@pytest.fixture
+def carrier(tmp_path):
+    path = tmp_path / "carrier.bin"
+    path.write_bytes(os.urandom(3 * carrier_output_module.CLONE_CHUNK + 12345))
+    os.chmod(path, 0o640)
+    return path
+
+
+def _unsupported(*args):
+    raise OSError(errno.EXDEV, "cross-device")
+
+
+def test_clone_copies_data_and_mode(carrier, tmp_path):
+    target = tmp_path / "clone.bin"
+    method = clone_file(str(carrier), str(target))
+    assert method in ("reflink", "copy_file_range", "sendfile", "copy")
+    assert target.read_bytes() == carrier.read_bytes()
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o640
+
+
+def test_clone_falls_back_to_chunked_copy(carrier, tmp_path, monkeypatch):
+    monkeypatch.setattr(carrier_output_module, "fcntl", None)
+    monkeypatch.setattr(carrier_output_module, "_copy_file_range", _unsupported)
+    monkeypatch.setattr(carrier_output_module, "_sendfile", _unsupported)
+    target = tmp_path / "clone.bin"
+    assert clone_file(str(carrier), str(target)) == "copy"
+    assert target.read_bytes() == carrier.read_bytes()
+
+
+def test_copy_file_region_appends_at_current_position(carrier, tmp_path):
+    data = carrier.read_bytes()
+    target = tmp_path / "region.bin"
+    with open(carrier, "rb") as f_in, open(target, "wb") as f_out:
+        f_out.write(b"head")
+        copy_file_region(f_in, f_out, 1000, 2 * carrier_output_module.CLONE_CHUNK)
+        f_out.write(b"tail")
+    assert target.read_bytes() == b"head" + data[1000:1000 + 2 * carrier_output_module.CLONE_CHUNK] + b"tail"
+
+
+def test_output_is_a_clone_and_the_carrier_is_untouched(carrier, tmp_path):
+    original = carrier.read_bytes()
+    target = tmp_path / "out.bin"
+    with carrier_output(str(carrier), str(target)) as f_out:
+        assert f_out.tell() == len(original)
+        f_out.write(b"appended")
+    assert target.read_bytes() == original + b"appended"
+    assert carrier.read_bytes() == original
+
+
+def test_failed_append_removes_the_clone(carrier, tmp_path):
+    target = tmp_path / "out.bin"
+    with pytest.raises(RuntimeError):
+        with carrier_output(str(carrier), str(target)) as f_out:
+            f_out.write(b"partial")
+            raise RuntimeError("handler failed")
+    assert not target.exists()
+
+
+def test_failed_in_place_append_is_truncated(carrier):
+    original = carrier.read_bytes()
+    with pytest.raises(RuntimeError):
+        with carrier_output(str(carrier), in_place=True) as f_out:
+            f_out.write(b"partial")
+            raise RuntimeError("handler failed")
+    assert carrier.read_bytes() == original
+
+
+def test_in_place_rewrite_replaces_the_carrier_only_on_success(carrier, tmp_path):
+    with pytest.raises(RuntimeError):
+        with carrier_rewrite(str(carrier), in_place=True) as f_out:
+            f_out.write(b"half written")
+            raise RuntimeError("handler failed")
+    assert len(carrier.read_bytes()) > len(b"half written")
+    assert sorted(os.listdir(tmp_path)) == ["carrier.bin"]  # The temporary file is gone
+
+    with carrier_rewrite(str(carrier), in_place=True) as f_out:
+        f_out.write(b"rewritten")
+    assert carrier.read_bytes() == b"rewritten"
+    assert stat.S_IMODE(os.stat(carrier).st_mode) == 0o640
+
+
+def test_target_validation(carrier, tmp_path):
+    with pytest.raises(ValueError):
+        output_target(str(carrier), str(carrier))  # Would overwrite the carrier without in_place
+    with pytest.raises(ValueError):
+        output_target(str(carrier), str(tmp_path / "other.bin"), in_place=True)
+    with pytest.raises(ValueError):
+        output_target(str(carrier))
+    assert output_target(str(carrier), in_place=True) == str(carrier)
+
+
+def test_append_handlers_clone_or_append_in_place(carrier, tmp_path):
+    from core.algorithm_stubs import image_steg, synch_steg
+
+    original = carrier.read_bytes()
+    output = image_steg(str(carrier), payload=b"payload", output_path=str(tmp_path / "out.png"))
+    assert image_steg(output, extract=True) == b"payload"
+    assert carrier.read_bytes() == original
+
+    assert synch_steg(str(carrier), payload=b"payload", in_place=True) == str(carrier)
+    assert carrier.read_bytes() == original + b"payload\0"
@@ -0,0 +1,40 @@
+# tests/test_cost_selection.py — Shared top-k selection and parity writes used by the cost-based embedders
+
+import numpy as np
+import pytest
+
+from core.algorithm_stubs import _select_cheapest, _write_parity
+
+
+@pytest.mark.parametrize("count", [0, 1, 17, 500, 999, 1000, 1500])
+def test_selection_matches_stable_argsort(count):
+    rng = np.random.default_rng(count)
+    costs = rng.integers(0, 20, 1000).astype(np.float32)  # Many ties
+    costs[rng.integers(0, 1000, 50)] = np.inf
+    expected = np.argsort(costs, kind='stable')[:count]
+    assert np.array_equal(_select_cheapest(costs, count), expected)
+
+
+def test_selection_of_2d_costs_uses_flat_indices():
+    costs = np.array([[3.0, 1.0], [1.0, 0.5]])
+    assert np.array_equal(_select_cheapest(costs, 3), [3, 1, 2])
+
+
+def test_write_parity_sets_only_the_indexed_lsbs():
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, 200).astype(np.uint8)
+    original = pixels.copy()
+    indices = rng.choice(200, 64, replace=False)
+    bits = rng.integers(0, 2, 64).astype(np.uint8)
+    _write_parity(pixels, indices, bits)
+    assert np.array_equal(pixels[indices] & 1, bits)
+    assert np.array_equal(pixels[indices] >> 1, original[indices] >> 1)
+    untouched = np.setdiff1d(np.arange(200), indices)
+    assert np.array_equal(pixels[untouched], original[untouched])
+
+
+def test_write_parity_writes_through_strided_views():
+    pixels = np.zeros((4, 6), dtype=np.uint8)
+    _write_parity(pixels[:, 0], np.array([0, 2]), np.array([1, 1], dtype=np.uint8))
+    assert pixels[:, 0].tolist() == [1, 0, 1, 0]
+    assert not pixels[:, 1:].any()
@@ -0,0 +1,76 @@
+# tests/test_hugo_costs.py — _hugo_costs against the per-pixel HUGO formula it replaced
+
+import math
+
+import numpy as np
+import pytest
+
+import core.algorithm_stubs as stubs
+
+
+def reference_hugo_costs(img_np, gamma=1.0, sigma=1.0):
+    """The original run_hugo cost loop: one eval_direction call per pixel and direction."""
+    padded = np.pad(img_np.astype(np.int32), pad_width=3, mode='reflect')
+    rows, cols = img_np.shape
+    costs = np.zeros((rows, cols, 3), dtype=np.float32)  # [decrease, unchanged, increase]
+
+    def eval_cost(k, l, m):
+        return (sigma + math.sqrt(k*k + l*l + m*m)) ** -gamma
+
+    def eval_direction(r, c, dr, dc):
+        p = [padded[r + dr*k, c + dc*k] for k in range(-3, 4)]
+        d = [p[i+1] - p[i] for i in range(6)]
+        pixel_costs = np.zeros(3)
+
+        pixel_costs[0] += eval_cost(d[0], d[1], d[2]-1) + eval_cost(d[1], d[2]-1, d[3]+1)
+        pixel_costs[2] += eval_cost(d[0], d[1], d[2]+1) + eval_cost(d[1], d[2]+1, d[3]-1)
+
+        pixel_costs[0] += eval_cost(d[2]-1, d[3]+1, d[4]) + eval_cost(d[3]+1, d[4], d[5])
+        pixel_costs[2] += eval_cost(d[2]+1, d[3]-1, d[4]) + eval_cost(d[3]-1, d[4], d[5])
+
+        return pixel_costs
+
+    for r in range(rows):
+        for c in range(cols):
+            r_p, c_p = r + 3, c + 3
+            total = eval_direction(r_p, c_p, -1, 1) + eval_direction(r_p, c_p, 0, 1) + \
+                    eval_direction(r_p, c_p, 1, 1) + eval_direction(r_p, c_p, 1, 0)
+            if img_np[r, c] == 255:
+                total[2] = np.inf
+            if img_np[r, c] == 0:
+                total[0] = np.inf
+            costs[r, c] = [total[0], 0, total[2]]
+    return costs[:, :, 0], costs[:, :, 2]
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    noisy = rng.integers(0, 256, (37, 29)).astype(np.int32)
+    noisy[:6, :6] = 255
+    noisy[-5:, -7:] = 0
+    noisy[12:20, 8:24] = 128
+    return {
+        "random": noisy,
+        "flat": np.full((24, 31), 97, dtype=np.int32),
+        "saturated": np.where(rng.random((26, 21)) < 0.5, 0, 255).astype(np.int32),
+    }
+
+
+@pytest.mark.parametrize("name", sorted(_images()))
+@pytest.mark.parametrize("gamma, sigma", [(1.0, 1.0), (1.5, 0.5), (0.7, 2.0)])
+def test_matches_reference_across_band_seams(monkeypatch, name, gamma, sigma):
+    img = _images()[name]
+    # Bands of 5 rows (fewer than the image height), so several band seams are crossed
+    monkeypatch.setattr(stubs, "HUGO_BAND_PIXELS", img.shape[1] * 5)
+    decrease, increase = stubs._hugo_costs(img, gamma, sigma)
+    expected_decrease, expected_increase = reference_hugo_costs(img, gamma, sigma)
+    assert np.array_equal(decrease, expected_decrease)
+    assert np.array_equal(increase, expected_increase)
+
+
+def test_band_size_does_not_change_costs(monkeypatch):
+    img = _images()["random"]
+    whole = stubs._hugo_costs(img)
+    monkeypatch.setattr(stubs, "HUGO_BAND_PIXELS", 1)  # One row per band
+    for full, banded in zip(whole, stubs._hugo_costs(img)):
+        assert np.array_equal(full, banded)
@@ -0,0 +1,228 @@
+# tests/test_job_queue.py — JobScheduler states, ordering, bounded concurrency, cancellation and shutdown
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.algorithm import stego_apply
+from core.job_queue import JOB_CANCELLED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobCancelled, \
+    JobScheduler, check_cancelled
+from core.steg_engine import embed_files
+from core.stream_envelope import STREAM_CHUNK_SIZE, ChunkedReader
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(max_workers=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _wait(job):
+    deadline = time.monotonic() + TIMEOUT
+    while not job.finished:
+        assert time.monotonic() < deadline, f"job #{job.id} still {job.state}"
+        time.sleep(0.01)
+    return job
+
+
+def _blocker(started, release):
+    """A job function that reports it started, then waits until released."""
+    def run(job):
+        started.release()
+        assert release.wait(TIMEOUT)
+        return {"status": "success"}
+    return run
+
+
+# --- States ---
+
+@pytest.mark.parametrize("result, state", [
+    ({"status": "Success"}, JOB_SUCCEEDED),
+    ({"status": "success"}, JOB_SUCCEEDED),
+    ({"status": "Failed", "errors": ["bad"]}, JOB_FAILED),
+    ({"status": "error", "message": "bad"}, JOB_FAILED),
+    ({"status": "cancelled"}, JOB_CANCELLED),
+    (None, JOB_FAILED),
+])
+def test_state_follows_the_result_status(scheduler, result, state):
+    job = _wait(scheduler.submit("embed", "label", lambda job: result))
+    assert job.state == state and job.result == result
+    assert job.started_at <= job.finished_at
+    assert job.progress == (100 if state == JOB_SUCCEEDED else 0)
+
+
+def test_exceptions_fail_the_job(scheduler):
+    def boom(job):
+        raise RuntimeError("handler crashed")
+    job = _wait(scheduler.submit("extract", "label", boom))
+    assert job.state == JOB_FAILED and job.error == "handler crashed"
+
+
+def test_listeners_see_every_change_and_cannot_break_the_job(scheduler):
+    seen = []
+    scheduler.add_listener(lambda job: seen.append((job.state, job.progress)))
+    scheduler.add_listener(lambda job: 1 / 0)
+
+    def run(job):
+        scheduler._set_progress(job, 40)
+        return {"status": "success"}
+    _wait(scheduler.submit("embed", "label", run))
+    assert seen == [(JOB_QUEUED, 0), (JOB_RUNNING, 0), (JOB_RUNNING, 40), (JOB_SUCCEEDED, 100)]
+
+
+# --- Ordering and concurrency ---
+
+def test_jobs_start_in_submission_order():
+    scheduler = JobScheduler(max_workers=1)
+    order = []
+    jobs = [scheduler.submit("embed", str(i), lambda job, i=i: order.append(i) or {"status": "success"})
+            for i in range(8)]
+    for job in jobs:
+        _wait(job)
+    scheduler.shutdown()
+    assert order == list(range(8))
+    assert [job.id for job in jobs] == sorted(job.id for job in jobs)
+    assert [job.id for job in scheduler.jobs()] == [job.id for job in jobs]
+
+
+def test_at_most_max_workers_jobs_run_at_once(scheduler):
+    started, release = threading.Semaphore(0), threading.Event()
+    jobs = [scheduler.submit("embed", str(i), _blocker(started, release)) for i in range(5)]
+    for _ in range(scheduler.max_workers):
+        assert started.acquire(timeout=TIMEOUT)
+    time.sleep(0.1)  # Give a third job the chance to start, if the bound were broken
+    assert [job.state for job in jobs].count(JOB_RUNNING) == scheduler.max_workers
+    assert [job.state for job in jobs].count(JOB_QUEUED) == 3
+
+    release.set()
+    assert all(_wait(job).state == JOB_SUCCEEDED for job in jobs)
+
+
+# --- Cancellation ---
+
+def test_cancelling_a_queued_job_skips_it(scheduler):
+    started, release = threading.Semaphore(0), threading.Event()
+    running = [scheduler.submit("embed", str(i), _blocker(started, release)) for i in range(2)]
+    ran = []
+    queued = scheduler.submit("embed", "queued", lambda job: ran.append(job) or {"status": "success"})
+
+    assert scheduler.cancel(queued.id)
+    assert queued.state == JOB_CANCELLED and queued.finished_at is not None
+    release.set()
+    for job in running:
+        _wait(job)
+    scheduler.shutdown()
+    assert ran == [] and queued.started_at is None
+
+
+def test_cancelling_a_running_job_stops_it_at_the_next_checkpoint(scheduler):
+    checkpoint = threading.Event()
+
+    def run(job):
+        checkpoint.set()
+        while True:
+            check_cancelled(job.cancel_event)
+            time.sleep(0.005)
+    job = scheduler.submit("embed", "label", run)
+    assert checkpoint.wait(TIMEOUT)
+    assert scheduler.cancel(job.id)
+    assert _wait(job).state == JOB_CANCELLED
+
+
+def test_cancel_ignores_finished_and_unknown_jobs(scheduler):
+    job = _wait(scheduler.submit("embed", "label", lambda job: {"status": "success"}))
+    assert not scheduler.cancel(job.id)
+    assert not scheduler.cancel(12345)
+    assert job.state == JOB_SUCCEEDED
+
+
+def _png(path):
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (16, 16, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("extension", ["png", "webp"])  # Streaming handler; buffered handler fed by _drain
+def test_stego_apply_propagates_cancellation(tmp_path, extension):
+    # Handlers log and swallow their own errors; the cancellation must still reach the caller
+    cancel_event = threading.Event()
+    carrier = str(tmp_path / f"carrier.{extension}")
+    Image.open(_png(tmp_path / "carrier.png")).save(carrier)
+
+    def pieces():
+        yield b"first chunk"
+        cancel_event.set()
+        check_cancelled(cancel_event)
+        yield b"never written"
+    with pytest.raises(JobCancelled):
+        stego_apply(carrier, ChunkedReader(pieces()), extension, str(tmp_path / f"out.{extension}"))
+
+
+def _embed_config(tmp_path, size):
+    payload_path = tmp_path / "secret.bin"
+    payload_path.write_bytes(os.urandom(size))
+    return {"carriers": [{"file": _png(tmp_path / "carrier.png"), "algorithm": "auto"}],
+            "payloads": [str(payload_path)], "encryption": "AES", "password": "pw",
+            "output_dir": str(tmp_path / "out")}
+
+
+def test_cancelled_embed_leaves_no_output(tmp_path):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    result = embed_files(_embed_config(tmp_path, 1000), lambda _: None, cancel_event=cancel_event)
+    assert result["status"] == "Cancelled"
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_scheduled_embed_cancelled_mid_write(scheduler, tmp_path):
+    # Cancel from the first progress report, while the handler is still consuming the envelope
+    def cancel_on_progress(job):
+        if job.state == JOB_RUNNING and job.progress:
+            scheduler.cancel(job.id)
+    scheduler.add_listener(cancel_on_progress)
+    job = _wait(scheduler.submit_embed(_embed_config(tmp_path, 4 * STREAM_CHUNK_SIZE)))
+    assert job.state == JOB_CANCELLED
+    assert job.result["status"] == "Cancelled"
+    assert os.listdir(tmp_path / "out") == []
+
+
+# --- Housekeeping ---
+
+def test_clear_finished_keeps_active_jobs_and_notifies(scheduler):
+    cleared = []
+    scheduler.add_clear_listener(lambda: cleared.append(True))
+    started, release = threading.Semaphore(0), threading.Event()
+    done = _wait(scheduler.submit("embed", "done", lambda job: {"status": "success"}))
+    active = scheduler.submit("embed", "active", _blocker(started, release))
+    assert started.acquire(timeout=TIMEOUT)
+
+    scheduler.clear_finished()
+    assert cleared == [True]
+    assert scheduler.jobs() == [active] and scheduler.get(done.id) is None
+    release.set()
+    _wait(active)
+
+
+def test_shutdown_cancels_pending_work_and_waits():
+    scheduler = JobScheduler(max_workers=1)
+    started = threading.Event()
+
+    def run(job):
+        started.set()
+        while True:
+            check_cancelled(job.cancel_event)
+            time.sleep(0.005)
+    running = scheduler.submit("embed", "running", run)
+    queued = scheduler.submit("embed", "queued", lambda job: {"status": "success"})
+    assert started.wait(TIMEOUT)
+
+    scheduler.shutdown()
+    assert running.state == queued.state == JOB_CANCELLED
+    with pytest.raises(RuntimeError):
+        scheduler.submit("embed", "late", lambda job: {"status": "success"})
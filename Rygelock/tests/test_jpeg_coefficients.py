@@ -0,0 +1,75 @@
+# tests/test_jpeg_coefficients.py — Coefficient-domain JPEG read/write and the new_jpeg_steg capacity
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.algorithm_stubs import JPEG_STEG_LENGTH_BITS, _jpeg_steg_capacity, new_jpeg_steg
+from core.jpeg_coefficients import read_jpeg, write_jpeg
+
+SAVE_OPTIONS = {
+    "420": dict(quality=90),
+    "444": dict(quality=85, subsampling=0),
+    "422": dict(quality=75, subsampling=1),
+    "progressive": dict(quality=90, progressive=True),
+    "optimized": dict(quality=80, optimize=True),
+    "restart": dict(quality=90, restart_marker_blocks=3),
+    "progressive_restart": dict(quality=90, restart_marker_rows=1, progressive=True),
+}
+
+
+def _save_jpeg(path, shape, color=True, **options):
+    rng = np.random.default_rng(sum(shape))
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    base = 120 + 60 * np.sin(x / 17) * np.cos(y / 23) + rng.normal(0, 12, shape)
+    if color:
+        base = np.stack([base, base * 0.7 + 30, 255 - base], -1)
+    Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(path, "JPEG", **options)
+    return str(path)
+
+
+@pytest.mark.parametrize("name", sorted(SAVE_OPTIONS))
+@pytest.mark.parametrize("shape, color", [((61, 75), True), ((64, 64), False), ((7, 5), True)])
+def test_write_back_is_lossless(tmp_path, name, shape, color):
+    """Coefficients written back decode to the same coefficients and the same pixels."""
+    carrier = _save_jpeg(tmp_path / "carrier.jpg", shape, color, **SAVE_OPTIONS[name])
+    jpeg = read_jpeg(carrier)
+    output = str(tmp_path / "out.jpg")
+    write_jpeg(jpeg, output)
+
+    rewritten = read_jpeg(output)
+    assert len(rewritten.components) == len(jpeg.components)
+    for original, copy in zip(jpeg.components, rewritten.components):
+        assert np.array_equal(original.blocks, copy.blocks)
+    assert np.array_equal(np.array(Image.open(carrier)), np.array(Image.open(output)))
+
+
+def test_changed_coefficients_survive_write(tmp_path):
+    carrier = _save_jpeg(tmp_path / "carrier.jpg", (48, 40), quality=90)
+    jpeg = read_jpeg(carrier)
+    blocks = jpeg.components[0].visible_blocks
+    blocks[..., 3, 4] = 37  # A value no Huffman table of the file was built for
+    output = str(tmp_path / "out.jpg")
+    write_jpeg(jpeg, output)
+    assert (read_jpeg(output).components[0].visible_blocks[..., 3, 4] == 37).all()
+
+
+def test_unsupported_files_raise(tmp_path):
+    path = tmp_path / "not.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xc9" + bytes(32))  # Arithmetic-coded SOF
+    with pytest.raises(ValueError):
+        read_jpeg(str(path))
+
+
+def test_capacity_counts_eligible_luminance_coefficients(tmp_path):
+    carrier = _save_jpeg(tmp_path / "carrier.jpg", (61, 75), quality=90)
+    coeffs = read_jpeg(carrier).components[0].visible_blocks
+    eligible = np.count_nonzero((coeffs != 0) & (coeffs != 1))
+    capacity = _jpeg_steg_capacity(carrier)
+    assert new_jpeg_steg.max_payload is _jpeg_steg_capacity
+    assert capacity == (eligible - JPEG_STEG_LENGTH_BITS) // 8
+
+    payload = bytes(range(256)) * (capacity // 256) + bytes(capacity % 256)
+    output = new_jpeg_steg(carrier, payload=payload, output_path=str(tmp_path / "full.jpg"))
+    assert new_jpeg_steg(output, extract=True) == payload
+    assert new_jpeg_steg(carrier, payload=payload + b"x", output_path=str(tmp_path / "over.jpg")) is None
@@ -0,0 +1,41 @@
+# tests/test_jpeg_steg.py — JSteg rule and length-prefixed embedding of new_jpeg_steg
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.algorithm_stubs import _jsteg_eligible, _write_parity, new_jpeg_steg
+
+
+def _save_jpeg(path, shape, **options):
+    rng = np.random.default_rng(sum(shape))
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    base = 120 + 60 * np.sin(x / 17) * np.cos(y / 23) + rng.normal(0, 12, shape)
+    Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(path, "JPEG", **options)
+    return str(path)
+
+
+def test_lsb_replacement_keeps_the_eligible_set():
+    """A coefficient outside {0, 1} never becomes 0 or 1, so the extractor finds the same positions."""
+    coeffs = np.random.default_rng(0).integers(-40, 40, 5000).astype(np.int16)
+    eligible = _jsteg_eligible(coeffs)
+    assert not np.isin(coeffs[eligible], (0, 1)).any()
+    bits = np.random.default_rng(1).integers(0, 2, len(eligible)).astype(np.uint8)
+    _write_parity(coeffs, eligible, bits)
+    assert np.array_equal(_jsteg_eligible(coeffs), eligible)
+    assert np.array_equal(coeffs[eligible] & 1, bits)
+
+
+@pytest.mark.parametrize("shape", [(64, 64), (61, 75), (130, 257)])  # Partial edge blocks included
+def test_roundtrip(tmp_path, shape):
+    carrier = _save_jpeg(tmp_path / "carrier.jpg", shape, quality=90)
+    payload = b"coefficient domain" * 3
+    output = new_jpeg_steg(carrier, payload=payload, output_path=str(tmp_path / "out.jpg"))
+    assert output is not None
+    assert new_jpeg_steg(output, extract=True) == payload
+    assert Image.open(output).size == Image.open(carrier).size
+
+
+def test_payload_over_capacity_is_rejected(tmp_path):
+    carrier = _save_jpeg(tmp_path / "carrier.jpg", (16, 16), quality=50)
+    assert new_jpeg_steg(carrier, payload=bytes(4096), output_path=str(tmp_path / "out.jpg")) is None
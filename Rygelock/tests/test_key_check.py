@@ -0,0 +1,88 @@
+# tests/test_key_check.py — Wrong passwords rejected from the v4 key-check value; v3 envelopes without one still open
+
+import io
+import json
+
+import pytest
+from Crypto.Random import get_random_bytes
+
+import core.stream_envelope as stream_envelope
+from core.encryption import derive_master_key, expand_key
+from core.stream_envelope import ENVELOPE_MAGIC, ENVELOPE_V3, ENVELOPE_V4, HEADER_SIZES, KEY_CHECK_SIZE, \
+    NONCE_PREFIX_SIZE, SALT_SIZE, _LayerStack, _seal_frame, iter_stream_envelope, open_stream_envelope
+
+METADATA = {"original_filename": "secret.bin", "encryption_algorithm": "AES"}
+PAYLOAD = b"key-check payload " * 500
+
+
+def _v4_envelope(password="pw", key_data=None):
+    return b"".join(bytes(piece) for piece in iter_stream_envelope(io.BytesIO(PAYLOAD), password, key_data, METADATA,
+                                                                   "AES", chunk_size=4096))
+
+
+def _v3_envelope(password="pw", chunk_size=4096):
+    """A v3 envelope as written before the key-check value: the v4 framing without the trailing header field."""
+    salt, nonce_prefix = get_random_bytes(SALT_SIZE), get_random_bytes(NONCE_PREFIX_SIZE)
+    master_key = derive_master_key(password, salt)
+    header = ENVELOPE_MAGIC + bytes([ENVELOPE_V3]) + salt + nonce_prefix
+    envelope_key = expand_key(master_key, "envelope")
+    stack = _LayerStack(master_key, "AES")
+    pieces = [header, _seal_frame(envelope_key, header, nonce_prefix, 0, json.dumps(METADATA).encode('utf-8'), False)]
+    chunks = [PAYLOAD[i:i + chunk_size] for i in range(0, len(PAYLOAD), chunk_size)]
+    for counter, chunk in enumerate(chunks, 1):
+        pieces.append(_seal_frame(envelope_key, header, nonce_prefix, counter, stack.seal(chunk),
+                                  counter == len(chunks)))
+    return b"".join(bytes(piece) for piece in pieces)
+
+
+@pytest.fixture
+def opened_frames(monkeypatch):
+    """Records the counter of every frame open_stream_envelope decrypts."""
+    counters = []
+    original = stream_envelope._open_frame
+
+    def spy(src, key, header, nonce_prefix, counter):
+        counters.append(counter)
+        return original(src, key, header, nonce_prefix, counter)
+    monkeypatch.setattr(stream_envelope, "_open_frame", spy)
+    return counters
+
+
+def _read_all(envelope, password, key_data=None):
+    metadata, chunks = open_stream_envelope(io.BytesIO(envelope), password, key_data)
+    return metadata, b"".join(bytes(chunk) for chunk in chunks)
+
+
+def test_v4_header_carries_the_key_check_value():
+    envelope = _v4_envelope()
+    header = envelope[:HEADER_SIZES[ENVELOPE_V4]]
+    assert header[:len(ENVELOPE_MAGIC) + 1] == ENVELOPE_MAGIC + bytes([ENVELOPE_V4])
+    salt = header[len(ENVELOPE_MAGIC) + 1:len(ENVELOPE_MAGIC) + 1 + SALT_SIZE]
+    assert header[-KEY_CHECK_SIZE:] == expand_key(derive_master_key("pw", salt), "key-check", KEY_CHECK_SIZE)
+
+
+@pytest.mark.parametrize("password, key_data", [("wrong", None), ("pw", b"unexpected key file")])
+def test_wrong_secret_is_rejected_before_any_frame_is_decrypted(opened_frames, password, key_data):
+    src = io.BytesIO(_v4_envelope())
+    with pytest.raises(ValueError, match="Incorrect password or key"):
+        open_stream_envelope(src, password, key_data)
+    assert opened_frames == []
+    assert src.tell() == HEADER_SIZES[ENVELOPE_V4]  # Nothing past the header was even read
+
+
+def test_correct_secret_passes_the_key_check(opened_frames):
+    assert _read_all(_v4_envelope(key_data=b"key file"), "pw", b"key file") == (METADATA, PAYLOAD)
+    assert opened_frames == list(range(len(PAYLOAD) // 4096 + 2))
+
+
+def test_v3_envelope_without_key_check_still_opens(opened_frames):
+    envelope = _v3_envelope()
+    assert envelope[len(ENVELOPE_MAGIC)] == ENVELOPE_V3
+    assert _read_all(envelope, "pw") == (METADATA, PAYLOAD)
+
+
+def test_v3_wrong_password_fails_on_the_metadata_frame(opened_frames):
+    # Without a key-check value the first authentication failure is the metadata frame, still before the payload
+    with pytest.raises(ValueError):
+        open_stream_envelope(io.BytesIO(_v3_envelope()), "wrong")
+    assert opened_frames == [0]
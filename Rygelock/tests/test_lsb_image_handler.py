@@ -0,0 +1,58 @@
+# tests/test_lsb_image_handler.py — Bulk and per-bit LSB access on LSBImageHandler
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.algorithm_stubs import LSBImageHandler
+
+
+@pytest.fixture
+def carrier(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (12, 10, 3)).astype(np.uint8)
+    path = tmp_path / "carrier.png"
+    Image.fromarray(pixels).save(path)
+    return str(path), pixels
+
+
+def test_pixels_are_decoded_lazily(carrier):
+    handler = LSBImageHandler(carrier[0])
+    assert handler._pixels is None
+    assert handler.get_capacity_in_bits() == 12 * 10 * 3
+    assert np.array_equal(handler.pixels, carrier[1])
+
+
+def test_bit_ranges_roundtrip_through_save(carrier, tmp_path):
+    path, pixels = carrier
+    bits = np.random.default_rng(1).integers(0, 2, 100).astype(np.uint8)
+    handler = LSBImageHandler(path)
+    handler.embed_bits(bits, start=17)
+    assert np.array_equal(handler.extract_bits(17, 100), bits)
+    handler.save(str(tmp_path / "out.png"))
+
+    reloaded = LSBImageHandler(str(tmp_path / "out.png"))
+    assert np.array_equal(reloaded.extract_bits(17, 100), bits)
+    assert np.array_equal(reloaded.extract_bits(0, 17), pixels.reshape(-1)[:17] & 1)
+    assert np.array_equal(reloaded.pixels >> 1, pixels >> 1)
+    assert len(reloaded.extract_bits(300)) == reloaded.capacity - 300
+
+
+def test_index_variants_match_single_bit_calls(carrier):
+    handler = LSBImageHandler(carrier[0])
+    indices = np.array([359, 0, 42, 7])
+    bits = np.array([1, 0, 1, 1], dtype=np.uint8)
+    handler.embed_bits_at(indices, bits)
+    assert np.array_equal(handler.extract_bits_at(indices), bits)
+    assert [handler.extract_bit(int(i)) for i in indices] == bits.tolist()
+    handler.embed_bit(0, 42)
+    assert handler.extract_bits_at([42])[0] == 0
+
+
+def test_out_of_range_access_is_rejected(carrier):
+    handler = LSBImageHandler(carrier[0])
+    with pytest.raises(ValueError):
+        handler.embed_bits(np.ones(10, np.uint8), start=handler.capacity - 5)
+    with pytest.raises(ValueError):
+        handler.extract_bits_at([handler.capacity])
+    with pytest.raises(ValueError):
+        handler.extract_bit(-1)
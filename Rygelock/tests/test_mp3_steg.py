@@ -0,0 +1,76 @@
+# tests/test_mp3_steg.py — Chunked PRIV storage of mp3_steg, its capacity and tag reuse
+
+import numpy as np
+import pytest
+from mutagen.id3 import ID3, APIC, TIT2
+
+import core.algorithm_stubs as stubs
+from core.algorithm import carrier_capacity
+from core.algorithm_stubs import _mp3_capacity, mp3_steg
+from core.id3_tags import read_id3_tag
+
+# A silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, stereo
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(144 * 128000 // 44100 - 4)
+
+
+@pytest.fixture
+def carrier(tmp_path, monkeypatch):
+    monkeypatch.setattr(stubs, "MP3_PRIV_CHUNK", 1000)  # Several chunk frames from small payloads
+    path = tmp_path / "carrier.mp3"
+    path.write_bytes(MP3_FRAME * 50)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="title"))
+    tags.add(APIC(encoding=3, mime="image/png", type=3, desc="cover", data=bytes(5000)))
+    tags.save(str(path))
+    return str(path)
+
+
+def _payload(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 0xFF, size, dtype=np.uint8).tobytes()  # No 0xFF bytes
+
+
+def test_roundtrip_keeps_other_frames_and_audio(carrier, tmp_path):
+    payload = _payload(4321)
+    output = mp3_steg(carrier, payload=payload, output_path=str(tmp_path / "out.mp3"))
+    assert mp3_steg(output, extract=True) == payload
+    tags = ID3(output)
+    assert tags.getall("TIT2")[0].text == ["title"]
+    assert len(tags.getall("APIC")[0].data) == 5000
+    assert len(tags.getall("PRIV")) == 1 + 5  # Index frame and five chunk frames
+    assert open(output, "rb").read().endswith(MP3_FRAME * 50)
+
+
+def test_re_embed_reuses_the_tag_space(carrier, tmp_path):
+    output = mp3_steg(carrier, payload=_payload(4000), output_path=str(tmp_path / "out.mp3"))
+    with open(output, "rb") as f:
+        tag_end = read_id3_tag(f).end
+    assert mp3_steg(output, payload=_payload(4500, 1), in_place=True) == output
+    with open(output, "rb") as f:
+        assert read_id3_tag(f).end == tag_end  # Overwritten within its padding, audio not moved
+    assert mp3_steg(output, extract=True) == _payload(4500, 1)
+
+
+def test_capacity_subtracts_existing_frames_and_chunk_overhead(carrier, tmp_path, monkeypatch):
+    monkeypatch.setattr(stubs, "ID3_MAX_SIZE", 20000)
+    capacity = _mp3_capacity(carrier)
+    assert mp3_steg.max_payload is _mp3_capacity
+    assert carrier_capacity(carrier) == capacity
+    assert 0 < capacity < 20000 - 5000
+
+    output = mp3_steg(carrier, payload=_payload(capacity), output_path=str(tmp_path / "full.mp3"))
+    assert mp3_steg(output, extract=True) == _payload(capacity)
+    assert mp3_steg(carrier, payload=_payload(capacity + 1), output_path=str(tmp_path / "over.mp3")) is None
+    assert _mp3_capacity(output) == capacity  # The carrier's own payload frames do not count
+
+
+def test_unsupported_tag_still_reassembles_chunks(carrier, tmp_path):
+    payload = _payload(3500)
+    output = mp3_steg(carrier, payload=payload, output_path=str(tmp_path / "out.mp3"))
+    with open(output, "r+b") as f:  # Mark the tag unsynchronised: read_id3_tag() no longer walks it
+        f.seek(5)
+        flags = f.read(1)[0]
+        f.seek(5)
+        f.write(bytes((flags | 0x80,)))
+    with open(output, "rb") as f:
+        assert not read_id3_tag(f).supported
+    assert mp3_steg(output, extract=True) == payload
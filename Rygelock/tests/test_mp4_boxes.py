@@ -0,0 +1,58 @@
+# tests/test_mp4_boxes.py — Top-level MP4 box index and mp4_steg's appended 'rygl' box
+
+import pytest
+
+from core.algorithm_stubs import mp4_steg
+from core.mp4_boxes import (LARGE_BOX_HEADER_SIZE, MAX_COMPACT_BOX_SIZE, find_last_box, pack_box_header,
+                            read_box_index)
+
+
+def _box(box_type, body):
+    return (8 + len(body)).to_bytes(4, 'big') + box_type + body
+
+
+def test_index_reads_compact_large_uuid_and_open_boxes(tmp_path):
+    path = tmp_path / "boxes.mp4"
+    large = (1).to_bytes(4, 'big') + b'wide' + (16 + 5).to_bytes(8, 'big') + b'12345'
+    uuid = (8 + 16 + 3).to_bytes(4, 'big') + b'uuid' + bytes(16) + b'abc'
+    open_box = (0).to_bytes(4, 'big') + b'mdat' + bytes(100)
+    path.write_bytes(_box(b'ftyp', b'isom') + large + uuid + open_box)
+
+    boxes = read_box_index(str(path))
+    assert [box.type for box in boxes] == [b'ftyp', b'wide', b'uuid', b'mdat']
+    assert (boxes[1].header_size, boxes[1].data_size) == (16, 5)
+    assert (boxes[2].header_size, boxes[2].data_size) == (24, 3)
+    assert boxes[3].to_end and boxes[3].end == path.stat().st_size
+
+
+def test_index_stops_at_truncated_boxes(tmp_path):
+    path = tmp_path / "truncated.mp4"
+    path.write_bytes(_box(b'ftyp', b'isom') + (1000).to_bytes(4, 'big') + b'mdat' + bytes(10) + b'\0\0')
+    boxes = read_box_index(str(path))
+    assert [box.type for box in boxes] == [b'ftyp', b'mdat']
+    assert boxes[-1].end == path.stat().st_size  # Cut to the end of the file
+
+
+def test_box_headers_keep_the_data_offset():
+    small = pack_box_header(b'rygl', 10)
+    large = pack_box_header(b'rygl', MAX_COMPACT_BOX_SIZE)
+    assert len(small) == len(large) == LARGE_BOX_HEADER_SIZE
+    assert small[8:12] == (18).to_bytes(4, 'big')
+    assert large[:4] == (1).to_bytes(4, 'big') and int.from_bytes(large[8:], 'big') == MAX_COMPACT_BOX_SIZE + 16
+
+
+@pytest.mark.parametrize("in_place", [False, True])
+def test_mp4_steg_closes_an_open_mdat_and_appends(tmp_path, in_place):
+    carrier = tmp_path / "carrier.mp4"
+    carrier.write_bytes(_box(b'ftyp', b'isom') + (0).to_bytes(4, 'big') + b'mdat' + bytes(1000))
+    output = None if in_place else str(tmp_path / "out.mp4")
+    result = mp4_steg(str(carrier), payload=b"first", output_path=output, in_place=in_place)
+    assert mp4_steg(result, extract=True) == b"first"
+
+    boxes = read_box_index(result)
+    assert [box.type for box in boxes] == [b'ftyp', b'mdat', b'free', b'rygl']
+    assert not boxes[1].to_end and boxes[1].data_size == 1000
+    assert find_last_box(boxes, b'rygl').data_size == 5
+
+    again = mp4_steg(result, payload=b"second", in_place=True)
+    assert mp4_steg(again, extract=True) == b"second"
@@ -0,0 +1,61 @@
+# tests/test_mvg_variances.py — The O(N) MVG variance map against the sliding-window DCT loop, and run_mvg
+
+import numpy as np
+import pytest
+from PIL import Image
+from scipy.fftpack import dct
+
+from core.algorithm_stubs import _mvg_variances, _select_cheapest, run_mvg
+
+
+def reference_variances(img_np, window_size=8):
+    """The original run_mvg loop: two DCTs per window position, variances summed over each window."""
+    img_np = img_np.astype(np.float32)
+    shape = img_np.shape
+
+    def local_variance(block):
+        dct_block = dct(dct(block.T, norm='ortho').T, norm='ortho')
+        return np.var(dct_block)
+
+    variances = np.zeros(shape)
+    for i in range(0, shape[0] - window_size + 1):
+        for j in range(0, shape[1] - window_size + 1):
+            block = img_np[i:i+window_size, j:j+window_size]
+            var = local_variance(block)
+            variances[i:i+window_size, j:j+window_size] += var
+    variances /= (window_size * window_size)
+    return variances
+
+
+@pytest.mark.parametrize("shape", [(30, 41), (8, 8), (17, 9), (5, 20)])
+def test_matches_sliding_window_reference(shape):
+    rng = np.random.default_rng(sum(shape))
+    img = rng.integers(0, 256, shape).astype(np.uint8)
+    img[:12, :12] = 0  # Zero-variance blocks must stay exactly zero (they get no Fisher information)
+    expected = reference_variances(img)
+    variances = _mvg_variances(img)
+    assert np.allclose(variances, expected, rtol=1e-5, atol=1e-6)
+    assert np.array_equal(variances == 0, expected == 0)
+
+
+def test_embedding_sets_parities_of_highest_fisher_pixels(tmp_path):
+    rng = np.random.default_rng(5)
+    img = rng.integers(10, 246, (64, 80)).astype(np.uint8)  # Away from 0/255, so no change is clipped
+    img[40:, 50:] = 128
+    carrier = tmp_path / "carrier.png"
+    Image.fromarray(img).save(carrier)
+    payload = rng.integers(0, 256, 300, dtype=np.uint8).tobytes()
+
+    output = run_mvg(str(carrier), payload=payload, output_path=str(tmp_path / "out.png"))
+    assert output is not None
+    stego = np.array(Image.open(output)).astype(np.int16)
+
+    with np.errstate(divide='ignore'):
+        fisher = np.nan_to_num(1.0 / _mvg_variances(img) ** 2, nan=0.0, posinf=0.0, neginf=0.0).ravel()
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    indices = _select_cheapest(-fisher, len(bits))
+    assert np.array_equal(stego.ravel()[indices] % 2, bits)
+    changed = np.zeros(img.size, dtype=bool)
+    changed[indices] = True
+    assert np.array_equal(stego.ravel()[~changed], img.ravel()[~changed])
+    assert np.abs(stego.ravel() - img.ravel()).max() <= 2
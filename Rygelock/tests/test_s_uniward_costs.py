@@ -0,0 +1,35 @@
+# tests/test_s_uniward_costs.py — Tiled S-UNIWARD costs against the whole-image wavelet transform
+
+import numpy as np
+import pytest
+import pywt
+
+from core.algorithm_stubs import (S_UNIWARD_LEVEL, S_UNIWARD_WAVELET, _s_uniward_costs,
+                                  _s_uniward_positions)
+
+
+def reference_costs(img_np):
+    """Costs from one untiled wavedec2 over the whole image, cut to the positions _s_uniward_costs keeps."""
+    LH, HL, HH = pywt.wavedec2(img_np.astype(np.float32), S_UNIWARD_WAVELET, level=S_UNIWARD_LEVEL)[1]
+    full = np.clip(1 / (1 + (np.abs(LH) + np.abs(HL) + np.abs(HH))), 0.001, 1.0)
+    filter_length = pywt.Wavelet(S_UNIWARD_WAVELET).dec_len
+    first_row, row_pixels = _s_uniward_positions(img_np.shape[0], filter_length)
+    first_col, col_pixels = _s_uniward_positions(img_np.shape[1], filter_length)
+    return full[first_row:first_row + len(row_pixels), first_col:first_col + len(col_pixels)]
+
+
+@pytest.mark.parametrize("shape", [(50, 60), (97, 203), (150, 131), (33, 1000), (1, 1)])
+@pytest.mark.parametrize("memory_budget", [1 << 30, 200000, 40000, 1])  # One tile down to one coefficient per tile
+def test_tiles_match_untiled_transform(shape, memory_budget):
+    rng = np.random.default_rng(sum(shape))
+    img = rng.integers(0, 256, shape).astype(np.uint8)
+    costs, row_pixels, col_pixels = _s_uniward_costs(img, memory_budget, workers=3)
+    assert costs.shape == (len(row_pixels), len(col_pixels))
+    assert np.array_equal(costs, reference_costs(img))
+
+
+def test_positions_are_inside_the_image():
+    for n in (1, 7, 64, 1001):
+        _, pixels = _s_uniward_positions(n, pywt.Wavelet(S_UNIWARD_WAVELET).dec_len)
+        assert ((pixels >= 0) & (pixels < n)).all()
+        assert (np.diff(pixels) == 1 << S_UNIWARD_LEVEL).all()
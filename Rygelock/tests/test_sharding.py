@@ -0,0 +1,256 @@
+# tests/test_sharding.py — Shard planning, the RYGS header, reassembly and a sharded embed across mixed carriers
+
+import io
+import os
+import random
+import wave
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.algorithm import carrier_capacity, route_extraction_algorithm
+from core.sharding import SHARD_HEADER_SIZE, SHARD_MAGIC, SHARD_SET_ID_SIZE, SHARD_VERSION, ConcatReader, \
+    is_shard, pack_shard_header, parse_shard_header, plan_shards
+from core.steg_engine import embed_files, extract_payload
+from core.stream_envelope import STREAM_CHUNK_SIZE
+
+
+# --- Planning ---
+
+def _frames(plan):
+    return [stop - first for first, stop in plan]
+
+
+def _check_plan(plan, frame_count, frame_size, capacities, head_size=0):
+    # Contiguous ranges that cover frames 1..frame_count exactly once, each within its carrier's capacity
+    assert plan[0][0] == 1 and plan[-1][1] == frame_count + 1
+    assert all(a[1] == b[0] for a, b in zip(plan, plan[1:]))
+    for i, (frames, capacity) in enumerate(zip(_frames(plan), capacities)):
+        assert frames >= 0
+        if capacity is not None:
+            assert SHARD_HEADER_SIZE + (head_size if i == 0 else 0) + frames * frame_size <= capacity
+
+
+def test_unbounded_carriers_split_by_weight():
+    plan = plan_shards(100, 10, weights=[1, 1, 2], capacities=[None, None, None])
+    _check_plan(plan, 100, 10, [None] * 3)
+    assert _frames(plan) == [25, 25, 50]
+
+
+def test_leftover_frames_go_to_the_heaviest_carrier():
+    plan = plan_shards(10, 10, weights=[1, 1, 2], capacities=[None, None, None])
+    assert _frames(plan) == [2, 2, 6]
+
+
+def test_full_carriers_overflow_to_the_rest():
+    # The heaviest carrier only holds 3 frames; its share is passed on to the others by weight
+    capacities = [None, SHARD_HEADER_SIZE + 3 * 100 + 99, None]
+    plan = plan_shards(40, 100, weights=[1, 10, 1], capacities=capacities)
+    _check_plan(plan, 40, 100, capacities)
+    assert _frames(plan) == [19, 3, 18]  # Equal weights: the leftover frame goes to the first
+
+
+def test_envelope_head_counts_against_the_first_carrier():
+    capacities = [SHARD_HEADER_SIZE + 500 + 2 * 100, None]
+    plan = plan_shards(10, 100, weights=[100, 1], capacities=capacities, head_size=500)
+    _check_plan(plan, 10, 100, capacities, head_size=500)
+    assert _frames(plan) == [2, 8]
+
+
+def test_payload_larger_than_total_capacity_is_rejected():
+    capacities = [SHARD_HEADER_SIZE + 5 * 100, SHARD_HEADER_SIZE + 4 * 100]
+    assert _frames(plan_shards(9, 100, [1, 1], capacities)) == [5, 4]
+    with pytest.raises(ValueError, match="too large"):
+        plan_shards(10, 100, [1, 1], capacities)
+
+
+def test_first_carrier_must_hold_the_envelope_head():
+    with pytest.raises(ValueError, match="envelope header"):
+        plan_shards(1, 100, [1, 1], [SHARD_HEADER_SIZE + 10, None], head_size=11)
+
+
+def test_every_carrier_must_hold_its_shard_header():
+    assert _frames(plan_shards(1, 100, [1, 1], [None, SHARD_HEADER_SIZE])) == [1, 0]
+    with pytest.raises(ValueError, match="shard header"):
+        plan_shards(1, 100, [1, 1], [None, SHARD_HEADER_SIZE - 1])
+
+
+def test_random_plans_respect_every_capacity():
+    rng = random.Random(0)
+    for _ in range(500):
+        count = rng.randint(1, 6)
+        frame_size, head_size = rng.randint(1, 50), rng.randint(0, 200)
+        weights = [rng.randint(1, 1000) for _ in range(count)]
+        capacities = [None if rng.random() < 0.3 else SHARD_HEADER_SIZE + rng.randint(0, 2000) for _ in range(count)]
+        if capacities[0] is not None:
+            capacities[0] += head_size
+        room = sum(frame_size * 10_000 if c is None else max(0, c - SHARD_HEADER_SIZE - (head_size if i == 0 else 0))
+                   // frame_size * frame_size for i, c in enumerate(capacities))
+        frame_count = rng.randint(1, max(1, room // frame_size))
+        plan = plan_shards(frame_count, frame_size, weights, capacities, head_size)
+        _check_plan(plan, frame_count, frame_size, capacities, head_size)
+
+
+# --- Header ---
+
+def test_shard_header_roundtrip():
+    set_id = bytes(range(SHARD_SET_ID_SIZE))
+    head = pack_shard_header(set_id, 2, 5)
+    assert len(head) == SHARD_HEADER_SIZE
+    assert head[:len(SHARD_MAGIC)] == b"RYGS" and head[len(SHARD_MAGIC)] == SHARD_VERSION
+    assert is_shard(head + b"envelope bytes")
+    assert parse_shard_header(head) == (set_id, 2, 5)
+
+
+@pytest.mark.parametrize("head, message", [
+    (b"RYGE\x04" + bytes(SHARD_HEADER_SIZE), "Not a Rygelock shard"),
+    (pack_shard_header(bytes(SHARD_SET_ID_SIZE), 0, 2)[:-1], "Not a Rygelock shard"),
+    (b"RYGS\x09" + bytes(SHARD_HEADER_SIZE - 5), "Unsupported shard version"),
+    (pack_shard_header(bytes(SHARD_SET_ID_SIZE), 3, 3), "corrupted"),
+])
+def test_bad_shard_headers_are_rejected(head, message):
+    with pytest.raises(ValueError, match=message):
+        parse_shard_header(head)
+
+
+def test_concat_reader_joins_parts_from_their_current_positions():
+    parts = [io.BytesIO(b"xxabc"), io.BytesIO(b""), io.BytesIO(b"defg")]
+    parts[0].seek(2)
+    reader = ConcatReader(parts)
+    assert reader.read() == b"abcdefg"
+    assert reader.seek(-3, io.SEEK_END) == 4
+    assert reader.read(2) == b"ef"
+    reader.seek(1)
+    buffer = bytearray(5)
+    assert reader.readinto(buffer) == 5 and buffer == b"bcdef"
+    reader.close()
+    assert all(part.closed for part in parts)
+
+
+# --- End to end ---
+
+def _png(path):
+    Image.fromarray(np.random.default_rng(1).integers(0, 256, (24, 24, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def _mp4(path, size):
+    path.write_bytes((12).to_bytes(4, 'big') + b"ftypisom" + (8 + size).to_bytes(4, 'big') + b"mdat" + bytes(size))
+    return str(path)
+
+
+def _wav(path, samples):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(8000)
+        w.writeframes(np.random.default_rng(2).integers(0, 256, samples, dtype=np.uint8).tobytes())
+    return str(path)
+
+
+def _hidden(path):
+    return bytes(route_extraction_algorithm(path)(path, extract=True))
+
+
+@pytest.fixture(scope="module")
+def sharded(tmp_path_factory):
+    """
+    A 3.5 MiB payload (four frames) and a decoy sharded over a PNG, an MP4 and a WAV. The WAV is the
+    heaviest carrier but only holds one frame, so the plan has to pass its share on to the others.
+    """
+    tmp_path = tmp_path_factory.mktemp("sharded")
+    payload = np.random.default_rng(3).integers(0, 256, 3 * STREAM_CHUNK_SIZE + STREAM_CHUNK_SIZE // 2,
+                                                dtype=np.uint8).tobytes()
+    (tmp_path / "secret.bin").write_bytes(payload)
+    (tmp_path / "decoy.txt").write_bytes(b"decoy contents")
+    carriers = [_png(tmp_path / "a.png"), _mp4(tmp_path / "b.mp4", 200_000),
+                _wav(tmp_path / "c.wav", 8 * (STREAM_CHUNK_SIZE + STREAM_CHUNK_SIZE // 4))]
+    config = {"carriers": [{"file": path, "algorithm": "auto"} for path in carriers],
+              "payloads": [str(tmp_path / "secret.bin")], "encryption": "AES", "password": "pw",
+              "fake_payloads": [str(tmp_path / "decoy.txt")], "fake_password": "decoy",
+              "output_dir": str(tmp_path / "out")}
+    progress = []
+    result = embed_files(config, progress.append)
+    assert result["status"] == "Success", result["errors"]
+    assert progress[-1] == 100
+    outputs = [str(tmp_path / "out" / name) for name in result["embedded_files"]]
+    return tmp_path, payload, outputs
+
+
+def test_sharded_embed_spreads_frames_within_capacity(sharded):
+    tmp_path, _, outputs = sharded
+    shards = [_hidden(path) for path in outputs]
+    headers = [parse_shard_header(shard[:SHARD_HEADER_SIZE]) for shard in shards]
+    assert [index for _, index, _ in headers] == [0, 1, 2]
+    assert {count for _, _, count in headers} == {3}
+    assert len({set_id for set_id, _, _ in headers}) == 1
+    # The WAV is the largest file but is capped at one frame; the MP4 takes the overflow
+    assert carrier_capacity(str(tmp_path / "c.wav")) < 2 * STREAM_CHUNK_SIZE
+    assert SHARD_HEADER_SIZE < len(shards[2]) <= carrier_capacity(str(tmp_path / "c.wav"))
+    assert len(shards[1]) > 2 * STREAM_CHUNK_SIZE
+
+
+@pytest.mark.parametrize("order", [(0, 1, 2), (2, 0, 1), (1, 2, 0)])
+def test_shards_reassemble_in_any_order(sharded, order):
+    tmp_path, payload, outputs = sharded
+    result = extract_payload([outputs[i] for i in order], password="pw",
+                             output_dir=str(tmp_path / ("real" + "".join(map(str, order)))))
+    assert result["status"] == "success", result.get("message")
+    assert open(result["output_file"], "rb").read() == payload
+
+
+def test_decoy_is_carried_by_the_first_shard(sharded):
+    tmp_path, _, outputs = sharded
+    result = extract_payload(outputs[::-1], password="decoy", output_dir=str(tmp_path / "decoy"))
+    assert result["status"] == "success", result.get("message")
+    assert open(result["output_file"], "rb").read() == b"decoy contents"
+
+
+def test_lone_shard_asks_for_the_whole_set(sharded):
+    tmp_path, _, outputs = sharded
+    result = extract_payload(outputs[1], password="pw", output_dir=str(tmp_path / "lone"))
+    assert result == {"status": "error", "message": "This file holds shard 2 of 3. Select all 3 carriers."}
+
+
+def test_missing_shard_is_reported(sharded):
+    tmp_path, _, outputs = sharded
+    result = extract_payload(outputs[:2], password="pw", output_dir=str(tmp_path / "missing"))
+    assert result["status"] == "error"
+    assert "1 of 3 carriers missing" in result["message"]
+
+
+def test_duplicate_shard_is_reported(sharded):
+    tmp_path, _, outputs = sharded
+    result = extract_payload([outputs[0], outputs[1], outputs[1]], password="pw", output_dir=str(tmp_path / "dup"))
+    assert result["status"] == "error"
+    assert "duplicate" in result["message"]
+
+
+def test_shards_of_different_embeds_are_rejected(sharded, tmp_path):
+    _, _, outputs = sharded
+    payload_path = tmp_path / "other.bin"
+    payload_path.write_bytes(b"another set")
+    carriers = [_png(tmp_path / "x.png"), _mp4(tmp_path / "y.mp4", 1000)]
+    config = {"carriers": [{"file": path, "algorithm": "auto"} for path in carriers],
+              "payloads": [str(payload_path)], "encryption": "AES", "password": "pw",
+              "output_dir": str(tmp_path / "out")}
+    other = embed_files(config, lambda _: None)
+    assert other["status"] == "Success", other["errors"]
+
+    mixed = [outputs[0], str(tmp_path / "out" / other["embedded_files"][1]), outputs[2]]
+    result = extract_payload(mixed, password="pw", output_dir=str(tmp_path / "mixed"))
+    assert result["status"] == "error"
+    assert "different sharded embeds" in result["message"]
+
+
+def test_too_small_carriers_fail_without_leaving_output(tmp_path):
+    payload_path = tmp_path / "big.bin"
+    payload_path.write_bytes(bytes(2 * STREAM_CHUNK_SIZE))
+    carriers = [_wav(tmp_path / "a.wav", 4000), _wav(tmp_path / "b.wav", 4000)]
+    config = {"carriers": [{"file": path, "algorithm": "auto"} for path in carriers],
+              "payloads": [str(payload_path)], "encryption": "AES", "password": "pw",
+              "output_dir": str(tmp_path / "out")}
+    result = embed_files(config, lambda _: None)
+    assert result["status"] == "Failed"
+    assert os.listdir(tmp_path / "out") == []
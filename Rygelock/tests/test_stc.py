@@ -0,0 +1,81 @@
+# tests/test_stc.py — Syndrome-trellis embedding: extraction, optimality of the Viterbi pass, wet elements
+
+import itertools
+
+import numpy as np
+import pytest
+
+import core.stc as stc
+from core.stc import stc_embed, stc_extract
+
+
+def _parity_check_matrix(n, m, constraint_height):
+    """H as a dense (m, n) array, column i being the syndrome of the unit vector e_i."""
+    columns = []
+    for i in range(n):
+        unit = np.zeros(n, dtype=np.uint8)
+        unit[i] = 1
+        columns.append(stc_extract(unit, m, constraint_height))
+    return np.stack(columns, axis=1)
+
+
+@pytest.mark.parametrize("n, m, h", [(1000, 100, 3), (5000, 2500, 7), (20000, 5000, 7), (30000, 29900, 4),
+                                     (50000, 7, 7), (9000, 3000, 12)])
+def test_extract_returns_embedded_message(n, m, h):
+    rng = np.random.default_rng(n + m + h)
+    cover = rng.integers(0, 2, n).astype(np.uint8)
+    costs = rng.random(n).astype(np.float32) + 0.1
+    message = rng.integers(0, 2, m).astype(np.uint8)
+    stego = stc_embed(cover, costs, message, h)
+    assert np.array_equal(stc_extract(stego, m, h), message)
+    assert (stego != cover).sum() <= m  # Never worse than writing the message bits directly
+
+
+@pytest.mark.parametrize("n, m, h", [(12, 4, 2), (14, 5, 3), (16, 4, 4)])
+def test_viterbi_finds_minimum_cost_stego(n, m, h):
+    """Exhaustive search over all 2^n stego vectors with the right syndrome."""
+    rng = np.random.default_rng(n * m * h)
+    H = _parity_check_matrix(n, m, h)
+    candidates = np.array(list(itertools.product((0, 1), repeat=n)), dtype=np.uint8)
+    syndromes = (candidates.astype(np.int64) @ H.T.astype(np.int64)) & 1
+    for _ in range(5):
+        cover = rng.integers(0, 2, n).astype(np.uint8)
+        costs = rng.random(n).astype(np.float32) + 0.01
+        message = rng.integers(0, 2, m).astype(np.uint8)
+        valid = candidates[(syndromes == message).all(axis=1)]
+        best = ((valid != cover) * costs).sum(axis=1).min()
+
+        stego = stc_embed(cover, costs, message, h)
+        assert np.array_equal(stc_extract(stego, m, h), message)
+        assert ((stego != cover) * costs).sum() == pytest.approx(best, rel=1e-6)
+
+
+def test_wet_elements_are_not_changed():
+    rng = np.random.default_rng(7)
+    n, m = 400000, 80000
+    cover = rng.integers(0, 2, n).astype(np.uint8)
+    costs = np.ones(n, dtype=np.float32)
+    costs[::2] = np.inf
+    costs[5000:20000] = np.inf
+    message = rng.integers(0, 2, m).astype(np.uint8)
+    stego = stc_embed(cover, costs, message, 5)
+    assert np.array_equal(stc_extract(stego, m, 5), message)
+    wet = np.isinf(costs)
+    assert np.array_equal(stego[wet], cover[wet])
+
+
+def test_batches_match_single_pass(monkeypatch):
+    """Splitting the segments into Viterbi batches must not change the result."""
+    rng = np.random.default_rng(3)
+    n, m = 40000, 9000
+    cover = rng.integers(0, 2, n).astype(np.uint8)
+    costs = rng.random(n).astype(np.float32)
+    message = rng.integers(0, 2, m).astype(np.uint8)
+    whole = stc_embed(cover, costs, message, 6)
+    monkeypatch.setattr(stc, "_TRELLIS_CELLS", 64)
+    assert np.array_equal(stc_embed(cover, costs, message, 6), whole)
+
+
+def test_rejects_message_longer_than_cover():
+    with pytest.raises(ValueError):
+        stc_embed(np.zeros(10, np.uint8), np.ones(10, np.float32), np.ones(11, np.uint8))
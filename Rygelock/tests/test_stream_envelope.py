@@ -0,0 +1,261 @@
+# tests/test_stream_envelope.py — Chunked STREAM envelope framing, tamper rejection and older envelope formats
+
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from Crypto.Random import get_random_bytes
+from PIL import Image
+
+from core.algorithm import stego_apply
+from core.encryption import derive_master_key, encrypt_file, encrypt_with_key, expand_key, apply_masking, \
+    apply_masking_with_key, KEY_SIZES
+from core.steg_engine import embed_files, extract_payload, ENVELOPE_SALT_SIZE, ENVELOPE_V2, FAKE_TAG, \
+    MATRYOSHKA_SALTS, METADATA_PAYLOAD_DELIMITER, REAL_TAG
+from core.stream_envelope import ENVELOPE_MAGIC, ENVELOPE_V4, HEADER_SIZES, LAST_FRAME_FLAG, STREAM_CHUNK_SIZE, \
+    TAG_SIZE, ChunkedReader, iter_stream_envelope, open_stream_envelope, readinto_exact, skip_stream_envelope
+
+METADATA = {"original_filename": "secret.bin", "encryption_algorithm": "AES"}
+
+
+def _payload(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def _seal(payload, password="pw", metadata=METADATA, encryption_algo="AES", **options):
+    return b"".join(bytes(piece) for piece in iter_stream_envelope(io.BytesIO(payload), password, None, metadata,
+                                                                   encryption_algo, **options))
+
+
+def _open(envelope, password="pw"):
+    metadata, chunks = open_stream_envelope(io.BytesIO(envelope), password)
+    return metadata, b"".join(bytes(chunk) for chunk in chunks)
+
+
+def _split(envelope):
+    """Splits a v4 envelope into its header and frames (metadata frame first), each frame as raw bytes."""
+    header_size = HEADER_SIZES[ENVELOPE_V4]
+    frames, pos = [], header_size
+    while pos < len(envelope):
+        length = int.from_bytes(envelope[pos:pos + 4], 'big') & ~LAST_FRAME_FLAG
+        frames.append(envelope[pos:pos + 4 + length + TAG_SIZE])
+        pos += 4 + length + TAG_SIZE
+    return envelope[:header_size], frames
+
+
+def _is_last(frame):
+    return bool(int.from_bytes(frame[:4], 'big') & LAST_FRAME_FLAG)
+
+
+def _png_carrier(path):
+    Image.fromarray(np.random.default_rng(7).integers(0, 256, (32, 32, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+# --- Framing ---
+
+@pytest.mark.parametrize("size", [0, 1, STREAM_CHUNK_SIZE - 1, STREAM_CHUNK_SIZE, STREAM_CHUNK_SIZE + 1,
+                                  2 * STREAM_CHUNK_SIZE + 7])
+def test_roundtrip_across_chunk_boundaries(size):
+    payload = _payload(size, size)
+    envelope = _seal(payload)
+    _, frames = _split(envelope)
+
+    # One metadata frame, then one frame per started chunk; an empty payload still gets its final frame
+    assert len(frames) == 1 + max(1, -(-size // STREAM_CHUNK_SIZE))
+    assert [_is_last(frame) for frame in frames] == [False] * (len(frames) - 1) + [True]
+    assert _open(envelope) == (METADATA, payload)
+
+
+@pytest.mark.parametrize("encryption_algo", ["AES", "Blowfish", "Fernet"])
+def test_layers_and_masking_are_applied_per_chunk(encryption_algo):
+    payload = _payload(2500, 1)
+    metadata = dict(METADATA, encryption_algorithm=encryption_algo, matryoshka_layers=2, masking_used=True)
+    envelope = _seal(payload, metadata=metadata, encryption_algo=encryption_algo, layers=2, masking=True,
+                     chunk_size=1000)
+    assert len(_split(envelope)[1]) == 4
+    assert payload not in envelope
+    assert _open(envelope) == (metadata, payload)
+
+
+def test_chunked_reader_fills_buffers_across_pieces():
+    # A raw stream may return short reads; readinto_exact loops over them as the handlers do
+    reader = ChunkedReader(iter([b"abc", b"", bytearray(b"defgh"), memoryview(b"ij")]))
+    buffer = bytearray(6)
+    assert readinto_exact(reader, buffer) == 6 and buffer == b"abcdef"
+    assert readinto_exact(reader, buffer) == 4 and buffer[:4] == b"ghij"
+    assert reader.read(1) == b""
+
+
+def test_skip_moves_past_the_envelope_without_keys():
+    envelope = _seal(_payload(3000, 2), chunk_size=1024)
+    src = io.BytesIO(envelope + b"trailer")
+    skip_stream_envelope(src)
+    assert src.read() == b"trailer"
+
+
+# --- Tamper rejection ---
+
+def _consume(envelope):
+    metadata, chunks = open_stream_envelope(io.BytesIO(envelope), "pw")
+    for _ in chunks:
+        pass
+
+
+@pytest.fixture
+def three_frame_envelope():
+    """An envelope with three equal 1 KiB payload frames, so frames can be swapped byte for byte."""
+    envelope = _seal(_payload(3 * 1024, 3), chunk_size=1024)
+    header, frames = _split(envelope)
+    assert len(frames) == 4 and len(frames[1]) == len(frames[2])
+    return header, frames
+
+
+def test_dropping_the_final_frame_is_rejected(three_frame_envelope):
+    header, frames = three_frame_envelope
+    with pytest.raises(ValueError, match="truncated"):
+        _consume(header + b"".join(frames[:-1]))
+
+
+def test_cutting_into_the_final_frame_is_rejected(three_frame_envelope):
+    header, frames = three_frame_envelope
+    with pytest.raises(ValueError, match="truncated"):
+        _consume((header + b"".join(frames))[:-1])
+
+
+def test_forging_the_last_flag_is_rejected(three_frame_envelope):
+    # Marking an earlier frame as final changes its nonce, so a truncated stream cannot pass as complete
+    header, frames = three_frame_envelope
+    forged = bytearray(frames[2])
+    forged[:4] = (int.from_bytes(forged[:4], 'big') | LAST_FRAME_FLAG).to_bytes(4, 'big')
+    with pytest.raises(ValueError):
+        _consume(header + frames[0] + frames[1] + bytes(forged))
+
+
+def test_reordered_frames_are_rejected(three_frame_envelope):
+    header, frames = three_frame_envelope
+    with pytest.raises(ValueError):
+        _consume(header + frames[0] + frames[2] + frames[1] + frames[3])
+
+
+def test_frames_from_another_envelope_are_rejected(three_frame_envelope):
+    header, frames = three_frame_envelope
+    _, other = _split(_seal(_payload(3 * 1024, 3), chunk_size=1024))
+    with pytest.raises(ValueError):
+        _consume(header + frames[0] + other[1] + frames[2] + frames[3])
+
+
+def test_flipped_header_byte_is_rejected(three_frame_envelope):
+    header, frames = three_frame_envelope
+    tampered = bytearray(header)
+    tampered[-1] ^= 1  # Last byte of the key-check value
+    with pytest.raises(ValueError):
+        _consume(bytes(tampered) + b"".join(frames))
+
+
+# --- Engine round trips ---
+
+def _embed(tmp_path, carrier, payload, **config):
+    payload_path = tmp_path / "secret.bin"
+    payload_path.write_bytes(payload)
+    config = {"carriers": [{"file": carrier, "algorithm": "auto"}], "payloads": [str(payload_path)],
+              "encryption": "AES", "password": "pw", "output_dir": str(tmp_path / "out"), **config}
+    result = embed_files(config, lambda _: None)
+    assert result["status"] == "Success", result["errors"]
+    return str(tmp_path / "out" / result["embedded_files"][0])
+
+
+def test_multi_chunk_payload_with_decoy_through_the_engine(tmp_path):
+    payload = _payload(2 * STREAM_CHUNK_SIZE + 123, 4)
+    decoy_path = tmp_path / "decoy.txt"
+    decoy_path.write_bytes(b"nothing to see here")
+    stego = _embed(tmp_path, _png_carrier(tmp_path / "carrier.png"), payload, matryoshka_layers=1, masking=True,
+                   fake_payloads=[str(decoy_path)], fake_password="decoy")
+
+    real = extract_payload(stego, password="pw", output_dir=str(tmp_path / "real"))
+    assert real["status"] == "success", real.get("message")
+    assert open(real["output_file"], "rb").read() == payload
+    decoy = extract_payload(stego, password="decoy", output_dir=str(tmp_path / "decoy"))
+    assert decoy["status"] == "success", decoy.get("message")
+    assert open(decoy["output_file"], "rb").read() == b"nothing to see here"
+
+
+def test_corrupted_frame_leaves_no_partial_output(tmp_path):
+    stego = _embed(tmp_path, _png_carrier(tmp_path / "carrier.png"), _payload(STREAM_CHUNK_SIZE + 10, 5))
+    data = bytearray(open(stego, "rb").read())
+    data[-20] ^= 1  # Inside the final frame's ciphertext, after the first chunk has been written out
+    with open(stego, "wb") as f:
+        f.write(data)
+
+    result = extract_payload(stego, password="pw", output_dir=str(tmp_path / "extracted"))
+    assert result["status"] == "error"
+    assert not os.path.exists(tmp_path / "extracted" / "secret.bin")
+
+
+# --- Older envelopes ---
+
+def _legacy_envelope(payload, password, metadata, layers=0, masking=False):
+    """The headerless envelope written before v2: PBKDF2 once per layer, HKDF-keyed outer AES-GCM."""
+    encrypted = encrypt_file(payload, metadata["encryption_algorithm"], password)
+    for i in range(layers):
+        layer_key = HKDF(password.encode('utf-8'), 32, salt=MATRYOSHKA_SALTS[i], hashmod=SHA256)
+        encrypted = encrypt_file(encrypted, metadata["encryption_algorithm"], "J0$hu@!ncr3m3nt@l", key_data=layer_key)
+    if masking:
+        encrypted = apply_masking(encrypted, password)
+    block = json.dumps(metadata).encode('utf-8') + METADATA_PAYLOAD_DELIMITER + bytes(encrypted)
+    cipher = AES.new(HKDF(password.encode('utf-8'), 32, salt=b'rygelock_default_salt', hashmod=SHA256),
+                     AES.MODE_GCM)
+    ciphertext, tag = cipher.encrypt_and_digest(block)
+    return cipher.nonce + tag + ciphertext
+
+
+def _v2_envelope(payload, password, metadata, layers=0, masking=False):
+    """The single-stretch, unchunked v2 envelope: magic + version + salt, then one AES-GCM body."""
+    key_len = KEY_SIZES[metadata["encryption_algorithm"]]
+    salt = get_random_bytes(ENVELOPE_SALT_SIZE)
+    master_key = derive_master_key(password, salt)
+    encrypted = encrypt_with_key(payload, metadata["encryption_algorithm"], expand_key(master_key, "primary", key_len))
+    for i in range(layers):
+        encrypted = encrypt_with_key(encrypted, metadata["encryption_algorithm"],
+                                     expand_key(master_key, f"matryoshka-{i}", key_len))
+    if masking:
+        encrypted = apply_masking_with_key(encrypted, expand_key(master_key, "masking"))
+    block = json.dumps(metadata).encode('utf-8') + METADATA_PAYLOAD_DELIMITER + bytes(encrypted)
+    header = ENVELOPE_MAGIC + bytes([ENVELOPE_V2]) + salt
+    cipher = AES.new(expand_key(master_key, "envelope"), AES.MODE_GCM)
+    cipher.update(header)
+    ciphertext, tag = cipher.encrypt_and_digest(block)
+    return header + cipher.nonce + tag + ciphertext
+
+
+@pytest.mark.parametrize("make_envelope", [_legacy_envelope, _v2_envelope], ids=["legacy", "v2"])
+@pytest.mark.parametrize("layers, masking", [(0, False), (2, True)])
+def test_older_envelopes_still_extract(tmp_path, make_envelope, layers, masking):
+    payload = _payload(5000, 6)
+    metadata = dict(METADATA, matryoshka_layers=layers, masking_used=masking)
+    stego = str(tmp_path / "stego.png")
+    stego_apply(_png_carrier(tmp_path / "carrier.png"), make_envelope(payload, "pw", metadata, layers, masking),
+                "png", stego)
+
+    result = extract_payload(stego, password="pw", output_dir=str(tmp_path / "out"))
+    assert result["status"] == "success", result.get("message")
+    assert open(result["output_file"], "rb").read() == payload
+    assert extract_payload(stego, password="wrong", output_dir=str(tmp_path / "bad"))["status"] == "error"
+
+
+@pytest.mark.parametrize("make_envelope", [_legacy_envelope, _v2_envelope], ids=["legacy", "v2"])
+def test_older_combined_envelopes_still_extract(tmp_path, make_envelope):
+    hidden = (FAKE_TAG + make_envelope(b"decoy", "decoy", dict(METADATA, original_filename="decoy.txt"))
+              + REAL_TAG + make_envelope(b"genuine", "pw", METADATA))
+    stego = str(tmp_path / "stego.png")
+    stego_apply(_png_carrier(tmp_path / "carrier.png"), hidden, "png", stego)
+
+    for password, expected in (("pw", b"genuine"), ("decoy", b"decoy")):
+        result = extract_payload(stego, password=password, output_dir=str(tmp_path / password))
+        assert result["status"] == "success", result.get("message")
+        assert open(result["output_file"], "rb").read() == expected
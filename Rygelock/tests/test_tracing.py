@@ -0,0 +1,131 @@
+# tests/test_tracing.py — Span nesting and the SpanRecorder JSONL / Chrome trace exporters
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from core.tracing import SpanRecorder, current_span, span
+
+
+def _record():
+    """
+    Records outer > (inner_a > leaf, inner_b) on this thread, plus one span on a worker thread
+    attached to `outer` through current_span(), as the sharded embed does.
+    """
+    with SpanRecorder() as recorder:
+        with span("outer", kind="test") as outer:
+            with span("inner_a", 10) as inner_a:
+                with span("leaf") as leaf:
+                    leaf.add_bytes(5)
+                    time.sleep(0.001)
+                inner_a.add_bytes(2)
+            with span("inner_b") as inner_b:
+                inner_b.set(status="done")
+            parent = current_span()
+
+            def work():
+                with span("worker", parent=parent):
+                    pass
+            worker = threading.Thread(target=work, name="trace-worker")
+            worker.start()
+            worker.join()
+    return recorder
+
+
+@pytest.fixture
+def recorder():
+    return _record()
+
+
+def test_spans_nest_under_the_innermost_open_span(recorder):
+    spans = {s.name: s for s in recorder.spans}
+    assert [s.name for s in recorder.spans] == ["leaf", "inner_a", "inner_b", "worker", "outer"]  # Finish order
+    assert spans["outer"].parent_id is None
+    assert spans["inner_a"].parent_id == spans["inner_b"].parent_id == spans["outer"].id
+    assert spans["leaf"].parent_id == spans["inner_a"].id
+    assert spans["worker"].parent_id == spans["outer"].id
+    assert spans["worker"].thread_name == "trace-worker"
+    assert current_span() is None
+
+
+def test_jsonl_export(recorder, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    recorder.write(path)
+    records = [json.loads(line) for line in open(path, encoding="utf-8")]
+    by_name = {r["name"]: r for r in records}
+
+    assert [r["name"] for r in records] == ["leaf", "inner_a", "inner_b", "worker", "outer"]
+    assert set(by_name["leaf"]) == {"id", "parent", "name", "thread", "start", "start_us", "duration_us", "bytes"}
+    assert by_name["outer"]["kind"] == "test" and by_name["inner_b"]["status"] == "done"
+    assert (by_name["inner_a"]["bytes"], by_name["leaf"]["bytes"]) == (12, 5)
+    assert by_name["outer"]["parent"] is None
+    for child, parent in (("inner_a", "outer"), ("inner_b", "outer"), ("leaf", "inner_a"), ("worker", "outer")):
+        assert by_name[child]["parent"] == by_name[parent]["id"]
+        assert by_name[parent]["start_us"] <= by_name[child]["start_us"]
+        assert (by_name[child]["start_us"] + by_name[child]["duration_us"]
+                <= by_name[parent]["start_us"] + by_name[parent]["duration_us"] + 0.1)  # Rounded to 0.1 µs
+    assert by_name["leaf"]["duration_us"] >= 1000
+    assert abs(by_name["outer"]["start"] - time.time()) < 60
+
+
+def test_chrome_trace_export(recorder, tmp_path):
+    path = str(tmp_path / "run.trace.json")
+    recorder.write(path)
+    trace = json.load(open(path, encoding="utf-8"))
+    complete = {e["name"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+    metadata = [e for e in trace["traceEvents"] if e["ph"] == "M"]
+
+    assert trace["displayTimeUnit"] == "ms"
+    assert set(complete) == {"outer", "inner_a", "inner_b", "leaf", "worker"}
+    assert all(e["cat"] == "rygelock" and e["pid"] == os.getpid() for e in complete.values())
+    assert complete["outer"]["args"] == {"bytes": 0, "kind": "test"}
+    assert complete["inner_a"]["args"]["bytes"] == 12 and complete["inner_b"]["args"]["status"] == "done"
+
+    # Chrome nests complete events by time containment on the same thread
+    for child, parent in (("inner_a", "outer"), ("inner_b", "outer"), ("leaf", "inner_a")):
+        assert complete[child]["tid"] == complete[parent]["tid"]
+        assert complete[parent]["ts"] <= complete[child]["ts"]
+        assert complete[child]["ts"] + complete[child]["dur"] <= complete[parent]["ts"] + complete[parent]["dur"]
+    assert complete["inner_a"]["ts"] + complete["inner_a"]["dur"] <= complete["inner_b"]["ts"]
+
+    # The worker span lands on its own named track
+    assert complete["worker"]["tid"] != complete["outer"]["tid"]
+    names = {e["tid"]: e["args"]["name"] for e in metadata if e["name"] == "thread_name"}
+    assert names[complete["worker"]["tid"]] == "trace-worker"
+    assert names[complete["outer"]["tid"]] == threading.current_thread().name
+
+
+def test_write_picks_the_format(recorder, tmp_path):
+    recorder.write(str(tmp_path / "explicit.json"), "jsonl")
+    assert json.loads(open(tmp_path / "explicit.json", encoding="utf-8").readline())["name"] == "leaf"
+    with pytest.raises(ValueError, match="Unknown trace format"):
+        recorder.write(str(tmp_path / "bad.json"), "xml")
+
+
+def test_failed_stage_is_marked_and_still_recorded():
+    with SpanRecorder() as recorder:
+        with pytest.raises(KeyError):
+            with span("outer"):
+                with span("failing"):
+                    raise KeyError("missing")
+    assert [(s.name, s.attrs) for s in recorder.spans] == [("failing", {"error": "KeyError"}),
+                                                           ("outer", {"error": "KeyError"})]
+    assert current_span() is None
+
+
+def test_spans_are_free_without_subscribers():
+    first, second = span("a", 10), span("b")
+    assert first is second and first.id is None
+    with first as opened:
+        opened.add_bytes(1)
+        opened.set(x=1)
+        assert current_span() is None
+
+
+def test_summary_totals_per_stage(recorder):
+    summary = recorder.summary()
+    assert summary["leaf"]["count"] == 1 and summary["leaf"]["bytes"] == 5
+    assert summary["outer"]["total_s"] >= summary["inner_a"]["total_s"] >= summary["leaf"]["total_s"] > 0
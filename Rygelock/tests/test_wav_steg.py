@@ -0,0 +1,80 @@
+# tests/test_wav_steg.py — Streaming PCM LSB embedding of wav_steg
+
+import io
+import os
+import wave
+
+import numpy as np
+import pytest
+
+import core.algorithm_stubs as stubs
+from core.algorithm import carrier_capacity
+from core.algorithm_stubs import _pcm_values, _wav_capacity, wav_steg
+
+
+def _write_wav(path, width, channels, frames, extreme=False):
+    raw = np.random.default_rng(width * channels + frames).integers(0, 256, frames * channels * width, dtype=np.uint8)
+    if extreme:  # Alternate the smallest and largest sample values
+        samples = raw.reshape(-1, width)
+        samples[::2] = 0
+        samples[1::2] = 0xFF
+        if width > 1:
+            samples[::2, -1] = 0x80
+            samples[1::2, -1] = 0x7F
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(8000)
+        w.writeframes(raw.tobytes())
+    return str(path)
+
+
+def _samples(path):
+    with wave.open(path, 'rb') as w:
+        width = w.getsampwidth()
+        return np.frombuffer(w.readframes(w.getnframes()), dtype=np.uint8).reshape(-1, width)
+
+
+@pytest.mark.parametrize("width", [1, 2, 3, 4])
+@pytest.mark.parametrize("channels", [1, 2, 3])
+@pytest.mark.parametrize("lsb_matching", [False, True])
+def test_roundtrip_across_chunks(tmp_path, monkeypatch, width, channels, lsb_matching):
+    monkeypatch.setattr(stubs, "WAV_CHUNK_FRAMES", 64)  # Payload and trailer span several chunks
+    carrier = _write_wav(tmp_path / "carrier.wav", width, channels, 1001, extreme=lsb_matching)
+    output = str(tmp_path / "out.wav")
+    capacity = _wav_capacity(carrier)
+    for size in (0, 1, capacity // 2, capacity):
+        payload = np.random.default_rng(size).integers(0, 256, size, dtype=np.uint8).tobytes()
+        source = io.BytesIO(payload) if size % 2 else payload  # Streams and buffers
+        assert wav_steg(carrier, payload=source, output_path=output, lsb_matching=lsb_matching) == output
+        assert wav_steg(output, extract=True) == payload
+
+        before, after = _samples(carrier), _samples(output)
+        if lsb_matching:
+            assert np.abs(_pcm_values(after) - _pcm_values(before)).max() <= 1
+        else:
+            assert np.array_equal(after[:, 1:], before[:, 1:])
+            assert np.array_equal(after[:, 0] >> 1, before[:, 0] >> 1)
+
+
+def test_capacity_and_overflow(tmp_path):
+    carrier = _write_wav(tmp_path / "carrier.wav", 2, 2, 1001)
+    assert carrier_capacity(carrier) == _wav_capacity(carrier) == (2002 - stubs.WAV_LSB_TRAILER_BITS) // 8
+    output = tmp_path / "out.wav"
+    assert wav_steg(carrier, payload=bytes(_wav_capacity(carrier) + 1), output_path=str(output)) is None
+    assert not output.exists()
+
+
+def test_short_carrier_and_plain_wav(tmp_path):
+    short = _write_wav(tmp_path / "short.wav", 2, 1, 40)
+    assert wav_steg(short, payload=b"x", output_path=str(tmp_path / "out.wav")) is None
+    assert wav_steg(short, extract=True) == b""
+    plain = _write_wav(tmp_path / "plain.wav", 2, 2, 1001)
+    assert wav_steg(plain, extract=True) == b""
+
+
+def test_in_place_embedding(tmp_path):
+    carrier = _write_wav(tmp_path / "carrier.wav", 3, 2, 500)
+    assert wav_steg(carrier, payload=b"hello", in_place=True) == carrier
+    assert wav_steg(carrier, extract=True) == b"hello"
+    assert os.listdir(tmp_path) == ["carrier.wav"]
@@ -0,0 +1,66 @@
+# tests/test_wow_costs.py — FFT-based WOW costs against the reference spatial-domain formulation
+
+import numpy as np
+import pytest
+from scipy.signal import convolve2d
+
+import core.algorithm_stubs as stubs
+from core.algorithm_stubs import WOW_WET_COST, _wow_costs
+
+# Daubechies 8 high-pass decomposition filter of the WOW reference implementation
+HPDF = np.array([-0.0544158422, 0.3128715909, -0.6756307363, 0.5853546837, 0.0158291053, -0.2840155430,
+                 -0.0004724846, 0.1287474266, 0.0173693010, -0.0440882539, -0.0139810279, 0.0087460940,
+                 0.0048703530, -0.0003917404, -0.0006754494, -0.0001174768])
+LPDF = (-1.0) ** np.arange(16) * HPDF[::-1]
+FILTERS = [np.outer(LPDF, HPDF), np.outer(HPDF, LPDF), np.outer(HPDF, HPDF)]
+
+
+def _conv2_same(a, kernel):
+    """MATLAB conv2(a, kernel, 'same')."""
+    full = convolve2d(a, kernel, 'full')
+    m, n = kernel.shape
+    return full[m // 2:m // 2 + a.shape[0], n // 2:n // 2 + a.shape[1]]
+
+
+def reference_wow_costs(cover, p=-1):
+    """Direct 2-D convolutions, padding and alignment as in the reference WOW embedder."""
+    cover = cover.astype(float)
+    pad = 16
+    padded = np.pad(cover, pad, 'symmetric')
+    xis = []
+    for f in FILTERS:
+        residual = _conv2_same(padded, f)
+        xi = _conv2_same(np.abs(residual), np.rot90(np.abs(f), 2))
+        xi = np.roll(np.roll(xi, 1, axis=0), 1, axis=1)
+        d0, d1 = (xi.shape[0] - cover.shape[0]) // 2, (xi.shape[1] - cover.shape[1]) // 2
+        xis.append(xi[d0:xi.shape[0] - d0, d1:xi.shape[1] - d1])
+    with np.errstate(divide='ignore'):
+        rho = (xis[0] ** p + xis[1] ** p + xis[2] ** p) ** (-1 / p)
+    rho[rho > WOW_WET_COST] = WOW_WET_COST
+    rho[np.isnan(rho)] = WOW_WET_COST
+    return rho
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:60, :80]
+    natural = np.clip(120 + 50 * np.sin(x / 7) * np.cos(y / 11) + rng.normal(0, 4, x.shape), 0, 255).astype(np.uint8)
+    return {
+        "natural": natural,
+        "odd": natural[:37, :53],
+        "noise": rng.integers(0, 256, (20, 20)).astype(np.uint8),
+        "flat": np.full((40, 30), 128, dtype=np.uint8),
+    }
+
+
+@pytest.mark.parametrize("name", sorted(_images()))
+@pytest.mark.parametrize("band_pixels", [1 << 22, 2000])  # One band, and bands much shorter than the image
+def test_matches_reference(monkeypatch, name, band_pixels):
+    monkeypatch.setattr(stubs, "WOW_BAND_PIXELS", band_pixels)
+    img = _images()[name]
+    costs = _wow_costs(img, workers=2)
+    expected = reference_wow_costs(img)
+    assert costs.dtype == np.float32 and costs.shape == img.shape
+    dry = expected < WOW_WET_COST
+    assert np.array_equal(costs >= WOW_WET_COST, ~dry)
+    assert np.allclose(costs[dry], expected[dry], rtol=1e-4)
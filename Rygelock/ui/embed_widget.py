@@ -5,14 +5,13 @@ from PyQt5.QtWidgets import (
     QTableWidgetItem, QAbstractItemView, QMessageBox, QRadioButton, QButtonGroup, QSizePolicy, QGroupBox, QComboBox
 )
 from PyQt5.QtGui import QPixmap, QIcon, QFont
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt
 from core.algorithm import detect_algorithm
-from core.steg_engine import embed_files
 from core.deception_mech import prepare_fake_output
 from utils.config import get_output_dir
 from utils.file_validator import apply_data_whitening
-from ui.embed_progress_popup import EmbedProgressPopup
-from ui.result_viewer import ResultViewer
+from ui.job_queue_widget import JobQueueWidget
+from core.job_queue import JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED
 from utils.audio import play_sound
 from ui.custom_dialog import CustomDialog
 from utils.resource_path import resource_path
@@ -21,9 +20,12 @@ SUPPORTED_CARRIER_EXTENSIONS = [".png", ".jpg", ".jpeg", "JPG", ".bmp", ".tiff",
 
 
 class EmbedWidget(QWidget):
-    def __init__(self, config, parent=None):
+    def __init__(self, config, scheduler, job_signals, parent=None):
         super().__init__(parent)
         self.config = config
+        self.scheduler = scheduler
+        self.job_signals = job_signals
+        self.submitted_jobs = set()  # Ids of the jobs queued from this page
         self.setAcceptDrops(True)
         self.init_ui()
 
@@ -166,6 +168,16 @@ class EmbedWidget(QWidget):
         self.start_btn.clicked.connect(self.start_embedding)
         layout.addWidget(self.start_btn, alignment=Qt.AlignCenter)
 
+        # Queued jobs run in the background; the form stays usable for the next one
+        self.job_queue = JobQueueWidget(self.scheduler, self.job_signals, self)
+        layout.addWidget(self.job_queue)
+        # Results are reported here rather than in a modal dialog, so finished jobs never interrupt the user
+        self.job_status_label = QLabel()
+        self.job_status_label.setWordWrap(True)
+        self.job_status_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.job_status_label)
+        self.job_signals.job_changed.connect(self.handle_job_changed)
+
         self.back_btn.setFocus()
 
         # Initialize the password field state based on default selection ("None")
@@ -223,10 +235,10 @@ class EmbedWidget(QWidget):
                 if self.carrier_table.item(row, 0).text() == file_path:
                     QMessageBox.warning(self, "Duplicate File", "This carrier file is already added.")
                     return
+            # More than one carrier shards the payload across all of them
             row = self.carrier_table.rowCount()
             self.carrier_table.insertRow(row)
-            self.carrier_table.setRowCount(1)  # Ensure there is exactly one row
-            self.carrier_table.setItem(0, 0, QTableWidgetItem(file_path))
+            self.carrier_table.setItem(row, 0, QTableWidgetItem(file_path))
             self.validate_embedding_inputs()  # Validate after adding carrier
 
     def add_payload_file(self):
@@ -279,11 +291,12 @@ class EmbedWidget(QWidget):
                 if path.strip(): total_payload_size += os.path.getsize(path.strip())
 
             if self.carrier_table.rowCount() > 0:
-                carrier_path = self.carrier_table.item(0, 0).text()
-                carrier_size = os.path.getsize(carrier_path)
+                # Sharded payloads are split in proportion to carrier size, so the limit applies to the total
+                carrier_paths = [self.carrier_table.item(row, 0).text() for row in range(self.carrier_table.rowCount())]
+                carrier_size = sum(os.path.getsize(path) for path in carrier_paths)
 
                 if total_payload_size > (carrier_size * 0.50):
-                    carrier_name = os.path.basename(carrier_path)
+                    carrier_name = ", ".join(os.path.basename(path) for path in carrier_paths)
                     error_msg = (f"Payload size is too large for the carrier file.\n\n"
                                  f"Total payload size: {total_payload_size / 1024:.1f} KB\n"
                                  f"Carrier '{carrier_name}' size: {carrier_size / 1024:.1f} KB\n\n"
@@ -339,22 +352,23 @@ class EmbedWidget(QWidget):
         if config["fake_payloads"] or config["generate_fake_key"]:
             prepare_fake_output(config)
 
-        self.progress_popup = EmbedProgressPopup(self.config)
-        self.progress_popup.show()
-
-        class WorkerThread(QThread):
-            progress = pyqtSignal(int)
-            done = pyqtSignal(dict)
-
-            def run(self_):
-                try:
-                    # The 'config' dictionary is already fully prepared here
-                    result = embed_files(config, self_.progress.emit)
-                except Exception as e:
-                    result = {"status": "error", "message": str(e)}
-                self_.done.emit(result)
-
-        self.worker = WorkerThread()
-        self.worker.progress.connect(self.progress_popup.update_progress)
-        self.worker.done.connect(self.progress_popup.close_and_show_result)
-        self.worker.start()
\ No newline at end of file
+        job = self.scheduler.submit_embed(config)
+        self.submitted_jobs.add(job.id)
+        self.job_status_label.setText(f"Embedding queued as job #{job.id}.")
+
+    def handle_job_changed(self, job):
+        # Runs on the GUI thread (see JobSignals) for every job; only react to ours once they finish
+        if job.id not in self.submitted_jobs or not job.finished:
+            return
+        self.submitted_jobs.discard(job.id)
+        result = job.result or {}
+        if job.state == JOB_SUCCEEDED:
+            play_sound("success", self.config)
+            saved = ", ".join(result.get("embedded_files", []))
+            self.job_status_label.setText(f"Job #{job.id}: Embedding complete.\nSaved: {saved}")
+        elif job.state == JOB_FAILED:
+            play_sound("fail", self.config)
+            errors = result.get("errors") or [job.error or "An unknown error occurred."]
+            self.job_status_label.setText(f"Job #{job.id}: Embedding failed.\nReason: " + "; ".join(errors))
+        elif job.state == JOB_CANCELLED:
+            self.job_status_label.setText(f"Job #{job.id}: Embedding cancelled.")
@@ -7,14 +7,18 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QFont, QPixmap, QIcon
 from PyQt5.QtCore import Qt
-from core.steg_engine import extract_payload
+from core.job_queue import JOB_SUCCEEDED, JOB_CANCELLED
+from ui.job_queue_widget import JobQueueWidget
 from utils.resource_path import resource_path
 
 
 class ExtractWidget(QWidget):
-    def __init__(self, config, parent=None):
+    def __init__(self, config, scheduler, job_signals, parent=None):
         super().__init__(parent)
         self.config = config
+        self.scheduler = scheduler
+        self.job_signals = job_signals
+        self.submitted_jobs = {}  # job id -> (key file supplied, password supplied)
         self.init_ui()
         self.analysis_metadata = {}
         self.key_data_from_file = None  # <<< NEW: To store key file content as bytes
@@ -179,12 +183,18 @@ class ExtractWidget(QWidget):
         layout.addWidget(self.status_label)
         layout.addWidget(self.status_box)
 
+        # Extraction runs on the shared job queue so the window stays responsive during PBKDF2/decryption
+        self.job_queue = JobQueueWidget(self.scheduler, self.job_signals, self)
+        layout.addWidget(self.job_queue)
+        self.job_signals.job_changed.connect(self.handle_job_changed)
+
         self.setLayout(layout)
 
     def select_carrier_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select Stego File")
-        if file_path:
-            self.carrier_display.setText(file_path)
+        # Several files can be selected at once to extract a payload sharded across carriers
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Stego File(s)")
+        if file_paths:
+            self.carrier_display.setText("; ".join(file_paths))
 
     def select_key_file(self):
         """
@@ -220,29 +230,41 @@ class ExtractWidget(QWidget):
 
 
     def handle_extract(self):
-        path = self.carrier_display.text().strip()
-        if not path or not os.path.exists(path):
+        paths = [p.strip() for p in self.carrier_display.text().split(";") if p.strip()]
+        if not paths or not all(os.path.exists(p) for p in paths):
             self.status_box.setText("Invalid stego file.")
             return
+        path = paths if len(paths) > 1 else paths[0]
 
         password = self.password_input.text().strip()
 
         # We now pass the key_data_from_file (which is already bytes or None)
         key_data = self.key_data_from_file
 
-        # Call the extract_payload from core.steg_engine
-        result = extract_payload(path, password=password, key_data=key_data)
+        # Queue the extraction; handle_job_changed reports the outcome
+        job = self.scheduler.submit_extract(path, password=password, key_data=key_data)
+        self.submitted_jobs[job.id] = (key_data is not None, bool(password))
+        self.status_box.setText(f"Extraction queued as job #{job.id}.")
+
+    def handle_job_changed(self, job):
+        # Runs on the GUI thread (see JobSignals) for every job; only react to ours once they finish
+        if job.id not in self.submitted_jobs or not job.finished:
+            return
+        key_provided, password_provided = self.submitted_jobs.pop(job.id)
+        result = job.result or {"status": "error", "message": job.error}
 
-        if result["status"] == "success":
-            self.status_box.setText("Extraction complete.\nSaved: " + result["output_file"])
+        if job.state == JOB_SUCCEEDED:
+            self.status_box.setText(f"Job #{job.id}: Extraction complete.\nSaved: " + result["output_file"])
+        elif job.state == JOB_CANCELLED:
+            self.status_box.setText(f"Job #{job.id}: Extraction cancelled.")
         else:
             # Display a more user-friendly message, potentially linking to analysis
             error_message = result.get("message", "Unknown error during extraction.")
             # Add a hint if key file was required based on analysis
-            if self.analysis_metadata.get('generate_key_used', False) and key_data is None:
+            if self.analysis_metadata.get('generate_key_used', False) and not key_provided:
                 error_message += "\nHint: A key file was required but not provided."
             elif self.analysis_metadata.get('encryption') and self.analysis_metadata[
-                'encryption'] != "None" and not password:
+                'encryption'] != "None" and not password_provided:
                 error_message += "\nHint: This payload is encrypted and requires a password."
 
-            self.status_box.setText(f"Extraction failed.\nReason: {error_message}")
\ No newline at end of file
+            self.status_box.setText(f"Job #{job.id}: Extraction failed.\nReason: {error_message}")
\ No newline at end of file
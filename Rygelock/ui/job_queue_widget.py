@@ -0,0 +1,114 @@
+# ui/job_queue_widget.py — Live view of the shared embed/extract job queue
+
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QPushButton, QAbstractItemView, QHeaderView, QProgressBar
+)
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtCore import QObject, pyqtSignal
+from core.job_queue import JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED
+
+
+class JobSignals(QObject):
+    """
+    Re-emits JobScheduler callbacks as Qt signals. The scheduler calls listeners from worker
+    threads; Qt queues the signals, so connected slots always run on the GUI thread.
+    """
+    job_changed = pyqtSignal(object)
+    jobs_cleared = pyqtSignal()
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        scheduler.add_listener(self.job_changed.emit)
+        scheduler.add_clear_listener(self.jobs_cleared.emit)
+
+
+STATE_COLOURS = {JOB_SUCCEEDED: "#66cc66", JOB_FAILED: "#ff5555", JOB_CANCELLED: "#999999"}
+
+
+class JobQueueWidget(QWidget):
+    def __init__(self, scheduler, job_signals, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.rows = {}  # job id -> table row
+        self.init_ui()
+        for job in scheduler.jobs():
+            self.update_job(job)
+        job_signals.job_changed.connect(self.update_job)
+        # The embed and extract pages each own a widget on the same scheduler; rebuild all of them
+        job_signals.jobs_cleared.connect(self.reload_jobs)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["#", "Job", "Files", "State", "Progress"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setFixedHeight(140)
+        layout.addWidget(self.table)
+
+        button_row = QHBoxLayout()
+        cancel_btn = QPushButton("Cancel Selected")
+        cancel_btn.setToolTip("Cancel the selected queued or running jobs")
+        cancel_btn.clicked.connect(self.cancel_selected)
+        clear_btn = QPushButton("Clear Finished")
+        clear_btn.setToolTip("Remove finished jobs from the list")
+        clear_btn.clicked.connect(self.clear_finished)
+        button_row.addStretch()
+        button_row.addWidget(cancel_btn)
+        button_row.addWidget(clear_btn)
+        layout.addLayout(button_row)
+
+    def update_job(self, job):
+        row = self.rows.get(job.id)
+        if row is None:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            self.rows[job.id] = row
+            self.table.setItem(row, 0, QTableWidgetItem(str(job.id)))
+            self.table.setItem(row, 1, QTableWidgetItem(job.kind.capitalize()))
+            self.table.setItem(row, 2, QTableWidgetItem(job.label))
+            self.table.setItem(row, 3, QTableWidgetItem())
+            progress_bar = QProgressBar()
+            progress_bar.setRange(0, 100)
+            self.table.setCellWidget(row, 4, progress_bar)
+
+        state_item = self.table.item(row, 3)
+        state_item.setText(job.state)
+        state_item.setToolTip(self._job_details(job))
+        if job.state in STATE_COLOURS:
+            state_item.setForeground(QBrush(QColor(STATE_COLOURS[job.state])))
+        self.table.cellWidget(row, 4).setValue(job.progress)
+
+    @staticmethod
+    def _job_details(job):
+        result = job.result or {}
+        if job.error:
+            return job.error
+        if result.get("errors"):
+            return "\n".join(result["errors"])
+        if result.get("message"):
+            return result["message"]
+        if result.get("output_file"):
+            return "Saved: " + result["output_file"]
+        if result.get("embedded_files"):
+            return "Saved: " + ", ".join(result["embedded_files"])
+        return job.state
+
+    def cancel_selected(self):
+        job_ids = {int(self.table.item(index.row(), 0).text()) for index in self.table.selectionModel().selectedRows()}
+        for job_id in job_ids:
+            self.scheduler.cancel(job_id)
+
+    def clear_finished(self):
+        self.scheduler.clear_finished()  # Every widget, this one included, reloads via jobs_cleared
+
+    def reload_jobs(self):
+        self.table.setRowCount(0)
+        self.rows = {}
+        for job in self.scheduler.jobs():
+            self.update_job(job)
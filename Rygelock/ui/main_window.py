@@ -12,6 +12,8 @@ from ui.embed_widget import EmbedWidget
 from ui.extract_widget import ExtractWidget
 from ui.settings_widget import SettingsWidget
 from ui.tutorial_widget import TutorialWidget
+from ui.job_queue_widget import JobSignals
+from core.job_queue import JobScheduler
 from utils.config import DEFAULT_CONFIG
 from utils.audio import init_audio, play_sound
 from utils.resource_path import resource_path
@@ -31,6 +33,10 @@ class MainWindow(QMainWindow):
         self.is_muted = False  # Track mute state
         self.config = DEFAULT_CONFIG.copy()
 
+        # One job queue shared by the embed and extract pages, so work keeps running in the background
+        self.scheduler = JobScheduler()
+        self.job_signals = JobSignals(self.scheduler, self)
+
         # Initialize all UI menus and widgets.
         self.init_main_menu()
         self.init_embed_menu()
@@ -171,12 +177,14 @@ class MainWindow(QMainWindow):
         self.apply_settings()  # Re-apply settings to update the icon
 
     def init_embed_menu(self):
-        self.embed_widget = EmbedWidget(config=self.config, parent=self)
+        self.embed_widget = EmbedWidget(config=self.config, scheduler=self.scheduler,
+                                        job_signals=self.job_signals, parent=self)
         self.embed_widget.back_btn.clicked.connect(lambda: self.central_stack.setCurrentIndex(0))
         self.central_stack.addWidget(self.embed_widget)
 
     def init_extract_menu(self):
-        self.extract_widget = ExtractWidget(config=self.config, parent=self)
+        self.extract_widget = ExtractWidget(config=self.config, scheduler=self.scheduler,
+                                            job_signals=self.job_signals, parent=self)
         self.extract_widget.back_btn.clicked.connect(lambda: self.central_stack.setCurrentIndex(0))
         self.central_stack.addWidget(self.extract_widget)
 
@@ -249,6 +257,11 @@ class MainWindow(QMainWindow):
             if index >= 0:
                 self.settings_widget.priority_combo.setCurrentIndex(index)
 
+    def closeEvent(self, event):
+        # Cancel queued/running jobs; the engine removes their partial output at its next checkpoint
+        self.scheduler.shutdown(cancel_pending=True)
+        super().closeEvent(event)
+
     def return_to_main_menu_from_settings(self):
         """
         Slot called when settings are closed. It now reads and applies the new settings.